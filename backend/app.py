@@ -21,6 +21,7 @@ load_dotenv()
 # import pymysql
 
 from models.blacklist import BLACKLIST
+from models.email_outbox import EmailOutboxModel  # registers the table for create_all
 from datetime import datetime
 
 # Resources
@@ -36,25 +37,45 @@ from models.resources.patient import (
     Patient,
     PatientLogin,
     PatientList,
+    PatientSearch,
 )
 from models.resources.appointment import appointment, deleteAppointments
 from models.resources.admin import AdminRegister, AdmingLogin
-from models.resources.uploads import UploadImage, PatientImages, DeleteImage
+from models.resources.uploads import (
+    UploadImage,
+    PatientImages,
+    DeleteImage,
+    ChunkedUpload,
+    ChunkedUploadSession,
+    CompleteChunkedUpload,
+)
 from models.image_helper import IMAGE_SET
+from models.query_profiler import init_profiler
+from models.slow_query_log import init_slow_query_log, parse_threshold
+from models.metrics import init_metrics
+from models.tracing import init_tracing
 from models.resources.logout import Logout
 from models.resources.analytics import Analytics
+from models.resources.metrics import Metrics
 from models.resources.examination import (
     Examination,
     ExaminationList,
+    ExaminationSearch,
     ExaminationRegister,
     PatientExaminations,
 )
 from models.resources.contact_us import ContactUs, ContactUsList, ContactUsRegister
-from models.resources.export import ExportTreatmentHistory, ExportStatus, PatientExports, DownloadExport
+from models.resources.export import (
+    ExportTreatmentHistory,
+    ExportStatus,
+    PatientExports,
+    DownloadExport,
+    StreamTreatmentHistory,
+)
 
 
 app = Flask(__name__, static_url_path="/static")
-CORS(app)
+CORS(app, expose_headers=["X-Pending-Count", "X-Next-Cursor", "Content-Range", "Content-Disposition", "X-Query-Count", "Server-Timing"])
 
 # Use SQLite
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///data.db"
@@ -66,17 +87,34 @@ app.config["JWT_BLACKLIST_TOKEN_CHECKS"] = ["access", "refresh"]
 
 app.config["UPLOADED_IMAGES_DEST"] = os.path.join("static", "images")
 app.config["UPLOAD_FOLDER"] = os.path.join("static", "exports")
+# Statements slower than this are written, with their query plan, to the slow-query log ("off" disables it)
+app.config["SLOW_QUERY_MS"] = parse_threshold(os.environ.get("SLOW_QUERY_MS", 100))
+app.config["SLOW_QUERY_LOG"] = os.path.join("logs", "slow_queries.jsonl")
+# Every process (web, worker, scheduler) writes its metrics here for /metrics to merge
+app.config["METRICS_DIR"] = os.environ.get("METRICS_DIR", "metrics")
+# Share of requests traced, and how slow a trace must be to be written to the trace log
+app.config["TRACE_SAMPLE_RATE"] = float(os.environ.get("TRACE_SAMPLE_RATE", 1.0))
+app.config["TRACE_SLOW_MS"] = float(os.environ.get("TRACE_SLOW_MS", 250))
+app.config["TRACE_LOG"] = os.path.join("logs", "traces.jsonl")
 app.secret_key = "my_secret_key"
 
 patch_request_class(app, 10 * 1024 * 1024)
 configure_uploads(app, IMAGE_SET)
 api = Api(app)
+init_profiler(app)  # X-Query-Count / Server-Timing headers and N+1 warnings in debug mode
+init_slow_query_log(app)
+init_metrics(app)
+init_tracing(app)
 
 
 @app.before_first_request
 def create_tables():
     from models.db import db
+    from models import examination_search, patient_search
     db.create_all()   # SQLite auto-creates tables
+    # Search indexes for databases created before they existed
+    examination_search.ensure_index()
+    patient_search.ensure_index()
 
 
 jwt = JWTManager(app)
@@ -156,6 +194,7 @@ api.add_resource(PatientRegister, "/patient/register")
 api.add_resource(Patient, "/patient/<int:patient_id>")
 api.add_resource(PatientLogin, "/patient/login")
 api.add_resource(PatientList, "/patients")
+api.add_resource(PatientSearch, "/patients/search")
 
 api.add_resource(appointment, "/appointments")
 api.add_resource(deleteAppointments, "/appointments/<int:app_id>")
@@ -166,6 +205,7 @@ api.add_resource(AdmingLogin, "/admin/login")
 api.add_resource(ExaminationRegister, "/appointments/<int:app_id>/examinations")
 api.add_resource(PatientExaminations, "/patient/<int:patient_id>/examinations")
 api.add_resource(ExaminationList, "/examinations")
+api.add_resource(ExaminationSearch, "/examinations/search")
 api.add_resource(Examination, "/examination/<int:examination_id>")
 
 api.add_resource(ContactUsRegister, "/contactus/form")
@@ -175,22 +215,28 @@ api.add_resource(ContactUsList, "/contactus/forms")
 api.add_resource(UploadImage, "/upload/image/<int:patient_id>")
 api.add_resource(PatientImages, "/images/<int:patient_id>")
 api.add_resource(DeleteImage, "/image/delete/<int:patient_id>")
+api.add_resource(ChunkedUpload, "/upload/image/<int:patient_id>/chunked")
+api.add_resource(ChunkedUploadSession, "/upload/image/<int:patient_id>/chunked/<string:upload_id>")
+api.add_resource(CompleteChunkedUpload, "/upload/image/<int:patient_id>/chunked/<string:upload_id>/complete")
 
 api.add_resource(Logout, "/logout")
 api.add_resource(Analytics, "/analytics")
+api.add_resource(Metrics, "/metrics")
 
 # Export resources
 api.add_resource(ExportTreatmentHistory, "/patient/<int:patient_id>/export")
 api.add_resource(ExportStatus, "/export/<int:export_id>")
 api.add_resource(PatientExports, "/patient/<int:patient_id>/exports")
 api.add_resource(DownloadExport, "/download/export/<int:export_id>")
+api.add_resource(StreamTreatmentHistory, "/patient/<int:patient_id>/export/stream")
 
 
 if __name__ == "__main__":
     from models.db import db
     from models.email_helper import init_mail
-    from models.jobs.scheduler import init_scheduler, add_daily_reminder_job, add_monthly_report_job, add_cleanup_job
-    from models.jobs.tasks import send_daily_reminders, send_monthly_reports, cleanup_expired_exports
+    from models.migrations import missing_columns
+    from models.jobs.scheduler import init_scheduler, add_daily_reminder_job, add_monthly_report_job, add_cleanup_job, add_revoked_token_cleanup_job, add_upload_cleanup_job
+    from models.jobs.tasks import send_daily_reminders, send_monthly_reports, cleanup_expired_exports, prune_revoked_tokens, cleanup_stale_uploads
     
     db.init_app(app)
     
@@ -202,15 +248,25 @@ if __name__ == "__main__":
     add_daily_reminder_job(send_daily_reminders, hour=8, minute=0)  # 8 AM daily
     add_monthly_report_job(send_monthly_reports, day=1, hour=9, minute=0)  # 1st of month at 9 AM
     add_cleanup_job(cleanup_expired_exports, hour=2, minute=0)  # 2 AM daily
+    add_revoked_token_cleanup_job(prune_revoked_tokens, hours=1)  # hourly
+    add_upload_cleanup_job(cleanup_stale_uploads, hours=6)  # every 6 hours
     
     print("\n" + "="*60)
     print("🏥 HOSPITAL INFORMATION SYSTEM - CARDIOLOGY DEPARTMENT")
     print("="*60)
     print("✓ Email service initialized")
-    print("✓ Scheduler initialized with 3 jobs:")
+    print("✓ Scheduler initialized with 5 jobs:")
     print("  - Daily reminders at 08:00")
     print("  - Monthly reports on 1st at 09:00")
     print("  - Cleanup expired exports at 02:00")
+    print("  - Prune expired revoked tokens hourly")
+    print("  - Remove abandoned chunked uploads every 6 hours")
+    print("ℹ️ Exports and email are queued here and processed by the worker; start it with:")
+    print("    python -m models.jobs.worker")
+    with app.app_context():
+        missing = missing_columns()
+    if missing:
+        print(f"⚠️ The database lacks {len(missing)} column(s) of the models; run: python upgrade_db.py")
     print("="*60 + "\n")
     
     app.run(host="localhost", port=5000, debug=True)
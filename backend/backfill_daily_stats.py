@@ -0,0 +1,26 @@
+from flask import Flask
+from models.db import db
+from models.patient import PatientModel
+from models.daily_stats import DailyStatsModel
+
+# Create a simple Flask app for context
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///data.db"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Initialize db with the app
+db.init_app(app)
+
+# Create app context
+with app.app_context():
+    # Create the rollup table if it doesn't exist
+    db.create_all()
+
+    print("=" * 60)
+    print("REBUILDING DAILY ANALYTICS ROLLUP")
+    print("=" * 60)
+
+    days = DailyStatsModel.rebuild()
+
+    print(f"✓ Wrote counts for {days} day(s)")
+    print("=" * 60)
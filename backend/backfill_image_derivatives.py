@@ -0,0 +1,36 @@
+import argparse
+import os
+from flask import Flask
+from models.db import db
+from models.patient import PatientModel
+from models.patient_image import PatientImageModel
+from models.image_derivatives import backfill, PROCESSES, SIZES
+
+IMAGES_FOLDER = os.path.join("static", "images")
+
+parser = argparse.ArgumentParser(description="Render thumbnails and previews for patient images")
+parser.add_argument("--force", action="store_true", help="re-render images that already have derivatives")
+parser.add_argument("--processes", type=int, default=PROCESSES)
+args = parser.parse_args()
+
+# Create a simple Flask app for context
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///data.db"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Initialize db with the app
+db.init_app(app)
+
+# Create app context
+with app.app_context():
+    print("=" * 60)
+    print("RENDERING IMAGE DERIVATIVES")
+    print("=" * 60)
+    print(f"ℹ️ Sizes: {', '.join(f'{kind} {size}px' for kind, size in SIZES.items())}")
+
+    rendered, failed = backfill(IMAGES_FOLDER, force=args.force, processes=args.processes)
+
+    print(f"✓ Rendered derivatives for {rendered} image(s)")
+    if failed:
+        print(f"✗ {failed} image(s) failed")
+    print("=" * 60)
@@ -0,0 +1,87 @@
+"""
+Compare one-connection-per-message reminders with send_bulk
+
+Builds N reminder messages and delivers them to a local SMTP sink twice:
+once with mail.send() per message (a new SMTP session each time, the old
+daily reminder job) and once with send_bulk() over a few reused connections.
+Prints messages per second and SMTP sessions opened for each.
+
+Usage (from backend/):
+    python -m benchmarks.bench_bulk_email --messages 500 --connections 2 --latency-ms 5
+"""
+import argparse
+import time
+from flask import Flask
+from models import email_helper
+from models.email_helper import Mail, build_appointment_reminder, send_bulk
+from benchmarks.common import print_table
+from benchmarks.smtp_sink import SMTPSink
+
+
+def make_mail_app(port):
+    app = Flask(__name__)
+    app.config.update(
+        MAIL_SERVER="localhost",
+        MAIL_PORT=port,
+        MAIL_USE_TLS=False,
+        MAIL_USE_SSL=False,
+        MAIL_USERNAME=None,
+        MAIL_PASSWORD=None,
+        MAIL_DEFAULT_SENDER="bench@localhost",
+    )
+    email_helper.mail = Mail(app)
+    return app
+
+
+def build_messages(count):
+    return [
+        build_appointment_reminder(
+            patient_email=f"patient{i}@example.com",
+            patient_name=f"Patient {i}",
+            appointment_date="Monday, January 01, 2024",
+            doctor_name="Dr. Bench Mark",
+        )
+        for i in range(count)
+    ]
+
+
+def run(label, sink, callback, count):
+    received, connections = sink.received, sink.connections
+    started = time.perf_counter()
+    callback()
+    elapsed = time.perf_counter() - started
+    delivered = sink.received - received
+    return (label, delivered, sink.connections - connections, f"{elapsed:.2f}", f"{count / elapsed:.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--connections", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=0, help="messages/second cap for send_bulk (0 = none)")
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    sink = SMTPSink(latency_ms=args.latency_ms).start()
+    app = make_mail_app(sink.port)
+    def one_by_one():
+        for message in messages:
+            email_helper.mail.send(message)
+
+    def bulk():
+        send_bulk(messages, connections=args.connections, rate_per_second=args.rate)
+
+    with app.app_context():
+        messages = build_messages(args.messages)
+        rows = [
+            run("mail.send per message", sink, one_by_one, args.messages),
+            run(f"send_bulk x{args.connections}", sink, bulk, args.messages),
+        ]
+    sink.shutdown()
+
+    print()
+    print_table(["method", "delivered", "smtp sessions", "seconds", "msg/s"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Check that GET /examinations issues a constant number of queries
+
+Runs ExaminationList for an admin and a patient at growing row counts,
+prints queries and latency, and exits non-zero if the query count grows
+with the number of examinations (an N+1 regression).
+
+Usage (from backend/):
+    python -m benchmarks.bench_examination_list --sizes 100 1000 10000
+"""
+import argparse
+import os
+import sys
+import time
+from models.db import db
+from benchmarks.common import make_api_app, auth_header, populate, print_table, QueryCounter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    rows = []
+    counts = {"admin": set(), "patient": set()}
+    for size in args.sizes:
+        app = make_api_app()
+        client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            populate(size)
+            engine = db.engine
+        headers = {"admin": auth_header(app, 1, "admin"), "patient": auth_header(app, 1, "patient")}
+        # Warm up so before_first_request table checks are not counted
+        client.get("/examinations", headers=headers["patient"])
+
+        for user_type, header in headers.items():
+            with QueryCounter(engine) as counter:
+                started = time.perf_counter()
+                response = client.get("/examinations", headers=header)
+                elapsed = (time.perf_counter() - started) * 1000
+            assert response.status_code == 200, response.get_json()
+            counts[user_type].add(counter.count)
+            rows.append((user_type, size, len(response.get_json()), counter.count, f"{elapsed:.1f}"))
+        os.remove(app.bench_db_path)
+
+    print_table(["caller", "appointments", "examinations", "queries", "ms"], rows)
+
+    failed = [user_type for user_type, seen in counts.items() if len(seen) > 1]
+    if failed:
+        print(f"\n✗ Query count grows with row count for: {', '.join(failed)}")
+        sys.exit(1)
+    print("\n✓ Query count is constant")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Latency of examination full-text search at scale
+
+Fills a throwaway database with synthetic examinations whose diagnoses and
+prescriptions are drawn from a cardiology vocabulary, builds the FTS5 index,
+then times ExaminationModel.search (first page, filtered and paged queries,
+relevance and recent order) against the unranked LIKE scan it replaces.
+
+Usage (from backend/):
+    python -m benchmarks.bench_examination_search --examinations 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from models.db import db
+from models.patient import PatientModel
+from models.doctor import DoctorModel
+from models.appointment import AppointmentModel
+from models.examination import ExaminationModel
+from models import examination_search
+from benchmarks.common import make_app, print_table
+
+DIAGNOSES = [
+    "Paroxysmal atrial fibrillation", "Persistent atrial fibrillation", "Atrial flutter",
+    "Stable angina", "Unstable angina", "Hypertensive heart disease", "Heart failure with reduced ejection fraction",
+    "Heart failure with preserved ejection fraction", "Mitral regurgitation", "Aortic stenosis",
+    "Supraventricular tachycardia", "Ventricular ectopics", "Dilated cardiomyopathy", "Hypertrophic cardiomyopathy",
+    "Pericarditis", "Sinus bradycardia", "Complete heart block", "Non-ST elevation myocardial infarction",
+]
+QUALIFIERS = ["", "suspected", "follow-up of", "worsening", "well controlled", "newly diagnosed", "resolved"]
+PRESCRIPTIONS = [
+    "Apixaban 5mg twice daily", "Warfarin, target INR 2-3", "Bisoprolol 2.5mg", "Metoprolol 50mg",
+    "Aspirin 81mg", "Atorvastatin 40mg", "Ramipril 5mg", "Furosemide 40mg", "Spironolactone 25mg",
+    "Amiodarone 200mg", "Digoxin 125mcg", "Nitroglycerin spray as needed", "Clopidogrel 75mg",
+    "Sacubitril/valsartan 49/51mg", "Colchicine 0.5mg", "Lifestyle advice, repeat echo in 6 months",
+]
+QUERIES = [
+    ("no hits", {"text": "endocarditis"}),
+    ("phrase", {"text": '"complete heart block"'}),
+    ("common word", {"text": "angina"}),
+    ("common, recent", {"text": "angina", "sort": "recent"}),
+    ("two words", {"text": "atrial fibrillation"}),
+    ("prefix", {"text": "cardiomyo*"}),
+    ("word + doctor", {"text": "warfarin", "doctor_id": 7}),
+    ("word + patient", {"text": "aspirin", "patient_id": 42}),
+    ("word + 30 days", {"text": "pericarditis", "start": date.today() - timedelta(days=30)}),
+]
+
+
+def populate(examinations, seed=7, chunk_size=50000):
+    """Doctors, patients, one appointment per examination, and the examinations"""
+    rng = random.Random(seed)
+    doctor_count = max(10, examinations // 1000)
+    patient_count = max(10, examinations // 10)
+    first_day = date.today() - timedelta(days=5 * 365)
+    common = {
+        "password": "x", "last_name": "Bench", "gender": 0, "address": "Cairo",
+        "mobile": "0100000000", "birthdate": date(1970, 1, 1), "created_at": first_day,
+    }
+    db.session.execute(DoctorModel.__table__.insert(), [
+        {"id": i, "username": f"doctor_{i}", "first_name": f"Doc{i}", "email": f"d{i}@bench.test",
+         "specialization": "Cardiology", **common}
+        for i in range(1, doctor_count + 1)
+    ])
+    db.session.execute(PatientModel.__table__.insert(), [
+        {"id": i, "username": f"patient_{i}", "first_name": f"Pat{i}", "email": f"p{i}@bench.test", **common}
+        for i in range(1, patient_count + 1)
+    ])
+
+    for start in range(1, examinations + 1, chunk_size):
+        appointments, rows = [], []
+        for i in range(start, min(start + chunk_size, examinations + 1)):
+            day = first_day + timedelta(days=rng.randrange(5 * 365 + 1))
+            doctor_id, patient_id = rng.randrange(1, doctor_count + 1), rng.randrange(1, patient_count + 1)
+            appointments.append({
+                "id": i, "date": day, "created_at": day, "description": "Follow-up",
+                "doctor_id": doctor_id, "patient_id": patient_id,
+                "doctor_username": f"doctor_{doctor_id}", "patient_username": f"patient_{patient_id}",
+            })
+            diagnosis = " ".join(filter(None, [rng.choice(QUALIFIERS), rng.choice(DIAGNOSES)]))
+            if rng.random() < 0.3:
+                diagnosis += "; " + rng.choice(DIAGNOSES).lower()
+            rows.append({
+                "id": i, "appointment_id": i, "diagnosis": diagnosis,
+                "prescription": ", ".join(rng.sample(PRESCRIPTIONS, rng.randrange(1, 4))),
+            })
+        db.session.execute(AppointmentModel.__table__.insert(), appointments)
+        db.session.execute(ExaminationModel.__table__.insert(), rows)
+    db.session.commit()
+
+
+def latency(callback, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        callback()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def like_search(text, limit=20):
+    """What finding an examination took before: a LIKE scan over both columns"""
+    query = ExaminationModel.info_query().filter(
+        *examination_search.like_clause(text.strip('"*'), ExaminationModel.diagnosis, ExaminationModel.prescription)
+    )
+    return query.order_by(ExaminationModel.id.desc()).limit(limit).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--examinations", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--skip-like", action="store_true", help="do not time the LIKE baseline")
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        populate(args.examinations)
+        print(f"Inserted {args.examinations} examinations in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        indexed = examination_search.rebuild()
+        print(f"Indexed {indexed} examinations in {time.perf_counter() - started:.1f}s\n")
+
+        rows = []
+        for name, params in QUERIES:
+            results, next_cursor = ExaminationModel.search(limit=args.limit, **params)
+            first = latency(lambda: ExaminationModel.search(limit=args.limit, **params), args.repeat)
+            second = ("-", "-")
+            if next_cursor:
+                second = latency(
+                    lambda: ExaminationModel.search(after=next_cursor, limit=args.limit, **params), args.repeat
+                )
+            like = ("-", "-")
+            if not args.skip_like and len(params) == 1:
+                like = latency(lambda: like_search(params["text"], args.limit), max(1, args.repeat // 5))
+            rows.append((
+                name, len(results),
+                *(f"{value:.1f}" if value != "-" else value for value in (*first, *second, *like)),
+            ))
+        print_table(
+            ["query", "hits", "p50 ms", "p95 ms", "page 2 p50", "page 2 p95", "LIKE p50", "LIKE p95"], rows
+        )
+
+        # Cost the mapper events add to a normal insert
+        started = time.perf_counter()
+        for i in range(200):
+            ExaminationModel(i + 1, "Atrial fibrillation follow-up", "Apixaban 5mg twice daily").save_to_db()
+        print(f"\nORM insert with index sync: {(time.perf_counter() - started) / 200 * 1000:.2f} ms per examination")
+
+    os.remove(app.bench_db_path)
+
+
+if __name__ == "__main__":
+    main()
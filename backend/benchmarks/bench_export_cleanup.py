@@ -0,0 +1,78 @@
+"""
+Time expired-export cleanup on a large TreatmentExports table
+
+Inserts --rows expired exports (one file each for --files of them) and runs
+TreatmentExportModel.cleanup_expired, reporting rows and files removed,
+bytes reclaimed and wall time. --legacy also times the old row-by-row
+delete_from_db loop on a second copy.
+
+Usage (from backend/):
+    python -m benchmarks.bench_export_cleanup --rows 200000 --files 2000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from models.db import db
+from models.patient import PatientModel
+from models.treatment_export import TreatmentExportModel
+from benchmarks.common import make_app, bulk_insert, print_table
+
+
+def seed(rows, files, folder):
+    expired = datetime.utcnow() - timedelta(days=1)
+    bulk_insert(PatientModel, [{"id": 1, "username": "patient_1", "email": "patient_1@bench.test"}])
+    export_rows = []
+    for i in range(rows):
+        file_path = None
+        if i < files:
+            file_path = os.path.join(folder, f"export_{i}.csv")
+            with open(file_path, "wb") as export_file:
+                export_file.write(b"x" * 4096)
+        export_rows.append({
+            "patient_id": 1, "export_type": "csv", "status": "completed", "file_path": file_path,
+            "created_at": expired - timedelta(days=7), "expires_at": expired,
+        })
+    bulk_insert(TreatmentExportModel, export_rows)
+
+
+def legacy_cleanup():
+    expired_exports = TreatmentExportModel.query.filter(TreatmentExportModel.expires_at < datetime.utcnow()).all()
+    for export in expired_exports:
+        export.delete_from_db()
+    return len(expired_exports), 0, 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=TreatmentExportModel.CLEANUP_BATCH_SIZE)
+    parser.add_argument("--legacy", action="store_true", help="also time the old per-row delete (slow)")
+    args = parser.parse_args()
+
+    variants = [("batched", lambda: TreatmentExportModel.cleanup_expired(args.batch_size))]
+    if args.legacy:
+        variants.append(("legacy per-row", legacy_cleanup))
+
+    results = []
+    for label, callback in variants:
+        folder = tempfile.mkdtemp(prefix="bench_exports_")
+        app = make_app()
+        with app.app_context():
+            db.create_all()
+            seed(args.rows, args.files, folder)
+            started = time.perf_counter()
+            deleted, files_deleted, reclaimed = callback()
+            elapsed = time.perf_counter() - started
+        shutil.rmtree(folder)
+        os.remove(app.bench_db_path)
+        results.append((label, deleted, files_deleted, f"{reclaimed / 1024:.0f}", f"{elapsed:.2f}"))
+
+    print_table(["method", "exports", "files", "KiB reclaimed", "seconds"], results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark the hot finders before and after the lookup indexes are created
+
+Usage (from backend/):
+    python -m benchmarks.bench_indexes --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+from datetime import date, timedelta
+from sqlalchemy import inspect
+from models.db import db
+from models.admin import AdminModel
+from models.contact_us import ContactUsModel
+from models.patient import PatientModel
+from models.appointment import AppointmentModel
+from models.doctor import DoctorModel
+from models.examination import ExaminationModel
+from models.treatment_export import TreatmentExportModel
+from models.daily_stats import DailyStatsModel
+from models import analytics
+from models.migrations import add_missing_indexes
+from benchmarks.common import make_app, populate, timed, print_table
+
+
+def drop_model_indexes():
+    """Drop the declared (non-unique) indexes to recreate the pre-migration schema"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                index.drop(bind=db.engine)
+    db.engine.execute("ANALYZE")
+
+
+def finders(sizes):
+    """The finder calls that sit on request and job hot paths"""
+    busy_day = date.today() - timedelta(days=200)
+    doctor_id = max(1, sizes["doctors"] // 2)
+    patient_id = max(1, sizes["patients"] // 2)
+    return [
+        ("AppointmentModel.find_by_date", lambda: AppointmentModel.find_by_date(busy_day)),
+        ("DoctorModel.appointments", lambda: DoctorModel.find_by_id(doctor_id).appointments),
+        ("PatientModel.appointments", lambda: PatientModel.find_by_id(patient_id).appointments),
+        ("ExaminationModel.find_all_filtered", lambda: ExaminationModel.find_all_filtered(patient_id)),
+        ("TreatmentExportModel.queue_depth", TreatmentExportModel.queue_depth),
+        ("TreatmentExportModel.find_by_patient_id", lambda: TreatmentExportModel.find_by_patient_id(patient_id)),
+        ("analytics.find_count", lambda: analytics.find_count(busy_day, "day")),
+    ]
+
+
+def run(size, repeat):
+    app = make_app()
+    results = []
+    with app.app_context():
+        db.create_all()
+        sizes = populate(size)
+        DailyStatsModel.rebuild()  # the rollup analytics.find_count reads
+
+        drop_model_indexes()
+        before = {name: timed(call, repeat) for name, call in finders(sizes)}
+        add_missing_indexes()
+        after = {name: timed(call, repeat) for name, call in finders(sizes)}
+
+        for name, _ in finders(sizes):
+            speedup = before[name] / after[name] if after[name] else float("inf")
+            results.append((name, size, f"{before[name]:.2f}", f"{after[name]:.2f}", f"{speedup:.1f}x"))
+        db.session.remove()
+    os.remove(app.bench_db_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        print(f"Populating {size} appointments...")
+        rows.extend(run(size, args.repeat))
+    print()
+    print_table(["finder", "rows", "before ms", "after ms", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
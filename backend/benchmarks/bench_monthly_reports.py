@@ -0,0 +1,138 @@
+"""
+Time monthly report generation for a large department
+
+Seeds --doctors doctors with --per-doctor appointments each in the current
+month (~70% examined), then builds every doctor's report twice: the old way
+(one appointment query per doctor, one examination query per appointment,
+nested scan and string concatenation) and through models.monthly_report
+(one query, in-memory grouping, compiled template, serial and process pool).
+
+Usage (from backend/):
+    python -m benchmarks.bench_monthly_reports --doctors 200 --per-doctor 500
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from models.db import db
+from models.patient import PatientModel
+from models.doctor import DoctorModel
+from models.appointment import AppointmentModel
+from models.examination import ExaminationModel
+from models.monthly_report import build_report_contexts, render_reports
+from benchmarks.common import make_app, bulk_insert, print_table, QueryCounter
+
+
+def seed(doctors, per_doctor, month_start, days_in_month, seed=42):
+    rng = random.Random(seed)
+    patients = max(10, doctors * per_doctor // 20)
+    bulk_insert(DoctorModel, [
+        {
+            "id": i, "username": f"doctor_{i}", "password": "x", "first_name": f"Doc{i}",
+            "last_name": "Bench", "email": f"doctor_{i}@bench.test", "specialization": "Cardiology",
+        }
+        for i in range(1, doctors + 1)
+    ])
+    bulk_insert(PatientModel, [
+        {
+            "id": i, "username": f"patient_{i}", "password": "x", "first_name": f"Pat{i}",
+            "last_name": "Bench", "email": f"patient_{i}@bench.test",
+        }
+        for i in range(1, patients + 1)
+    ])
+    appointments, examinations = [], []
+    for i in range(1, doctors * per_doctor + 1):
+        doctor_id = (i - 1) // per_doctor + 1
+        appointments.append({
+            "id": i, "doctor_id": doctor_id, "patient_id": rng.randrange(1, patients + 1),
+            "date": month_start + timedelta(days=rng.randrange(days_in_month)),
+            "description": "Follow-up",
+        })
+        if rng.random() < 0.7:
+            examinations.append({"appointment_id": i, "diagnosis": "Stable angina " * 5, "prescription": "Aspirin"})
+    bulk_insert(AppointmentModel, appointments)
+    bulk_insert(ExaminationModel, examinations)
+
+
+def legacy_reports(month_start, month_end, month):
+    """The per-doctor / per-appointment implementation this replaced"""
+    reports = []
+    for doctor in DoctorModel.query.all():
+        appointments = AppointmentModel.query.filter(
+            AppointmentModel.doctor_id == doctor.id,
+            AppointmentModel.date.between(month_start, month_end)
+        ).all()
+        if not appointments:
+            continue
+        examinations = []
+        for appointment in appointments:
+            examinations.extend(ExaminationModel.query.filter_by(appointment_id=appointment.id).all())
+        rows = ""
+        for appointment in appointments:
+            exam_info = "N/A"
+            for exam in examinations:
+                if exam.appointment_id == appointment.id:
+                    exam_info = f"Diagnosis: {exam.diagnosis[:50]}..."
+                    break
+            rows += f"""
+            <tr>
+                <td>{appointment.date.strftime("%Y-%m-%d")}</td>
+                <td>{appointment.patient.first_name} {appointment.patient.last_name}</td>
+                <td>{exam_info}</td>
+            </tr>
+            """
+        reports.append(f"<html><p>Dr. {doctor.first_name} {doctor.last_name} {month}</p>{rows}</html>")
+    return reports
+
+
+def set_based_reports(month_start, month_end, month, processes):
+    doctors = DoctorModel.query.all()
+    rows = AppointmentModel.find_report_rows(month_start, month_end)
+    contexts = build_report_contexts(doctors, rows, month)
+    return render_reports(contexts, processes=processes, threshold=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--per-doctor", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--skip-legacy", action="store_true", help="the old path issues one query per appointment")
+    args = parser.parse_args()
+
+    today = date.today()
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    month = datetime.now().strftime("%B %Y")
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed(args.doctors, args.per_doctor, month_start, month_end.day)
+        print(f"Seeded {args.doctors * args.per_doctor} appointments in {time.perf_counter() - started:.1f}s\n")
+
+        variants = [
+            ("set-based, serial render", lambda: set_based_reports(month_start, month_end, month, 1)),
+            (f"set-based, {args.processes} processes", lambda: set_based_reports(month_start, month_end, month, args.processes)),
+        ]
+        if not args.skip_legacy:
+            variants.insert(0, ("legacy per-row queries", lambda: legacy_reports(month_start, month_end, month)))
+
+        results = []
+        for label, callback in variants:
+            db.session.remove()
+            with QueryCounter(db.engine) as counter:
+                started = time.perf_counter()
+                reports = callback()
+                elapsed = time.perf_counter() - started
+            results.append((label, len(reports), counter.count, f"{elapsed:.2f}", f"{len(reports) / elapsed:.1f}"))
+        db.session.remove()
+    os.remove(app.bench_db_path)
+
+    print_table(["method", "reports", "queries", "seconds", "reports/s"], results)
+
+
+if __name__ == "__main__":
+    main()
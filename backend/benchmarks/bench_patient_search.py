@@ -0,0 +1,165 @@
+"""
+Latency of patient lookup at scale
+
+Fills a throwaway database with synthetic patients (names drawn from common
+first and last names, unique emails, usernames and mobiles) and appointments
+spread over a few hundred doctors, builds the FTS5 lookup index, then times
+PatientModel.search for prefix, email, mobile, typo and doctor-scoped lookups
+against the LIKE scan it replaces.
+
+Usage (from backend/):
+    python -m benchmarks.bench_patient_search --patients 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from sqlalchemy import or_
+from models.db import db
+from models.patient import PatientModel
+from models.doctor import DoctorModel
+from models.appointment import AppointmentModel
+from models import patient_search
+from benchmarks.common import make_app, print_table
+
+FIRST_NAMES = [
+    "Ahmed", "Mohamed", "Mahmoud", "Omar", "Youssef", "Mostafa", "Karim", "Hassan", "Ali", "Tarek",
+    "Fatma", "Mariam", "Nour", "Salma", "Aya", "Hana", "Yasmin", "Laila", "Sara", "Dina",
+    "John", "Jonathan", "Michael", "David", "James", "Mary", "Jennifer", "Elizabeth", "Linda", "Susan",
+]
+LAST_NAMES = [
+    "Hassan", "Ibrahim", "Mahmoud", "Abdelrahman", "Saleh", "Farouk", "Mansour", "Nasser", "Khalil", "Fahmy",
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Wilson", "Anderson",
+    "Thompson", "Martinez", "Robinson", "Clark", "Lewis", "Walker", "Hall", "Young", "King", "Wright",
+]
+DOMAINS = ["mail.test", "example.test", "clinic.test"]
+QUERIES = [
+    ("no hits", {"text": "zebulon"}),
+    ("one letter", {"text": "m"}),
+    ("first name prefix", {"text": "yas"}),
+    ("full name", {"text": "Jonathan Smith"}),
+    ("name + id prefix", {"text": "tarek fahmy 1"}),
+    ("email prefix", {"text": "sara.clark.4"}),
+    ("mobile digits", {"text": "+20 100 12"}),
+    ("username", {"text": "p_123456"}),
+    ("typo", {"text": "jonathn smiht"}),
+    ("doctor scope", {"text": "ahm", "doctor_id": 7}),
+    ("doctor + typo", {"text": "mohamd", "doctor_id": 7}),
+]
+
+
+def populate(patients, seed=11, chunk_size=50000):
+    """Doctors, patients and ~3 appointments per patient"""
+    rng = random.Random(seed)
+    doctor_count = max(10, patients // 2000)
+    first_day = date.today() - timedelta(days=3 * 365)
+    common = {"password": "x", "gender": 0, "address": "Cairo", "birthdate": date(1980, 1, 1), "created_at": first_day}
+    db.session.execute(DoctorModel.__table__.insert(), [
+        {"id": i, "username": f"doctor_{i}", "first_name": f"Doc{i}", "last_name": "Bench",
+         "email": f"d{i}@bench.test", "mobile": "0100000000", "specialization": "Cardiology", **common}
+        for i in range(1, doctor_count + 1)
+    ])
+
+    appointment_id = 0
+    for start in range(1, patients + 1, chunk_size):
+        rows, appointments = [], []
+        for i in range(start, min(start + chunk_size, patients + 1)):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            rows.append({
+                "id": i, "first_name": first, "last_name": last,
+                "email": f"{first.lower()}.{last.lower()}.{i}@{rng.choice(DOMAINS)}",
+                "mobile": f"+20 10{rng.randrange(10)} {rng.randrange(10**7):07d}",
+                "username": f"p_{i}", **common,
+            })
+            for _ in range(rng.randrange(1, 6)):
+                appointment_id += 1
+                doctor_id = rng.randrange(1, doctor_count + 1)
+                day = first_day + timedelta(days=rng.randrange(3 * 365))
+                appointments.append({
+                    "id": appointment_id, "date": day, "created_at": day, "description": "Visit",
+                    "doctor_id": doctor_id, "patient_id": i,
+                    "doctor_username": f"doctor_{doctor_id}", "patient_username": f"p_{i}",
+                })
+        db.session.execute(PatientModel.__table__.insert(), rows)
+        db.session.execute(AppointmentModel.__table__.insert(), appointments)
+    db.session.commit()
+    return appointment_id
+
+
+def latency(callback, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        callback()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def like_search(text, doctor_id=None, limit=10):
+    """What a lookup costs without the index: a LIKE scan over every searched column"""
+    query = PatientModel.query
+    if doctor_id is not None:
+        query = query.filter(PatientModel.appointments.any(AppointmentModel.doctor_id == doctor_id))
+    for token in patient_search.query_tokens(text):
+        query = query.filter(or_(
+            PatientModel.first_name.ilike(f"%{token}%"), PatientModel.last_name.ilike(f"%{token}%"),
+            PatientModel.email.ilike(f"%{token}%"), PatientModel.mobile.like(f"%{token}%"),
+            PatientModel.username.ilike(f"%{token}%"),
+        ))
+    return query.order_by(PatientModel.id.desc()).limit(limit).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--patients", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--skip-like", action="store_true", help="do not time the LIKE baseline")
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        appointments = populate(args.patients)
+        print(f"Inserted {args.patients} patients and {appointments} appointments "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        indexed = patient_search.rebuild()
+        print(f"Indexed {indexed} patients in {time.perf_counter() - started:.1f}s\n")
+
+        rows = []
+        for name, params in QUERIES:
+            results = PatientModel.search(limit=args.limit, **params)
+            indexed_ms = latency(lambda: PatientModel.search(limit=args.limit, **params), args.repeat)
+            like = ("-", "-")
+            if not args.skip_like:
+                like = latency(lambda: like_search(limit=args.limit, **params), max(1, args.repeat // 10))
+            rows.append((
+                name, len(results),
+                *(f"{value:.1f}" if value != "-" else value for value in (*indexed_ms, *like)),
+            ))
+        print_table(["query", "hits", "p50 ms", "p95 ms", "LIKE p50", "LIKE p95"], rows)
+
+        # Cost the mapper events add to a normal insert (password hashing left out)
+        patients = [
+            PatientModel(
+                "Bench", "Insert", f"insert{i}@bench.test", "0100000000", 0,
+                date(1980, 1, 1), f"insert_{i}", "x", "Cairo", date.today(),
+            )
+            for i in range(200)
+        ]
+        started = time.perf_counter()
+        for patient in patients:
+            patient.save_to_db()
+        print(f"\nORM insert with index sync: {(time.perf_counter() - started) / 200 * 1000:.2f} ms per patient")
+
+    os.remove(app.bench_db_path)
+
+
+if __name__ == "__main__":
+    main()
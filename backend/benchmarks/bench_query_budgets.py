@@ -0,0 +1,91 @@
+"""
+SQL query budgets of every GET resource registered in app.py
+
+Fills a throwaway database with a synthetic clinic, then requests each GET
+endpoint (path parameters filled with id 1) as an admin, a doctor and a
+patient, and reports the queries the first authorized call ran against the
+resource's QUERY_BUDGET, with suspected N+1 patterns. Exits with status 1 if
+any endpoint is over budget, so it can gate CI.
+
+Usage (from backend/):
+    python -m benchmarks.bench_query_budgets --appointments 2000 [--verbose]
+"""
+import argparse
+import os
+import re
+import sys
+from models.db import db
+from models.query_profiler import count_queries, resource_budgets
+from benchmarks.common import make_api_app, auth_header, populate, print_table
+
+_URL_PARAMETER = re.compile(r"<(?:(\w+):)?(\w+)>")
+# Query strings for endpoints that need them to do their real work
+QUERY_STRINGS = {
+    "analytics": "date=2024-01-15&bucket=month",
+    "examinationsearch": "q=angina",
+    "patientsearch": "q=pat1",
+}
+
+
+def concrete_url(rule):
+    """`rule` with every <converter:name> filled in with 1"""
+    return _URL_PARAMETER.sub("1", rule)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=2000)
+    parser.add_argument("--verbose", action="store_true", help="print the statements of every N+1 suspect")
+    args = parser.parse_args()
+
+    import app as application
+
+    app = make_api_app()
+    with app.app_context():
+        db.create_all()
+        populate(args.appointments)
+    client = app.test_client()
+    client.get("/doctors")  # before_first_request runs create_all; keep it out of the counts
+    roles = [auth_header(app, 1, user_type) for user_type in ("admin", "doctor", "patient")]
+
+    rows, over_budget = [], []
+    for endpoint, (resource, urls, budget) in sorted(resource_budgets(application.app).items()):
+        if not hasattr(resource, "get"):
+            continue
+        url = concrete_url(urls[0])
+        if endpoint in QUERY_STRINGS:
+            url += "?" + QUERY_STRINGS[endpoint]
+        # Budget the heaviest authorized call; a role an endpoint is not for often answers without SQL
+        stats, status_code = None, None
+        for headers in roles:
+            with count_queries() as role_stats:
+                try:
+                    response = client.get(url, headers=headers)
+                    response.get_data()  # streamed bodies query while they are read
+                    role_status = response.status_code
+                except Exception:  # PROPAGATE_EXCEPTIONS is on; a crash is a 500 here
+                    role_status = 500
+            if role_status in (401, 403) and stats is not None:
+                continue
+            if stats is None or status_code in (401, 403) or role_stats.count > stats.count:
+                stats, status_code = role_stats, role_status
+        suspects = stats.suspected_n_plus_one()
+        status = "ok" if stats.count <= budget else "OVER"
+        if status == "OVER":
+            over_budget.append(endpoint)
+        rows.append((
+            url, status_code, stats.count, budget, f"{stats.total_ms:.1f}",
+            ", ".join(f"{n}x" for _, n in suspects) or "-", status,
+        ))
+        if args.verbose and suspects:
+            print(f"{url}\n{stats.report()}\n")
+
+    print_table(["GET", "status", "queries", "budget", "db ms", "N+1 suspects", ""], rows)
+    os.remove(app.bench_db_path)
+    if over_budget:
+        print(f"\nOver budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+import os
+import statistics
+import tempfile
+import time
+from flask import Flask
+from models.db import db
+
+
+def make_app(db_path=None):
+    """Create a throwaway Flask app bound to a fresh SQLite file"""
+    if db_path is None:
+        handle, db_path = tempfile.mkstemp(suffix=".db", prefix="bench_")
+        os.close(handle)
+        os.remove(db_path)
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["UPLOAD_FOLDER"] = os.path.join(tempfile.gettempdir(), "bench_exports")
+    db.init_app(app)
+    app.bench_db_path = db_path
+    return app
+
+
+def bulk_insert(model, rows, chunk_size=50000):
+    """Insert plain dict rows through SQLAlchemy Core in large transactions"""
+    table = model.__table__
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(table.insert(), rows[start:start + chunk_size])
+    db.session.commit()
+
+
+def timed(callback, repeat=5):
+    """Run callback `repeat` times and return the median wall time in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        db.session.remove()
+        started = time.perf_counter()
+        callback()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def print_table(headers, rows):
+    """Print rows as a fixed-width text table"""
+    widths = [
+        max(len(str(headers[i])), *(len(str(row[i])) for row in rows)) if rows else len(headers[i])
+        for i in range(len(headers))
+    ]
+    line = "  ".join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print("-" * len(line))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
+
+
+def populate(appointments, seed=42):
+    """
+    Fill the bound database with a synthetic clinic of roughly `appointments` visits:
+    one doctor per 1000 appointments, one patient per 10, examinations for ~70%
+    of the visits and one export request per 10 appointments. The search indexes
+    are rebuilt afterwards, since bulk inserts bypass their sync hooks.
+    """
+    import random
+    from datetime import date, datetime, timedelta
+    from werkzeug.security import generate_password_hash
+    from models.patient import PatientModel
+    from models.appointment import AppointmentModel
+    from models.doctor import DoctorModel
+    from models.examination import ExaminationModel
+    from models.treatment_export import TreatmentExportModel
+    from models import examination_search, patient_search
+
+    rng = random.Random(seed)
+    password = generate_password_hash("bench")
+    first_day = date.today() - timedelta(days=3 * 365)
+    doctor_count = max(10, appointments // 1000)
+    patient_count = max(10, appointments // 10)
+
+    bulk_insert(DoctorModel, [
+        {
+            "id": i, "username": f"doctor_{i}", "password": password,
+            "first_name": f"Doc{i}", "last_name": "Bench", "email": f"doctor_{i}@bench.test",
+            "gender": i % 2, "address": "Cairo", "mobile": "0100000000",
+            "birthdate": date(1975, 1, 1), "specialization": "Cardiology",
+            "created_at": first_day + timedelta(days=rng.randrange(3 * 365)),
+        }
+        for i in range(1, doctor_count + 1)
+    ])
+    bulk_insert(PatientModel, [
+        {
+            "id": i, "username": f"patient_{i}", "password": password,
+            "first_name": f"Pat{i}", "last_name": "Bench", "email": f"patient_{i}@bench.test",
+            "gender": i % 2, "address": "Cairo", "mobile": "0100000000",
+            "birthdate": date(1960, 1, 1),
+            "created_at": first_day + timedelta(days=rng.randrange(3 * 365)),
+        }
+        for i in range(1, patient_count + 1)
+    ])
+
+    appointment_rows = []
+    examination_rows = []
+    for i in range(1, appointments + 1):
+        day = first_day + timedelta(days=rng.randrange(3 * 365 + 30))
+        doctor_id = rng.randrange(1, doctor_count + 1)
+        patient_id = rng.randrange(1, patient_count + 1)
+        appointment_rows.append({
+            "id": i, "date": day, "created_at": day - timedelta(days=rng.randrange(30)),
+            "description": "Follow-up", "doctor_id": doctor_id, "patient_id": patient_id,
+            "doctor_username": f"doctor_{doctor_id}", "patient_username": f"patient_{patient_id}",
+        })
+        if rng.random() < 0.7:
+            examination_rows.append({
+                "appointment_id": i, "diagnosis": "Stable angina", "prescription": "Aspirin 81mg",
+            })
+    bulk_insert(AppointmentModel, appointment_rows)
+    bulk_insert(ExaminationModel, examination_rows)
+
+    now = datetime.utcnow()
+    export_rows = []
+    for _ in range(max(1, appointments // 10)):
+        created = now - timedelta(minutes=rng.randrange(60 * 24 * 30))
+        export_rows.append({
+            "patient_id": rng.randrange(1, patient_count + 1), "export_type": "csv",
+            "status": "pending" if rng.random() < 0.01 else "completed",
+            "created_at": created, "expires_at": created + timedelta(days=7),
+        })
+    bulk_insert(TreatmentExportModel, export_rows)
+    examination_search.rebuild()
+    patient_search.rebuild()
+
+    return {"doctors": doctor_count, "patients": patient_count, "appointments": appointments}
+
+
+def make_api_app(db_path=None):
+    """
+    The real application from app.py, rebound to a fresh SQLite file,
+    so benchmarks can drive the registered resources through a test client.
+    """
+    import app as application
+
+    app = application.app
+    if db_path is None:
+        handle, db_path = tempfile.mkstemp(suffix=".db", prefix="bench_")
+        os.close(handle)
+        os.remove(db_path)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["TESTING"] = True
+    db.init_app(app)
+    app.bench_db_path = db_path
+    return app
+
+
+def auth_header(app, identity, user_type):
+    """Authorization header carrying a token for the given user type"""
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        token = create_access_token(identity=identity, user_claims={"type": user_type})
+    return {"Authorization": f"Bearer {token}"}
+
+
+class QueryCounter:
+    """Context manager counting the SQL statements sent to the engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before_cursor_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        from sqlalchemy import event
+
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
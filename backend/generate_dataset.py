@@ -0,0 +1,108 @@
+"""
+Generate a seeded synthetic clinic for load tests and benchmarks, e.g.
+
+    python generate_dataset.py --doctors 5000 --patients 2000000 --appointments 20000000
+
+writes a fresh SQLite database (synthetic.db unless --db is given); point
+SQLALCHEMY_DATABASE_URI at it, or copy it over data.db, to run the app on it.
+The same --seed and sizes give the same data.
+"""
+import argparse
+import os
+import time
+from datetime import date
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from models.db import db
+from models.admin import AdminModel
+from models.doctor import DoctorModel
+from models.patient import PatientModel
+from models.appointment import AppointmentModel
+from models.examination import ExaminationModel
+from models.daily_stats import DailyStatsModel
+from models import examination_search, patient_search
+from models.synthetic_data import DatasetPlan, generate, doctor_username, patient_username, PROCESSES
+
+parser = argparse.ArgumentParser(description="Fill a new database with a seeded synthetic clinic")
+parser.add_argument("--db", default="synthetic.db", help="SQLite file to create (default synthetic.db)")
+parser.add_argument("--overwrite", action="store_true", help="replace --db if it exists")
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--doctors", type=int, default=500)
+parser.add_argument("--patients", type=int, default=200000)
+parser.add_argument("--appointments", type=int, default=2000000)
+parser.add_argument("--years", type=float, default=5, help="history before --end to spread appointments over")
+parser.add_argument("--end", type=date.fromisoformat, default=date.today(), help="last past day, YYYY-MM-DD (default today)")
+parser.add_argument("--processes", type=int, default=PROCESSES, help="processes generating rows (1: generate in this one)")
+parser.add_argument("--chunk-size", type=int, default=100000, help="rows per chunk and per transaction")
+parser.add_argument("--skip-derived", action="store_true", help="do not rebuild the search indexes and the daily rollup")
+args = parser.parse_args()
+
+if os.path.exists(args.db):
+    if not args.overwrite:
+        parser.error(f"{args.db} exists; pass --overwrite to replace it")
+    os.remove(args.db)
+
+# Create a simple Flask app for context
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.abspath(args.db)}"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Initialize db with the app
+db.init_app(app)
+
+started = time.perf_counter()
+
+
+def elapsed():
+    return f"{time.perf_counter() - started:.0f}s"
+
+
+def progress(table, rows):
+    print(f"  {table}: {rows:,} ({elapsed()})")
+
+
+# Create app context
+with app.app_context():
+    db.create_all()
+
+    print("=" * 60)
+    print("GENERATING SYNTHETIC DATASET")
+    print("=" * 60)
+    print(f"ℹ️ {args.db}: {args.doctors:,} doctors, {args.patients:,} patients, "
+          f"{args.appointments:,} appointments, seed {args.seed}, {args.processes} process(es)")
+
+    # One hash per role instead of one per row
+    plan = DatasetPlan(
+        args.seed, args.doctors, args.patients, args.appointments, args.years, args.end,
+        doctor_password=generate_password_hash("doctor123"),
+        patient_password=generate_password_hash("patient123"),
+    )
+    AdminModel(username="admin", password="admin123", first_name="System", last_name="Admin").save_to_db()
+
+    tables = {
+        "doctors": DoctorModel.__table__,
+        "patients": PatientModel.__table__,
+        "appointments": AppointmentModel.__table__,
+        "examinations": ExaminationModel.__table__,
+    }
+    counts = generate(db.engine, plan, tables, args.processes, args.chunk_size, progress)
+    for table, rows in counts.items():
+        print(f"✓ Wrote {rows:,} {table}")
+    print(f"✓ Built indexes ({elapsed()})")
+
+    if args.skip_derived:
+        print("ℹ️ Skipped the search indexes and daily rollup; run rebuild_*_search.py and backfill_daily_stats.py")
+    else:
+        print(f"✓ Indexed {patient_search.rebuild():,} patient(s) for lookup ({elapsed()})")
+        print(f"✓ Indexed {examination_search.rebuild():,} examination(s) for search ({elapsed()})")
+        print(f"✓ Wrote daily counts for {DailyStatsModel.rebuild():,} day(s) ({elapsed()})")
+    db.session.execute("ANALYZE")
+    db.session.commit()
+
+    print("\n" + "=" * 60)
+    print(f"✓ Dataset generated in {elapsed()}")
+    print("=" * 60)
+    print("\nYou can now login with any of these credentials:\n")
+    print("  Admin:   admin / admin123")
+    print(f"  Doctor:  {doctor_username(1)} / doctor123 (the busiest doctor)")
+    print(f"  Patient: {patient_username(20)} / patient123 (a chronic patient)")
@@ -0,0 +1,45 @@
+import os
+import re
+from flask import Flask
+from models.db import db
+from models.patient import PatientModel
+from models.patient_image import PatientImageModel
+
+IMAGES_FOLDER = os.path.join("static", "images")
+
+# Create a simple Flask app for context
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///data.db"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Initialize db with the app
+db.init_app(app)
+
+# Create app context
+with app.app_context():
+    # Create the PatientImages table if it doesn't exist
+    db.create_all()
+
+    print("=" * 60)
+    print("MOVING PATIENT IMAGES INTO THE BLOB STORE")
+    print("=" * 60)
+
+    total = 0
+    if os.path.isdir(IMAGES_FOLDER):
+        for name in sorted(os.listdir(IMAGES_FOLDER)):
+            match = re.fullmatch(r"patient_(\d+)", name)
+            folder = os.path.join(IMAGES_FOLDER, name)
+            if not match or not os.path.isdir(folder):
+                continue
+            patient_id = int(match.group(1))
+            if not PatientModel.find_by_id(patient_id):
+                print(f"ℹ️ Skipping {folder}: no patient with id {patient_id}")
+                continue
+            moved = PatientImageModel.index_folder(patient_id, IMAGES_FOLDER)
+            total += moved
+            if moved:
+                print(f"✓ Patient {patient_id}: moved {moved} image(s)")
+
+    print(f"✓ Moved {total} image(s) into the blob store")
+    print("ℹ️ Run backfill_image_derivatives.py to render their thumbnails and previews")
+    print("=" * 60)
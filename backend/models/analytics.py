@@ -1,77 +1,47 @@
 from datetime import datetime, timedelta
-from models.patient import PatientModel
-from models.doctor import DoctorModel
-from models.appointment import AppointmentModel
-from sqlalchemy import func
+from models.daily_stats import DailyStatsModel
 
+BUCKETS = ("day", "week", "month")
 
-def find_count(date: datetime):
-    end_date = datetime.now().date()
 
-    latest_appointment = (
-        AppointmentModel.query.with_entities(func.max(AppointmentModel.created_at))
-        .scalar()
-    )
-    latest_doctor = (
-        DoctorModel.query.with_entities(func.max(DoctorModel.created_at)).scalar()
-    )
-    latest_patient = (
-        PatientModel.query.with_entities(func.max(PatientModel.created_at)).scalar()
-    )
+def _bucket_start(day, bucket):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
 
-    latest_dates = [d for d in [latest_appointment, latest_doctor, latest_patient] if d]
-    if latest_dates:
-        end_date = max(end_date, max(latest_dates))
+def find_count(date: datetime, bucket: str = "day"):
+    """
+    Daily (or weekly/monthly) counts of new appointments, doctors and patients
+    from `date` up to today, read from the DailyStats rollup in one range query.
+    """
+    end_date = datetime.now().date()
+
+    latest = DailyStatsModel.latest_date()
+    if latest:
+        end_date = max(end_date, latest)
 
     if date > end_date:
         date = end_date
+    start_date = _bucket_start(date, bucket)
 
-    analytics_list = []
-    while date <= end_date:
-        analytics_list.append(
-            {"date": date, "doctors": "0", "patients": "0", "appointments": "0"}
-        )
-        date += timedelta(days=1)
-
-    appointments = (
-        AppointmentModel.query.with_entities(
-            AppointmentModel.created_at, func.count(AppointmentModel.id)
-        )
-        .group_by(AppointmentModel.created_at)
-        .all()
-    )
-    doctors = (
-        DoctorModel.query.with_entities(
-            DoctorModel.created_at, func.count(DoctorModel.id)
-        )
-        .group_by(DoctorModel.created_at)
-        .all()
-    )
-    patients = (
-        PatientModel.query.with_entities(
-            PatientModel.created_at, func.count(PatientModel.id)
+    buckets = {}
+    day = start_date
+    while day <= end_date:
+        buckets.setdefault(
+            _bucket_start(day, bucket), {"doctors": 0, "patients": 0, "appointments": 0}
         )
-        .group_by(PatientModel.created_at)
-        .all()
-    )
-    appointment = 0
-    doctor = 0
-    patient = 0
-    
-    for x in analytics_list:
-        if appointments and appointment<len(appointments):
-            if x["date"] == appointments[appointment][0]:
-                x["appointments"] = appointments[appointment][1]
-                appointment += 1
-
-        if doctors and doctor<len(doctors):
-            if x["date"] == doctors[doctor][0]:
-                x["doctors"] = doctors[doctor][1]
-                doctor += 1
-        if patients and patient<len(patients):
-            if x["date"] == patients[patient][0]:
-                x["patients"] = patients[patient][1]
-                patient += 1
-        x["date"] = x["date"].strftime("%Y-%m-%d")
-
-    return analytics_list
+        day += timedelta(days=1)
+
+    for stats in DailyStatsModel.find_range(start_date, end_date):
+        totals = buckets[_bucket_start(stats.date, bucket)]
+        totals["appointments"] += stats.appointments
+        totals["doctors"] += stats.doctors
+        totals["patients"] += stats.patients
+
+    return [
+        {"date": bucket_date.strftime("%Y-%m-%d"), **totals}
+        for bucket_date, totals in buckets.items()
+    ]
@@ -1,5 +1,8 @@
 from models.db import db
 from datetime import datetime, timedelta
+from sqlalchemy import exists, func
+from models.pagination import paginate, DEFAULT_PAGE_SIZE
+from models.daily_stats import DailyStatsModel
 import pickle
 import os.path
 from googleapiclient.discovery import build
@@ -9,6 +12,12 @@ from google.auth.transport.requests import Request
 
 class AppointmentModel(db.Model):
     __tablename__ = "Appointments"
+    __table_args__ = (
+        db.Index("ix_Appointments_date_patient_id", "date", "patient_id"),
+        db.Index("ix_Appointments_doctor_id_date", "doctor_id", "date"),
+        db.Index("ix_Appointments_patient_id_date", "patient_id", "date"),
+        db.Index("ix_Appointments_created_at", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date)
@@ -47,10 +56,13 @@ class AppointmentModel(db.Model):
         }
 
     def save_to_db(self):
+        if self.id is None:
+            DailyStatsModel.increment(self.created_at, "appointments")
         db.session.add(self)
         db.session.commit()
 
     def delete_from_db(self):
+        DailyStatsModel.increment(self.created_at, "appointments", -1)
         db.session.delete(self)
         db.session.commit()
 
@@ -62,10 +74,103 @@ class AppointmentModel(db.Model):
     def find_all(cls):
         return cls.query.all()
 
+    @classmethod
+    def find_page(cls, after=None, limit=DEFAULT_PAGE_SIZE):
+        return paginate(cls.query, [cls.id], after, limit)
+
     @classmethod
     def find_by_date(cls, date):
         return cls.query.filter_by(date=date).all()
 
+    @classmethod
+    def find_reminder_recipients(cls, date):
+        """
+        Everything a reminder needs for the appointments on `date`, in one joined query:
+        rows of (date, patient_email, patient first/last name, doctor first/last name).
+        """
+        from models.patient import PatientModel
+        from models.doctor import DoctorModel
+
+        return (
+            db.session.query(
+                cls.id,
+                cls.date,
+                PatientModel.email.label("patient_email"),
+                PatientModel.first_name.label("patient_first_name"),
+                PatientModel.last_name.label("patient_last_name"),
+                DoctorModel.first_name.label("doctor_first_name"),
+                DoctorModel.last_name.label("doctor_last_name"),
+            )
+            .join(PatientModel, PatientModel.id == cls.patient_id)
+            .join(DoctorModel, DoctorModel.id == cls.doctor_id)
+            .filter(cls.date == date)
+            .order_by(cls.id)
+            .all()
+        )
+
+    @classmethod
+    def find_report_rows(cls, start, end):
+        """
+        Every appointment between `start` and `end` (inclusive) with its patient's
+        name and its examinations, in one outer-joined query ordered by doctor.
+        Appointments with several examinations appear once per examination;
+        those without any have a NULL examination_id.
+        """
+        from models.patient import PatientModel
+        from models.examination import ExaminationModel
+
+        return (
+            db.session.query(
+                cls.id,
+                cls.doctor_id,
+                cls.date,
+                PatientModel.first_name.label("patient_first_name"),
+                PatientModel.last_name.label("patient_last_name"),
+                ExaminationModel.id.label("examination_id"),
+                ExaminationModel.diagnosis,
+            )
+            .outerjoin(PatientModel, PatientModel.id == cls.patient_id)
+            .outerjoin(ExaminationModel, ExaminationModel.appointment_id == cls.id)
+            .filter(cls.date.between(start, end))
+            .order_by(cls.doctor_id, cls.date, cls.id, ExaminationModel.id)
+            .all()
+        )
+
+    @classmethod
+    def pending_for_doctor(cls, doctor_id, start=None, end=None):
+        """
+        Query of a doctor's appointments that have no examination yet.
+        Uses NOT EXISTS (anti-join) so the database does the filtering in one pass.
+        """
+        from models.examination import ExaminationModel
+
+        query = cls.query.filter(
+            cls.doctor_id == doctor_id,
+            ~exists().where(ExaminationModel.appointment_id == cls.id),
+        )
+        if start:
+            query = query.filter(cls.date >= start)
+        if end:
+            query = query.filter(cls.date <= end)
+        return query
+
+    @classmethod
+    def find_pending_by_doctor(cls, doctor_id, start=None, end=None, after=None, limit=None):
+        """
+        Pending queue ordered by (date, id), served by the (doctor_id, date) index.
+        Returns (appointments, next_cursor).
+        """
+        query = cls.pending_for_doctor(doctor_id, start, end)
+        return paginate(query, [cls.date, cls.id], after, limit)
+
+    @classmethod
+    def count_pending_by_doctor(cls, doctor_id, start=None, end=None):
+        return (
+            cls.pending_for_doctor(doctor_id, start, end)
+            .with_entities(func.count(cls.id))
+            .scalar()
+        )
+
     @classmethod
     def main(cls, start_time):
         """
@@ -1 +1,222 @@
-BLACKLIST = set()
+"""
+Token revocation store - revoked JWT ids are persisted with their expiry so
+logouts survive restarts and are shared between worker processes.
+
+Every authenticated request asks whether its token was revoked, and the answer
+is almost always "no". An in-process bloom filter answers that case from memory;
+only a possible hit is confirmed against a small LRU and then the database.
+Revocations made by other workers are pulled in every few seconds by a
+background thread.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from models.db import db
+
+
+class RevokedTokenModel(db.Model):
+    __tablename__ = "RevokedTokens"
+
+    jti = db.Column(db.String(36), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __init__(self, jti: str, expires_at: datetime):
+        self.jti = jti
+        self.expires_at = expires_at
+        self.revoked_at = datetime.utcnow()
+
+    def save_to_db(self):
+        db.session.merge(self)
+        db.session.commit()
+
+    @classmethod
+    def find_by_jti(cls, jti: str):
+        return cls.query.filter_by(jti=jti).first()
+
+    @classmethod
+    def find_active_jtis(cls):
+        """jti of every revoked token that has not expired yet"""
+        rows = db.session.query(cls.jti).filter(cls.expires_at > datetime.utcnow())
+        return [row.jti for row in rows]
+
+    @classmethod
+    def find_jtis_revoked_since(cls, since: datetime):
+        rows = db.session.query(cls.jti).filter(cls.revoked_at >= since)
+        return [row.jti for row in rows]
+
+    @classmethod
+    def prune_expired(cls):
+        """Delete revocations whose token has expired anyway. Returns the number removed"""
+        count = cls.query.filter(cls.expires_at <= datetime.utcnow()).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        return count
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (no false negatives, ~error_rate false positives)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(value))
+
+
+class RevocationCache:
+    """
+    Set-like front for RevokedTokenModel: `jti in cache` and `cache.add(jti, exp)`.
+
+    A background thread (started by the first lookup, in every process) pulls
+    revocations from the database every sync_seconds and rebuilds the filter
+    every rebuild_seconds; it queries without the lock and only swaps the result
+    in under it, so the "not revoked" answer never waits on I/O. Bloom hits are
+    confirmed against the database outside the lock. Until the first load
+    finishes, lookups go to the database. Must be used inside an app context.
+    """
+
+    def __init__(self, sync_seconds: float = 5, rebuild_seconds: float = 3600,
+                 capacity: int = 100000, lru_size: int = 4096):
+        self.sync_seconds = sync_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.capacity = capacity
+        self.lru_size = lru_size
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # one sync or rebuild at a time; lookups never take it
+        self._bloom = None
+        self._confirmed = OrderedDict()
+        self._version = 0  # bumped whenever a jti may have become revoked
+        self._added_during_rebuild = None
+        self._synced_at = None
+        self._thread_pid = None
+
+    def _start(self):
+        """Start the sync thread of this process (again after a fork)"""
+        from flask import current_app
+
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        app = current_app._get_current_object()
+        threading.Thread(target=self._sync_loop, args=(app,), name="revocation-sync", daemon=True).start()
+
+    def _sync_loop(self, app):
+        next_rebuild = 0.0
+        with app.app_context():
+            while True:
+                try:
+                    if time.monotonic() >= next_rebuild or self._bloom.count > self._bloom.capacity:
+                        self._rebuild()
+                        next_rebuild = time.monotonic() + self.rebuild_seconds
+                    else:
+                        self._sync()
+                except Exception as e:
+                    print(f"❌ ERROR syncing revoked tokens: {str(e)}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                time.sleep(self.sync_seconds)
+
+    def _rebuild(self):
+        """Load every active revocation into a new filter and swap it in"""
+        with self._refresh_lock:
+            with self._lock:
+                self._added_during_rebuild = []
+            started_at = datetime.utcnow()
+            jtis = RevokedTokenModel.find_active_jtis()
+            bloom = BloomFilter(max(self.capacity, len(jtis) * 2))
+            for jti in jtis:
+                bloom.add(jti)
+            with self._lock:
+                # Revocations made here while the database was being read
+                for jti in self._added_during_rebuild:
+                    bloom.add(jti)
+                self._added_during_rebuild = None
+                self._bloom = bloom
+                self._confirmed.clear()
+                self._version += 1
+                self._synced_at = started_at
+
+    def _sync(self):
+        """Add revocations made since the last sync (by any process) to the filter"""
+        with self._refresh_lock:
+            started_at = datetime.utcnow()
+            # Overlap by a second so a revocation committed mid-sync is not missed
+            jtis = RevokedTokenModel.find_jtis_revoked_since(self._synced_at - timedelta(seconds=1))
+            with self._lock:
+                for jti in jtis:
+                    self._bloom.add(jti)
+                    self._confirmed.pop(jti, None)
+                if jtis:
+                    self._version += 1
+                self._synced_at = started_at
+
+    def _remember(self, jti: str, revoked: bool):
+        self._confirmed[jti] = revoked
+        self._confirmed.move_to_end(jti)
+        if len(self._confirmed) > self.lru_size:
+            self._confirmed.popitem(last=False)
+
+    def __contains__(self, jti: str):
+        if self._thread_pid != os.getpid():
+            self._start()
+        with self._lock:
+            if self._bloom is not None:
+                if jti not in self._bloom:
+                    return False
+                if jti in self._confirmed:
+                    self._confirmed.move_to_end(jti)
+                    return self._confirmed[jti]
+            version = self._version
+        revoked = RevokedTokenModel.find_by_jti(jti) is not None
+        with self._lock:
+            # Unless it may have been revoked while we were asking
+            if self._bloom is not None and self._version == version:
+                self._remember(jti, revoked)
+        return revoked
+
+    def add(self, jti: str, expires_at):
+        """Revoke a token; `expires_at` is the token's `exp` (epoch seconds or datetime)"""
+        if not isinstance(expires_at, datetime):
+            expires_at = datetime.utcfromtimestamp(expires_at)
+        RevokedTokenModel(jti, expires_at).save_to_db()
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+            if self._added_during_rebuild is not None:
+                self._added_during_rebuild.append(jti)
+            self._remember(jti, True)
+            self._version += 1
+
+    def prune(self):
+        """Drop expired revocations from the database and rebuild the filter without them"""
+        count = RevokedTokenModel.prune_expired()
+        self._rebuild()
+        return count
+
+
+BLACKLIST = RevocationCache(
+    sync_seconds=float(os.environ.get("TOKEN_REVOCATION_SYNC_SECONDS", 5))
+)
@@ -0,0 +1,105 @@
+"""
+Content-addressed image storage under static/images/blobs
+
+Every distinct upload is stored once, at blobs/<first two hex digits>/<sha256><ext>.
+The hash is computed while the upload is copied to disk, then the file is
+renamed into place (or dropped if that content is already stored).
+"""
+import hashlib
+import os
+import tempfile
+from models import tracing
+
+BLOB_FOLDER = "blobs"
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(content_hash, extension):
+    """Path of a blob relative to the images folder"""
+    return f"{BLOB_FOLDER}/{content_hash[:2]}/{content_hash}{extension}"
+
+
+def temp_folder(images_folder):
+    """Scratch folder for partial writes, on the same filesystem as the blobs"""
+    folder = os.path.join(images_folder, BLOB_FOLDER, "tmp")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+@tracing.traced("blob_store.store_stream")
+def store_stream(stream, extension, images_folder):
+    """
+    Copy `stream` into the blob store, hashing as it goes.
+    Returns (content_hash, size, relative path).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    handle, temp_path = tempfile.mkstemp(dir=temp_folder(images_folder))
+    try:
+        with os.fdopen(handle, "wb") as blob:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                blob.write(chunk)
+                size += len(chunk)
+        content_hash = digest.hexdigest()
+        relative_path = blob_path(content_hash, extension)
+        path = os.path.join(images_folder, relative_path)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return content_hash, size, relative_path
+
+
+@tracing.traced("blob_store.file_hash")
+def file_hash(path):
+    """sha256 hex digest and size of a file, read in CHUNK_SIZE blocks"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+@tracing.traced("blob_store.adopt_file")
+def adopt_file(path, extension, images_folder, content_hash=None):
+    """
+    Move a finished file (e.g. an assembled chunked upload under blobs/tmp) into
+    the blob store without copying it. Pass `content_hash` if it is already known.
+    Returns (content_hash, size, relative path).
+    """
+    if content_hash is None:
+        content_hash, size = file_hash(path)
+    else:
+        size = os.path.getsize(path)
+    relative_path = blob_path(content_hash, extension)
+    destination = os.path.join(images_folder, relative_path)
+    if os.path.exists(destination):
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(path, destination)
+    return content_hash, size, relative_path
+
+
+@tracing.traced("blob_store.store_file")
+def store_file(path, images_folder):
+    """Copy an existing file into the blob store. Returns (content_hash, size, relative path)"""
+    with open(path, "rb") as source:
+        return store_stream(source, os.path.splitext(path)[1].lower(), images_folder)
+
+
+@tracing.traced("blob_store.remove")
+def remove(images_folder, *relative_paths):
+    """Delete blob files (missing ones are ignored)"""
+    for relative_path in relative_paths:
+        if not relative_path:
+            continue
+        try:
+            os.remove(os.path.join(images_folder, relative_path))
+        except FileNotFoundError:
+            pass
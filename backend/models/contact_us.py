@@ -1,4 +1,5 @@
 from models.db import db
+from models.pagination import paginate, DEFAULT_PAGE_SIZE
 from datetime import datetime
 
 
@@ -48,3 +49,7 @@ class ContactUsModel(db.Model):
     @classmethod
     def find_all(cls):
         return cls.query.all()
+
+    @classmethod
+    def find_page(cls, after=None, limit=DEFAULT_PAGE_SIZE):
+        return paginate(cls.query, [cls.id], after, limit)
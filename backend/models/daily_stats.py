@@ -0,0 +1,91 @@
+from models.db import db
+from sqlalchemy import case, func
+
+
+class DailyStatsModel(db.Model):
+    """
+    Per-day rollup of new appointments, doctors and patients (keyed by created_at).
+    Kept current by the save_to_db/delete_from_db of those models, inside their transaction.
+    """
+
+    __tablename__ = "DailyStats"
+
+    COUNTERS = ("appointments", "doctors", "patients")
+
+    date = db.Column(db.Date, primary_key=True)
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+    doctors = db.Column(db.Integer, nullable=False, default=0)
+    patients = db.Column(db.Integer, nullable=False, default=0)
+
+    def json(self):
+        return {
+            "date": self.date.strftime("%Y-%m-%d"),
+            "doctors": self.doctors,
+            "patients": self.patients,
+            "appointments": self.appointments,
+        }
+
+    @classmethod
+    def increment(cls, day, counter: str, delta: int = 1):
+        """
+        Adjust one counter for `day` in the current session transaction.
+        Does not commit, so the change lands together with the caller's own row.
+        Counts never go below 0: rows created before the rollup was backfilled
+        were never counted, so deleting them has nothing to take off.
+        """
+        if day is None:
+            return
+        table = cls.__table__
+        adjusted = table.c[counter] + delta
+        result = db.session.execute(
+            table.update()
+            .where(table.c.date == day)
+            .values({counter: case([(adjusted < 0, 0)], else_=adjusted)})
+        )
+        if result.rowcount == 0 and delta > 0:
+            values = {name: 0 for name in cls.COUNTERS}
+            values[counter] = delta
+            db.session.execute(table.insert().values(date=day, **values))
+
+    @classmethod
+    def find_range(cls, start, end):
+        return (
+            cls.query.filter(cls.date >= start, cls.date <= end)
+            .order_by(cls.date)
+            .all()
+        )
+
+    @classmethod
+    def latest_date(cls):
+        return db.session.query(func.max(cls.date)).scalar()
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recompute the whole rollup from the source tables (backfill).
+        Returns the number of days written.
+        """
+        from models.patient import PatientModel
+        from models.doctor import DoctorModel
+        from models.appointment import AppointmentModel
+
+        sources = (
+            ("appointments", AppointmentModel),
+            ("doctors", DoctorModel),
+            ("patients", PatientModel),
+        )
+        days = {}
+        for counter, model in sources:
+            counts = (
+                db.session.query(model.created_at, func.count(model.id))
+                .filter(model.created_at.isnot(None))
+                .group_by(model.created_at)
+            )
+            for day, count in counts:
+                row = days.setdefault(day, {"date": day, **{name: 0 for name in cls.COUNTERS}})
+                row[counter] = count
+
+        cls.query.delete()
+        db.session.bulk_insert_mappings(cls, list(days.values()))
+        db.session.commit()
+        return len(days)
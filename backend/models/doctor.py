@@ -1,6 +1,8 @@
 from models.db import db
 from werkzeug.security import generate_password_hash
 from models.appointment import AppointmentModel
+from models.pagination import paginate, DEFAULT_PAGE_SIZE
+from models.daily_stats import DailyStatsModel
 from datetime import datetime
 
 
@@ -16,7 +18,7 @@ class DoctorModel(db.Model):
     address = db.Column(db.String(80))
     mobile = db.Column(db.String(80))
     birthdate = db.Column(db.Date)
-    created_at = db.Column(db.Date)
+    created_at = db.Column(db.Date, index=True)
     specialization = db.Column(db.String(120), default="General")
 
     appointments = db.relationship("AppointmentModel")
@@ -78,10 +80,13 @@ class DoctorModel(db.Model):
         }
 
     def save_to_db(self):
+        if self.id is None:
+            DailyStatsModel.increment(self.created_at, "doctors")
         db.session.add(self)
         db.session.commit()
 
     def delete_from_db(self):
+        DailyStatsModel.increment(self.created_at, "doctors", -1)
         db.session.delete(self)
         db.session.commit()
 
@@ -101,6 +106,10 @@ class DoctorModel(db.Model):
     def find_all(cls):
         return cls.query.all()
 
+    @classmethod
+    def find_page(cls, after=None, limit=DEFAULT_PAGE_SIZE):
+        return paginate(cls.query, [cls.id], after, limit)
+
     @classmethod
     def find_docotor_by_id_with_appointments(cls, doctor_id):
         return (
@@ -1,9 +1,17 @@
 """
-Email utility functions for sending reminders, reports, and notifications
+Email utility functions: build reminders, reports and notifications, queue
+them in the outbox, and send them in bulk
 """
 import os
-from flask import render_template_string
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
 from flask_mail import Mail, Message
+from models.email_outbox import EmailOutboxModel
+from models.template_registry import templates
+from models import metrics, tracing
 from datetime import datetime
 
 # Configuration for Flask-Mail
@@ -30,107 +38,182 @@ def init_mail(app):
     return mail
 
 
-def send_appointment_reminder(patient_email, patient_name, appointment_date, doctor_name, appointment_time="09:00 AM"):
-    """Send appointment reminder email to patient"""
-    try:
-        subject = f"Appointment Reminder - {appointment_date}"
-        html_body = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif;">
-                <div style="background-color: #f0f0f0; padding: 20px; border-radius: 5px;">
-                    <h2 style="color: #333;">Appointment Reminder</h2>
-                    <p>Dear {patient_name},</p>
-                    <p>This is a reminder that you have a scheduled appointment:</p>
-                    <table style="margin: 20px 0; border-collapse: collapse;">
-                        <tr>
-                            <td style="padding: 10px; font-weight: bold;">Date:</td>
-                            <td style="padding: 10px;">{appointment_date}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 10px; font-weight: bold;">Time:</td>
-                            <td style="padding: 10px;">{appointment_time}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 10px; font-weight: bold;">Doctor:</td>
-                            <td style="padding: 10px;">{doctor_name}</td>
-                        </tr>
-                    </table>
-                    <p>Please ensure you arrive 10 minutes early.</p>
-                    <p>Best regards,<br/>Cardiology Department Hospital Information System</p>
-                </div>
-            </body>
-        </html>
-        """
-        
-        msg = Message(subject=subject, recipients=[patient_email], html=html_body)
-        mail.send(msg)
-        print(f"✓ Appointment reminder sent to {patient_email}")
-        return True
-    except Exception as e:
-        print(f"✗ Error sending appointment reminder: {str(e)}")
-        return False
+class RateLimiter:
+    """Token bucket shared by sender threads; acquire() blocks until another send is allowed"""
 
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(self.next_slot, now) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
 
-def send_monthly_report(doctor_email, doctor_name, report_html):
-    """Send monthly activity report to doctor"""
-    try:
-        current_month = datetime.now().strftime("%B %Y")
-        subject = f"Monthly Activity Report - {current_month}"
-        
-        msg = Message(subject=subject, recipients=[doctor_email], html=report_html)
-        mail.send(msg)
-        print(f"✓ Monthly report sent to {doctor_email}")
-        return True
-    except Exception as e:
-        print(f"✗ Error sending monthly report: {str(e)}")
-        return False
 
+def shared_rate_limiter():
+    """This process's RateLimiter at MAIL_RATE_PER_SECOND (default 10, 0 = unlimited), or None"""
+    global _shared_limiter
+    rate_per_second = float(os.environ.get('MAIL_RATE_PER_SECOND', 10))
+    if not rate_per_second:
+        return None
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter(rate_per_second)
+        return _shared_limiter
 
-def send_export_notification(patient_email, patient_name, download_link, export_type="CSV"):
-    """Send notification when export is ready"""
+
+def _close(connection):
     try:
-        subject = f"Your {export_type} Export is Ready"
-        html_body = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif;">
-                <div style="background-color: #e8f5e9; padding: 20px; border-radius: 5px;">
-                    <h2 style="color: #2e7d32;">Export Ready</h2>
-                    <p>Dear {patient_name},</p>
-                    <p>Your treatment history {export_type.lower()} export is now ready for download.</p>
-                    <p style="margin: 20px 0;">
-                        <a href="{download_link}" style="background-color: #4CAF50; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px; display: inline-block;">
-                            Download {export_type}
-                        </a>
-                    </p>
-                    <p style="color: #666; font-size: 12px;">This link is valid for 7 days.</p>
-                    <p>Best regards,<br/>Cardiology Department Hospital Information System</p>
-                </div>
-            </body>
-        </html>
-        """
-        
-        msg = Message(subject=subject, recipients=[patient_email], html=html_body)
-        mail.send(msg)
-        print(f"✓ Export notification sent to {patient_email}")
-        return True
-    except Exception as e:
-        print(f"✗ Error sending export notification: {str(e)}")
-        return False
+        connection.__exit__(None, None, None)
+    except Exception:
+        pass
+
+
+@tracing.traced("email.bulk")
+def send_bulk(messages, connections=None, rate_per_second=None):
+    """
+    Send many messages over a small pool of reused SMTP connections.
+    Each of `connections` threads (MAIL_BULK_CONNECTIONS, default 2) opens one
+    connection (mail.connect()) and sends from a shared queue, reconnecting after
+    an error. Sends are paced by the process-wide shared_rate_limiter(), so
+    concurrent callers share one budget, unless `rate_per_second` is given
+    (0 = unlimited). Returns one error string (or None on success) per message, in order.
+    """
+    if connections is None:
+        connections = int(os.environ.get('MAIL_BULK_CONNECTIONS', 2))
+    if rate_per_second is None:
+        limiter = shared_rate_limiter()
+    else:
+        limiter = RateLimiter(rate_per_second) if rate_per_second else None
+
+    app = mail.app or current_app._get_current_object()
+    pending = queue.Queue()
+    for index, message in enumerate(messages):
+        pending.put((index, message))
+    errors = [None] * pending.qsize()
+    connect_errors = []
+
+    def sender():
+        with app.app_context():
+            connection = None
+            try:
+                while True:
+                    try:
+                        index, message = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    if connection is None:
+                        try:
+                            connection = mail.connect().__enter__()
+                        except Exception:
+                            pending.put((index, message))  # for a sender that can still connect
+                            raise
+                    if limiter:
+                        limiter.acquire()
+                    try:
+                        connection.send(message)
+                    except Exception as e:
+                        errors[index] = str(e) or e.__class__.__name__
+                        # The SMTP session may be unusable now; reconnect for the next message
+                        _close(connection)
+                        connection = None
+            except Exception as e:
+                connect_errors.append(f"SMTP connection failed: {str(e) or e.__class__.__name__}")
+            finally:
+                if connection is not None:
+                    _close(connection)
+
+    workers = max(1, min(connections, len(errors)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(workers):
+            pool.submit(sender)
+
+    # Anything left over could not be sent because every connection failed
+    while not pending.empty():
+        index, _ = pending.get_nowait()
+        errors[index] = connect_errors[-1] if connect_errors else "not sent"
+
+    failed = sum(1 for error in errors if error is not None)
+    metrics.inc("email_sends_total", len(errors) - failed, outcome="sent")
+    metrics.inc("email_sends_total", failed, outcome="failed")
+    return errors
+
+
+def _appointment_reminder_subject(appointment_date):
+    return f"Appointment Reminder - {appointment_date}"
+
+
+def build_appointment_reminder(patient_email, patient_name, appointment_date, doctor_name, appointment_time="09:00 AM"):
+    """Build the appointment reminder message for a patient"""
+    html_body = templates.render(
+        "email/appointment_reminder.html",
+        patient_name=patient_name,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time,
+        doctor_name=doctor_name,
+    )
+    return Message(subject=_appointment_reminder_subject(appointment_date), recipients=[patient_email], html=html_body)
+
+
+def build_appointment_reminders(reminders):
+    """
+    Build many reminder messages in one batch render.
+    `reminders` are dicts with build_appointment_reminder's keyword arguments.
+    """
+    contexts = [{"appointment_time": "09:00 AM", **reminder} for reminder in reminders]
+    bodies = templates.render_many("email/appointment_reminder.html", contexts)
+    return [
+        Message(
+            subject=_appointment_reminder_subject(context["appointment_date"]),
+            recipients=[context["patient_email"]],
+            html=html_body,
+        )
+        for context, html_body in zip(contexts, bodies)
+    ]
+
+
+def queue_email(message):
+    """
+    Put a message in the EmailOutbox for the drain worker to send.
+    Joins the caller's DB transaction - nothing is sent until the caller commits.
+    """
+    return EmailOutboxModel.enqueue(message)
+
+
+def build_monthly_report(doctor_email, doctor_name, report_html):
+    """Build the monthly activity report message for a doctor"""
+    current_month = datetime.now().strftime("%B %Y")
+    subject = f"Monthly Activity Report - {current_month}"
+    return Message(subject=subject, recipients=[doctor_email], html=report_html)
+
+
+def build_export_notification(patient_email, patient_name, download_link, export_type="CSV"):
+    """Build the export-ready notification message for a patient"""
+    subject = f"Your {export_type} Export is Ready"
+    html_body = templates.render(
+        "email/export_notification.html",
+        patient_name=patient_name,
+        download_link=download_link,
+        export_type=export_type,
+    )
+    return Message(subject=subject, recipients=[patient_email], html=html_body)
 
 
+@tracing.traced("email.send")
 def send_test_email(recipient_email):
     """Send a test email to verify configuration"""
     try:
         subject = "Test Email - Hospital System"
-        html_body = """
-        <html>
-            <body style="font-family: Arial, sans-serif;">
-                <h2>Test Email</h2>
-                <p>If you're reading this, the email configuration is working correctly!</p>
-                <p>Best regards,<br/>Hospital Information System</p>
-            </body>
-        </html>
-        """
+        html_body = templates.render("email/test_email.html")
         
         msg = Message(subject=subject, recipients=[recipient_email], html=html_body)
         mail.send(msg)
@@ -0,0 +1,245 @@
+"""
+EmailOutbox Model - Transactional outbox for outgoing email
+
+Callers add rendered messages in their own DB transaction (enqueue does not
+commit), so a message exists exactly when the change it announces does. The
+drain worker claims batches, sends them with send_bulk (a pool of rate-limited
+SMTP connections), and marks rows sent or schedules a retry with exponential backoff.
+"""
+from models.db import db
+from datetime import datetime, timedelta
+from email.utils import formataddr
+from flask_mail import Message
+from sqlalchemy import or_
+
+
+class EmailOutboxModel(db.Model):
+    __tablename__ = "EmailOutbox"
+    __table_args__ = (
+        db.Index("ix_EmailOutbox_status_available_at", "status", "available_at"),
+        db.Index("ix_EmailOutbox_status_sent_at", "status", "sent_at"),
+    )
+
+    # Same queue semantics as TreatmentExportModel: leased batches, backoff retries
+    LEASE_SECONDS = 120
+    MAX_ATTEMPTS = 6
+    RETRY_BASE_SECONDS = 30
+    RETRY_MAX_SECONDS = 3600
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # comma separated
+    sender = db.Column(db.String(255), nullable=True)
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    available_at = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(120), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(500), nullable=True)
+
+    def __init__(self, recipients, subject, html=None, body=None, sender=None):
+        self.recipients = ",".join(recipients)
+        self.subject = subject
+        self.html = html
+        self.body = body
+        self.sender = sender
+        self.status = "pending"
+        self.attempts = 0
+        self.created_at = datetime.utcnow()
+        self.available_at = self.created_at
+
+    def json(self):
+        return {
+            "id": self.id,
+            "recipients": self.recipients.split(","),
+            "subject": self.subject,
+            "status": self.status,
+            "attempts": self.attempts,
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None,
+            "sent_at": self.sent_at.strftime("%Y-%m-%d %H:%M:%S") if self.sent_at else None,
+            "last_error": self.last_error,
+        }
+
+    def to_message(self):
+        """Rebuild the flask_mail Message to send (needs an app context with Mail set up)"""
+        return Message(
+            subject=self.subject,
+            recipients=self.recipients.split(","),
+            html=self.html,
+            body=self.body,
+            sender=self.sender,
+        )
+
+    @classmethod
+    def enqueue(cls, message):
+        """
+        Add a flask_mail Message to the outbox in the current session.
+        Does not commit - the row lands with the caller's own transaction.
+        """
+        sender = message.sender
+        if isinstance(sender, (tuple, list)):
+            sender = formataddr(tuple(sender))
+        row = cls(message.recipients, message.subject, html=message.html, body=message.body, sender=sender)
+        db.session.add(row)
+        return row
+
+    @classmethod
+    def find_by_id(cls, outbox_id):
+        return cls.query.filter_by(id=outbox_id).first()
+
+    @classmethod
+    def claim_batch(cls, worker_id, limit=50, lease_seconds=LEASE_SECONDS):
+        """
+        Lease up to `limit` of the oldest sendable messages to `worker_id`.
+        The status check in the UPDATE is a compare-and-set, so rows another
+        worker claimed in between are skipped. Returns the claimed rows.
+        """
+        now = datetime.utcnow()
+        candidates = [
+            row.id for row in (
+                db.session.query(cls.id)
+                .filter(
+                    cls.status == "pending",
+                    or_(cls.available_at.is_(None), cls.available_at <= now),
+                )
+                .order_by(cls.available_at, cls.id)
+                .limit(limit)
+            )
+        ]
+        if not candidates:
+            db.session.commit()
+            return []
+
+        cls.query.filter(cls.id.in_(candidates), cls.status == "pending").update(
+            {
+                "status": "sending",
+                "locked_by": worker_id,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                "attempts": cls.attempts + 1,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        return (
+            cls.query.filter(cls.id.in_(candidates), cls.status == "sending", cls.locked_by == worker_id)
+            .order_by(cls.id)
+            .all()
+        )
+
+    @classmethod
+    def mark_sent(cls, ids, worker_id):
+        """Mark leased messages as delivered in one statement. Returns the number updated"""
+        if not ids:
+            return 0
+        updated = cls.query.filter(
+            cls.id.in_(ids), cls.status == "sending", cls.locked_by == worker_id
+        ).update(
+            {
+                "status": "sent",
+                "sent_at": datetime.utcnow(),
+                "last_error": None,
+                "locked_by": None,
+                "lease_expires_at": None,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        return updated
+
+    def fail_attempt(self, worker_id, error_message):
+        """
+        Record a failed send: retry with exponential backoff,
+        or mark the message failed once MAX_ATTEMPTS is reached.
+        """
+        if self.attempts >= self.MAX_ATTEMPTS:
+            values = {"status": "failed"}
+        else:
+            delay = min(self.RETRY_BASE_SECONDS * 2 ** (self.attempts - 1), self.RETRY_MAX_SECONDS)
+            values = {"status": "pending", "available_at": datetime.utcnow() + timedelta(seconds=delay)}
+        values.update({
+            "last_error": error_message[:500],
+            "locked_by": None,
+            "lease_expires_at": None,
+        })
+        cls = EmailOutboxModel
+        updated = cls.query.filter(
+            cls.id == self.id, cls.status == "sending", cls.locked_by == worker_id
+        ).update(values, synchronize_session=False)
+        db.session.commit()
+        return updated == 1
+
+    @classmethod
+    def recover_stale(cls):
+        """
+        Return messages whose lease expired (worker died mid-batch) to the queue,
+        or fail them if they used all attempts. Returns (requeued, failed).
+        A message may be delivered twice if the worker died after sending it.
+        """
+        now = datetime.utcnow()
+        stale = cls.query.filter(
+            cls.status == "sending",
+            or_(cls.lease_expires_at.is_(None), cls.lease_expires_at < now),
+        )
+        failed = stale.filter(cls.attempts >= cls.MAX_ATTEMPTS).update(
+            {
+                "status": "failed",
+                "last_error": "Lease expired after the last attempt",
+                "locked_by": None,
+                "lease_expires_at": None,
+            },
+            synchronize_session=False,
+        )
+        requeued = stale.filter(cls.attempts < cls.MAX_ATTEMPTS).update(
+            {"status": "pending", "available_at": now, "locked_by": None, "lease_expires_at": None},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        return requeued, failed
+
+    @classmethod
+    def queue_depth(cls):
+        """Number of messages waiting to be sent (including ones backing off)"""
+        return cls.query.filter_by(status="pending").count()
+
+    @classmethod
+    def stats(cls, window_seconds=3600):
+        """
+        Queue depth, age of the oldest pending message, and enqueue-to-delivery
+        latency of messages sent in the last `window_seconds`.
+        """
+        now = datetime.utcnow()
+        oldest = (
+            db.session.query(db.func.min(cls.created_at))
+            .filter(cls.status == "pending")
+            .scalar()
+        )
+        latencies = sorted(
+            (sent_at - created_at).total_seconds()
+            for created_at, sent_at in (
+                db.session.query(cls.created_at, cls.sent_at)
+                .filter(cls.status == "sent", cls.sent_at >= now - timedelta(seconds=window_seconds))
+            )
+        )
+        return {
+            "pending": cls.queue_depth(),
+            "sending": cls.query.filter_by(status="sending").count(),
+            "failed": cls.query.filter_by(status="failed").count(),
+            "oldest_pending_seconds": (now - oldest).total_seconds() if oldest else 0.0,
+            "sent_in_window": len(latencies),
+            "avg_latency_seconds": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p95_latency_seconds": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+        }
+
+    @classmethod
+    def purge_sent(cls, older_than_days=7):
+        """Delete delivered messages older than `older_than_days`. Returns the number removed"""
+        count = cls.query.filter(
+            cls.status == "sent",
+            cls.sent_at < datetime.utcnow() - timedelta(days=older_than_days),
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return count
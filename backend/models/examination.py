@@ -1,5 +1,8 @@
 from models.db import db
-from sqlalchemy import select
+from models import examination_search
+from sqlalchemy import column, event, func, inspect, select, table
+from sqlalchemy.orm import contains_eager
+from models.pagination import paginate, DEFAULT_PAGE_SIZE
 from models.doctor import DoctorModel as Doctor
 import models.patient as Patient
 from models.appointment import AppointmentModel as Appointment
@@ -13,7 +16,7 @@ class ExaminationModel(db.Model):
     prescription = db.Column(db.String(5000))
 
     appointment_id = db.Column(
-        db.Integer, db.ForeignKey("Appointments.id", ondelete="SET NULL")
+        db.Integer, db.ForeignKey("Appointments.id", ondelete="SET NULL"), index=True
     )
 
     appointment = db.relationship("AppointmentModel")
@@ -52,6 +55,32 @@ class ExaminationModel(db.Model):
             "appointment_date": self.appointment.date.strftime("%Y-%m-%d") if self.appointment else "N/A",
         }
 
+    @staticmethod
+    def json_with_info_from_row(row):
+        """Same shape as json_with_info, built from one flat row of info_query()"""
+        doctor_known = row.doctor_first_name is not None
+        patient_known = row.patient_first_name is not None
+        return {
+            "_id": row.id,
+            "diagnosis": row.diagnosis,
+            "prescription": row.prescription,
+            "appointment_id": row.appointment_id,
+            "appointment": {
+                "_id": row.appointment_id,
+                "date": row.appointment_date.strftime("%Y-%m-%d"),
+                "patient_id": row.patient_id,
+                "patient_username": row.patient_username,
+                "doctor_id": row.doctor_id,
+                "doctor_username": row.doctor_username,
+                "date_of_reservation": row.appointment_created_at.strftime("%Y-%m-%d"),
+                "description": row.description,
+            },
+            "doctor_name": f"{row.doctor_first_name} {row.doctor_last_name}" if doctor_known else "N/A",
+            "doctor_specialization": row.doctor_specialization if doctor_known else "N/A",
+            "patient_name": f"{row.patient_first_name} {row.patient_last_name}" if patient_known else "N/A",
+            "appointment_date": row.appointment_date.strftime("%Y-%m-%d"),
+        }
+
     def save_to_db(self):
         db.session.add(self)
         db.session.commit()
@@ -76,25 +105,208 @@ class ExaminationModel(db.Model):
             .first()
         )
 
+    @classmethod
+    def _with_info_loaded(cls, query):
+        """Populate appointment, doctor and patient from the joined rows instead of lazy SELECTs"""
+        return query.options(
+            contains_eager(cls.appointment).contains_eager(Appointment.doctor),
+            contains_eager(cls.appointment).contains_eager(Appointment.patient),
+        )
+
     @classmethod
     def find_all_filtered(cls, patient_id):
-        return (
+        return cls._with_info_loaded(
             cls.query.join(Appointment, Appointment.id == cls.appointment_id)
             .join(
                 Patient.PatientModel, Patient.PatientModel.id == Appointment.patient_id
             )
             .filter(Patient.PatientModel.id == patient_id)
             .join(Doctor, Doctor.id == Appointment.doctor_id)
-            .all()
-        )
+        ).all()
 
     @classmethod
     def find_all(cls):
-        return (
+        return cls._with_info_loaded(
             cls.query.join(Appointment, Appointment.id == cls.appointment_id)
             .outerjoin(
                 Patient.PatientModel, Patient.PatientModel.id == Appointment.patient_id
             )
             .outerjoin(Doctor, Doctor.id == Appointment.doctor_id)
-            .all()
+        ).all()
+
+    @classmethod
+    def info_query(cls, patient_id=None):
+        """
+        Flat projection of everything json_with_info needs, one row per examination.
+        With patient_id the rows are limited to that patient, matching find_all_filtered.
+        """
+        query = (
+            db.session.query(
+                cls.id,
+                cls.diagnosis,
+                cls.prescription,
+                cls.appointment_id,
+                Appointment.date.label("appointment_date"),
+                Appointment.created_at.label("appointment_created_at"),
+                Appointment.description,
+                Appointment.patient_id,
+                Appointment.patient_username,
+                Appointment.doctor_id,
+                Appointment.doctor_username,
+                Doctor.first_name.label("doctor_first_name"),
+                Doctor.last_name.label("doctor_last_name"),
+                Doctor.specialization.label("doctor_specialization"),
+                Patient.PatientModel.first_name.label("patient_first_name"),
+                Patient.PatientModel.last_name.label("patient_last_name"),
+            )
+            .select_from(cls)
+            .join(Appointment, Appointment.id == cls.appointment_id)
         )
+        if patient_id is None:
+            return query.outerjoin(
+                Patient.PatientModel, Patient.PatientModel.id == Appointment.patient_id
+            ).outerjoin(Doctor, Doctor.id == Appointment.doctor_id)
+        return (
+            query.join(
+                Patient.PatientModel, Patient.PatientModel.id == Appointment.patient_id
+            )
+            .join(Doctor, Doctor.id == Appointment.doctor_id)
+            .filter(Patient.PatientModel.id == patient_id)
+        )
+
+    @classmethod
+    def find_all_with_info(cls, patient_id=None):
+        """json_with_info dicts for all (or one patient's) examinations in a single query"""
+        return [cls.json_with_info_from_row(row) for row in cls.info_query(patient_id)]
+
+    @classmethod
+    def find_page_with_info(cls, patient_id=None, after=None, limit=DEFAULT_PAGE_SIZE):
+        """One page of find_all_with_info, ordered by examination id. Returns (dicts, next_cursor)"""
+        rows, next_cursor = paginate(cls.info_query(patient_id), [cls.id], after, limit)
+        return [cls.json_with_info_from_row(row) for row in rows], next_cursor
+
+    @classmethod
+    def search(cls, text, doctor_id=None, patient_id=None, start=None, end=None,
+               after=None, limit=DEFAULT_PAGE_SIZE, sort="relevance"):
+        """
+        Examinations whose diagnosis or prescription match `text`, optionally
+        limited to a doctor, a patient and an appointment date range. `sort` is
+        "relevance" (best match first over every match) or "recent" (newest first).
+        Returns (json_with_info dicts with "rank" and "highlight", next_cursor).
+        """
+        months = None
+        if start is not None or end is not None:
+            # Open ends are bounded by the data; min and max are separate queries so
+            # SQLite answers each from the end of the date index
+            first = start or db.session.query(func.min(Appointment.date)).scalar()
+            last = end or db.session.query(func.max(Appointment.date)).scalar()
+            if first is not None and last is not None:
+                months = examination_search.months_between(first, last)
+        filters = []
+        if doctor_id is not None:
+            filters.append(Appointment.doctor_id == doctor_id)
+        if patient_id is not None:
+            filters.append(Appointment.patient_id == patient_id)
+        if start is not None:
+            filters.append(Appointment.date >= start)
+        if end is not None:
+            filters.append(Appointment.date <= end)
+
+        if not examination_search.supported(db.session.get_bind()):
+            query = cls.info_query().filter(
+                *filters, *examination_search.like_clause(text, cls.diagnosis, cls.prescription)
+            )
+            rows, next_cursor = paginate(query, [cls.id], after, limit, descending=True)
+            return [
+                {**cls.json_with_info_from_row(row), "rank": None, "highlight": {}}
+                for row in rows
+            ], next_cursor
+
+        # Relevance scores every match and keeps the best of them; recent lets FTS5 walk
+        # the match list newest first and stop at the page, so common terms stay cheap
+        search_table = table(examination_search.SEARCH_TABLE, column("rowid", db.Integer))
+        match = examination_search.match_clause(
+            examination_search.to_match_query(text, doctor_id, patient_id, months)
+        )
+        hits = (
+            db.session.query(search_table.c.rowid.label("examination_id"), examination_search.RANK)
+            .select_from(search_table)
+            .filter(match)
+        )
+        if filters:
+            # Normally already answered by the facets; keeps results exact if they are stale
+            hits = (
+                hits.join(cls, cls.id == search_table.c.rowid)
+                .join(Appointment, Appointment.id == cls.appointment_id)
+                .filter(*filters)
+            )
+        hits = hits.subquery()
+        if sort == "recent":
+            keys, descending = [hits.c.examination_id], True
+        else:
+            keys, descending = [hits.c.search_rank, hits.c.examination_id], False
+        hits, next_cursor = paginate(db.session.query(hits), keys, after, limit, descending)
+
+        ids = [hit.examination_id for hit in hits]
+        rows = {row.id: row for row in cls.info_query().filter(cls.id.in_(ids))} if ids else {}
+        highlights = {}
+        if ids:
+            highlights = {
+                row.rowid: row
+                for row in db.session.query(
+                    search_table.c.rowid,
+                    examination_search.highlight_column(0, "diagnosis"),
+                    examination_search.highlight_column(1, "prescription"),
+                )
+                .select_from(search_table)
+                # FTS5 scans the match list once within the rowid range; "+ 0" keeps SQLite
+                # from re-running the match for every id in the IN list instead
+                .filter(
+                    match,
+                    search_table.c.rowid.between(min(ids), max(ids)),
+                    (search_table.c.rowid + 0).in_(ids),
+                )
+            }
+        # Index rows whose examination lost its appointment are skipped
+        return [
+            {
+                **cls.json_with_info_from_row(rows[hit.examination_id]),
+                "rank": hit.search_rank,
+                "highlight": {
+                    "diagnosis": examination_search.render_highlight(highlights[hit.examination_id].diagnosis),
+                    "prescription": examination_search.render_highlight(highlights[hit.examination_id].prescription),
+                },
+            }
+            for hit in hits
+            if hit.examination_id in rows
+        ], next_cursor
+
+
+# Keep the full-text index in step with the examinations, in the same transaction
+@event.listens_for(ExaminationModel, "after_insert")
+def _index_new_examination(mapper, connection, target):
+    examination_search.index_examination(connection, target.id)
+
+
+@event.listens_for(ExaminationModel, "after_update")
+def _reindex_examination(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("diagnosis", "prescription", "appointment_id")):
+        examination_search.index_examination(connection, target.id)
+
+
+@event.listens_for(ExaminationModel, "after_delete")
+def _unindex_examination(mapper, connection, target):
+    examination_search.remove_examination(connection, target.id)
+
+
+@event.listens_for(Appointment, "after_update")
+def _reindex_appointment(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("doctor_id", "patient_id", "date")):
+        examination_search.index_appointment(connection, target.id)
+
+
+@event.listens_for(ExaminationModel.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    examination_search.create_index(connection)
@@ -0,0 +1,165 @@
+"""
+Full-text index over examination diagnoses and prescriptions (SQLite FTS5)
+
+ExaminationSearch is an FTS5 table keyed by examination id (its rowid). Besides
+the two text columns it indexes "facets" - doctor<id>, patient<id> and
+month<yyyymm> tokens of the examination's appointment - so filtered searches
+are answered by the index instead of joining every match.
+
+The mapper events in models.examination keep it in sync inside the same
+transaction as the examination itself; bulk Core inserts and deletes bypass
+those events, so run rebuild_examination_search.py after them.
+On other databases there is no index and searches fall back to LIKE.
+"""
+import html
+import re
+from sqlalchemy import func, literal_column, or_
+from models.db import db
+
+SEARCH_TABLE = "ExaminationSearch"
+# Diagnosis matches weigh twice as much as prescription matches; facets do not count
+RANK = func.bm25(literal_column(SEARCH_TABLE), 2.0, 1.0, 0.0, type_=db.Float).label("search_rank")
+# Orders a search can return: best match first, or newest first
+SORTS = ("relevance", "recent")
+# Date ranges up to this many months are filtered by the index, longer ones by a join
+MAX_FACET_MONTHS = 36
+# Control characters never appear in clinical text, so they are safe highlight markers
+_MARK_START, _MARK_END = "\x02", "\x03"
+_TERM = re.compile(r'"([^"]*)"|([\w]+)(\*?)', re.UNICODE)
+# Index rows: text columns plus the facets of the examination's appointment
+_SELECT_ROWS = (
+    "SELECT e.id, e.diagnosis, e.prescription, "
+    "COALESCE('doctor' || a.doctor_id, '') || COALESCE(' patient' || a.patient_id, '') "
+    "|| COALESCE(' month' || strftime('%Y%m', a.date), '') "
+    'FROM "Examinations" e LEFT JOIN "Appointments" a ON a.id = e.appointment_id'
+)
+
+
+def supported(bind):
+    return bind.dialect.name == "sqlite"
+
+
+def create_index(bind):
+    """CREATE the FTS5 table if it is missing. Returns True if it was created"""
+    if not supported(bind):
+        return False
+    exists = bind.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,)
+    ).first()
+    if exists:
+        return False
+    bind.execute(
+        f'CREATE VIRTUAL TABLE "{SEARCH_TABLE}" '
+        "USING fts5(diagnosis, prescription, facets, tokenize = 'porter unicode61')"
+    )
+    return True
+
+
+def ensure_index(engine=None):
+    """Create the index on an existing database and fill it. Returns True if it was created"""
+    engine = engine or db.engine
+    if not create_index(engine):
+        return False
+    rebuild(engine)
+    return True
+
+
+def rebuild(engine=None):
+    """Re-index every examination from scratch. Returns the number indexed"""
+    engine = engine or db.engine
+    if not supported(engine):
+        return 0
+    with engine.begin() as connection:
+        create_index(connection)
+        connection.execute(f'DELETE FROM "{SEARCH_TABLE}"')
+        count = connection.execute(
+            f'INSERT INTO "{SEARCH_TABLE}" (rowid, diagnosis, prescription, facets) {_SELECT_ROWS}'
+        ).rowcount
+        # Merge the index segments so queries read as few b-trees as possible
+        connection.execute(f'INSERT INTO "{SEARCH_TABLE}" ("{SEARCH_TABLE}") VALUES (\'optimize\')')
+    return count
+
+
+def _reindex(connection, condition, value):
+    """Replace the index rows of the examinations matching `condition` from the tables"""
+    connection.execute(
+        f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid IN (SELECT e.id FROM "Examinations" e WHERE {condition})',
+        (value,),
+    )
+    connection.execute(
+        f'INSERT INTO "{SEARCH_TABLE}" (rowid, diagnosis, prescription, facets) {_SELECT_ROWS} WHERE {condition}',
+        (value,),
+    )
+
+
+def index_examination(connection, examination_id):
+    """(Re-)index one examination on `connection` (the flushing transaction)"""
+    if supported(connection):
+        _reindex(connection, "e.id = ?", examination_id)
+
+
+def index_appointment(connection, appointment_id):
+    """Refresh the facets of an appointment's examinations after it changed"""
+    if supported(connection):
+        _reindex(connection, "e.appointment_id = ?", appointment_id)
+
+
+def remove_examination(connection, examination_id):
+    if supported(connection):
+        connection.execute(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = ?', (examination_id,))
+
+
+def months_between(start, end):
+    """month<yyyymm> facet tokens covering [start, end], or None if there are too many"""
+    first, last = start.year * 12 + start.month - 1, end.year * 12 + end.month - 1
+    if last - first >= MAX_FACET_MONTHS:
+        return None
+    return [f"month{month // 12:04d}{month % 12 + 1:02d}" for month in range(first, last + 1)]
+
+
+def to_match_query(text, doctor_id=None, patient_id=None, months=None):
+    """
+    Turn user input into an FTS5 query: every word or "quoted phrase" must match,
+    a trailing * makes a word a prefix. Doctor, patient and month filters are
+    added as facet terms. Returns None if there is nothing to search.
+    """
+    terms = []
+    for phrase, word, star in _TERM.findall(text or ""):
+        if phrase.strip():
+            terms.append('"' + phrase.replace('"', "").strip() + '"')
+        elif word:
+            terms.append(f'"{word}"' + star)
+    if not terms:
+        return None
+
+    query = "{diagnosis prescription} : (" + " ".join(terms) + ")"
+    if doctor_id is not None:
+        query += f" AND facets : doctor{int(doctor_id)}"
+    if patient_id is not None:
+        query += f" AND facets : patient{int(patient_id)}"
+    if months:
+        query += " AND facets : (" + " OR ".join(months) + ")"
+    return query
+
+
+def match_clause(match_query):
+    return literal_column(SEARCH_TABLE).op("MATCH")(match_query)
+
+
+def highlight_column(column_index, name):
+    return func.highlight(
+        literal_column(SEARCH_TABLE), column_index, _MARK_START, _MARK_END
+    ).label(name)
+
+
+def like_clause(text, *columns):
+    """Fallback filter when there is no FTS index: every word appears in one of `columns`"""
+    words = [phrase or word for phrase, word, _ in _TERM.findall(text or "")]
+    return [or_(*[column.ilike(f"%{word}%") for column in columns]) for word in words if word]
+
+
+def render_highlight(text):
+    """HTML-escape indexed text and wrap matched terms in <mark>"""
+    if text is None:
+        return None
+    return html.escape(text).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
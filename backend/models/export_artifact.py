@@ -0,0 +1,120 @@
+"""
+ExportArtifact Model - One generated export file, shared by every TreatmentExport
+of the same patient, format and treatment history
+
+Artifacts are keyed on a fingerprint of the patient's examination set (see
+export_writer.history_fingerprint). ref_count is the number of TreatmentExports
+pointing at the file; the file is deleted when the last one goes away.
+"""
+import os
+from models.db import db
+from datetime import datetime
+
+
+class ExportArtifactModel(db.Model):
+    __tablename__ = "ExportArtifacts"
+    __table_args__ = (
+        db.UniqueConstraint("patient_id", "export_type", "fingerprint",
+                            name="uq_ExportArtifacts_patient_type_fingerprint"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey("Patients.id", ondelete="CASCADE"), nullable=False)
+    export_type = db.Column(db.String(50), nullable=False)
+    fingerprint = db.Column(db.String(120), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    size = db.Column(db.Integer, nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # latest expiry of its exports
+
+    def __init__(self, patient_id, export_type, fingerprint, file_path, size=None, expires_at=None):
+        self.patient_id = patient_id
+        self.export_type = export_type
+        self.fingerprint = fingerprint
+        self.file_path = file_path
+        self.size = size
+        self.ref_count = 0
+        self.created_at = datetime.utcnow()
+        self.expires_at = expires_at
+
+    def json(self):
+        return {
+            "id": self.id,
+            "patient_id": self.patient_id,
+            "export_type": self.export_type,
+            "fingerprint": self.fingerprint,
+            "size": self.size,
+            "ref_count": self.ref_count,
+        }
+
+    @classmethod
+    def find_by_id(cls, artifact_id):
+        return cls.query.filter_by(id=artifact_id).first()
+
+    @classmethod
+    def find_by_fingerprint(cls, patient_id, export_type, fingerprint):
+        return cls.query.filter_by(
+            patient_id=patient_id, export_type=export_type, fingerprint=fingerprint
+        ).first()
+
+    @property
+    def file_exists(self):
+        return os.path.exists(self.file_path)
+
+    def acquire(self, expires_at):
+        """
+        Add a reference (in the current transaction, not committed).
+        Only succeeds while the artifact is still referenced, so a file that is
+        being released concurrently is never revived. Returns True on success.
+        """
+        cls = ExportArtifactModel
+        updated = cls.query.filter(cls.id == self.id, cls.ref_count > 0).update(
+            {
+                "ref_count": cls.ref_count + 1,
+                "expires_at": max(self.expires_at or expires_at, expires_at),
+            },
+            synchronize_session=False,
+        )
+        return updated == 1
+
+    @classmethod
+    def release(cls, artifact_id):
+        """
+        Drop one reference (in the current transaction, not committed).
+        Returns the file path to delete once the caller commits if this was the last
+        reference, else None.
+        """
+        cls.query.filter(cls.id == artifact_id, cls.ref_count > 0).update(
+            {"ref_count": cls.ref_count - 1}, synchronize_session=False
+        )
+        artifact = cls.query.filter(cls.id == artifact_id, cls.ref_count <= 0).first()
+        if artifact is None:
+            return None
+        file_path = artifact.file_path
+        db.session.delete(artifact)
+        return file_path
+
+    @classmethod
+    def release_many(cls, references):
+        """
+        Drop references in bulk (current transaction, not committed).
+        `references` maps artifact id -> number of references to drop.
+        Deletes the artifacts left unreferenced and returns their file paths.
+        """
+        by_count = {}
+        for artifact_id, count in references.items():
+            by_count.setdefault(count, []).append(artifact_id)
+        for count, artifact_ids in by_count.items():
+            cls.query.filter(cls.id.in_(artifact_ids)).update(
+                {"ref_count": cls.ref_count - count}, synchronize_session=False
+            )
+
+        unreferenced = cls.query.filter(cls.id.in_(list(references)), cls.ref_count <= 0)
+        file_paths = [row.file_path for row in unreferenced.with_entities(cls.file_path)]
+        unreferenced.delete(synchronize_session=False)
+        return file_paths
+
+    @classmethod
+    def all_file_paths(cls):
+        return [row.file_path for row in db.session.query(cls.file_path)]
@@ -0,0 +1,48 @@
+"""
+Filesystem side of export cleanup - removing export files and sweeping
+files in the export folder that no database row points to
+"""
+import os
+import time
+
+# Files younger than this are left alone: a worker may still be writing them
+# (or has not committed the row that references them yet)
+ORPHAN_GRACE_SECONDS = 3600
+
+
+def remove_files(paths):
+    """Delete `paths` that exist. Returns (files_deleted, bytes_reclaimed)"""
+    deleted = 0
+    reclaimed = 0
+    for path in set(paths):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            print(f"⚠️ Could not delete {path}: {str(e)}")
+            continue
+        deleted += 1
+        reclaimed += size
+    return deleted, reclaimed
+
+
+def find_orphan_files(folder, referenced_paths, grace_seconds=ORPHAN_GRACE_SECONDS):
+    """Files directly under `folder` that are not in `referenced_paths` and older than the grace period"""
+    if not os.path.isdir(folder):
+        return []
+    referenced = {os.path.abspath(path) for path in referenced_paths if path}
+    cutoff = time.time() - grace_seconds
+    orphans = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            path = os.path.abspath(entry.path)
+            if path in referenced:
+                continue
+            if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                continue
+            orphans.append(path)
+    return orphans
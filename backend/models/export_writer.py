@@ -0,0 +1,161 @@
+"""
+Streaming treatment history export - rows come from one joined query through
+a server-side cursor and are serialized chunk by chunk, so memory stays flat
+no matter how long the patient's history is.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import zlib
+from models.examination import ExaminationModel
+from models.appointment import AppointmentModel
+
+EXPORT_TYPES = ("csv", "csv.gz", "ndjson", "ndjson.gz")
+MIMETYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "gz": "application/gzip",
+}
+CSV_FIELDS = [
+    "Patient ID",
+    "Patient Name",
+    "Doctor Name",
+    "Doctor Specialization",
+    "Appointment Date",
+    "Diagnosis",
+    "Treatment/Prescription",
+    "Next Visit",
+]
+CHUNK_SIZE = 64 * 1024
+YIELD_PER = 500
+# Bump when the export layout changes so cached artifacts are not reused
+FORMAT_VERSION = 1
+
+
+def iter_history(patient_id):
+    """One dict per examination, oldest first, streamed from a single joined query"""
+    rows = (
+        ExaminationModel.info_query(patient_id)
+        .order_by(AppointmentModel.date, ExaminationModel.id)
+        .yield_per(YIELD_PER)
+    )
+    for row in rows:
+        yield {
+            "Patient ID": row.patient_id,
+            "Patient Name": f"{row.patient_first_name} {row.patient_last_name}",
+            "Doctor Name": f"Dr. {row.doctor_first_name} {row.doctor_last_name}",
+            "Doctor Specialization": row.doctor_specialization or "N/A",
+            "Appointment Date": row.appointment_date.strftime("%Y-%m-%d"),
+            "Diagnosis": row.diagnosis or "N/A",
+            "Treatment/Prescription": row.prescription or "N/A",
+            "Next Visit": "As per doctor recommendation",
+        }
+
+
+def count_history(patient_id):
+    """Number of examinations a patient's export holds"""
+    return ExaminationModel.info_query(patient_id).order_by(None).count()
+
+
+def history_fingerprint(patient_id, export_type="csv"):
+    """
+    Identify the content of a patient's export without writing it:
+    "<count>-<max examination id>-<sha256 of every exported field>".
+    Any added, removed or edited examination (or renamed patient/doctor) changes it.
+    """
+    digest = hashlib.sha256(f"v{FORMAT_VERSION}:{export_type}".encode("utf-8"))
+    count = 0
+    max_id = 0
+    rows = (
+        ExaminationModel.info_query(patient_id)
+        .order_by(AppointmentModel.date, ExaminationModel.id)
+        .yield_per(YIELD_PER)
+    )
+    for row in rows:
+        count += 1
+        max_id = max(max_id, row.id)
+        digest.update(repr(tuple(row)).encode("utf-8"))
+        digest.update(b"\n")
+    return f"{count}-{max_id}-{digest.hexdigest()[:32]}"
+
+
+def iter_csv(records):
+    """Encode records as CSV lines (header first)"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    yield buffer.getvalue().encode("utf-8")
+    for record in records:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(record)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson(records):
+    """Encode records as newline-delimited JSON"""
+    for record in records:
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def iter_gzip(chunks, level=6):
+    """Gzip a byte stream on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_buffered(chunks, size=CHUNK_SIZE):
+    """Coalesce many small chunks into ~`size` byte blocks"""
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= size:
+            yield b"".join(pending)
+            pending = []
+            pending_size = 0
+    if pending:
+        yield b"".join(pending)
+
+
+def iter_export(patient_id, export_type="csv"):
+    """Byte chunks of a patient's history in `export_type` (see EXPORT_TYPES)"""
+    if export_type not in EXPORT_TYPES:
+        raise ValueError(f"Unsupported export type: {export_type}")
+    base_type, _, compression = export_type.partition(".")
+    records = iter_history(patient_id)
+    chunks = iter_ndjson(records) if base_type == "ndjson" else iter_csv(records)
+    if compression == "gz":
+        chunks = iter_gzip(chunks)
+    return iter_buffered(chunks)
+
+
+def mimetype_for(export_type):
+    return MIMETYPES["gz"] if export_type.endswith(".gz") else MIMETYPES[export_type]
+
+
+def write_export(patient_id, export_type, path):
+    """
+    Stream a patient's export to `path`. Returns the number of bytes written.
+    The file is written under a temporary name and renamed into place, so readers
+    never see a partial file even if two workers write the same artifact.
+    """
+    written = 0
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as export_file:
+            for chunk in iter_export(patient_id, export_type):
+                export_file.write(chunk)
+                written += len(chunk)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return written
@@ -0,0 +1,72 @@
+from models.db import db
+from models.blob_store import blob_path
+from datetime import datetime
+
+
+class ImageBlobModel(db.Model):
+    """
+    One stored image content (see models.blob_store). ref_count is the number of
+    PatientImages entries pointing at it; the file goes when the last one does.
+    """
+
+    __tablename__ = "ImageBlobs"
+
+    content_hash = db.Column(db.String(64), primary_key=True)  # sha256 hex
+    extension = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def path(self):
+        """Path relative to the images folder"""
+        return blob_path(self.content_hash, self.extension)
+
+    @classmethod
+    def find_by_hash(cls, content_hash):
+        return cls.query.filter_by(content_hash=content_hash).first()
+
+    @classmethod
+    def acquire(cls, content_hash, extension, size=None, width=None, height=None):
+        """
+        Add a reference to a blob, creating its row if needed, in the current
+        transaction (not committed). Returns the blob.
+        """
+        table = cls.__table__
+        db.session.execute(
+            table.insert()
+            .prefix_with("OR IGNORE", dialect="sqlite")
+            .prefix_with("IGNORE", dialect="mysql")
+            .values(
+                content_hash=content_hash, extension=extension, size=size,
+                width=width, height=height, ref_count=0, created_at=datetime.utcnow(),
+            )
+        )
+        db.session.execute(
+            table.update()
+            .where(table.c.content_hash == content_hash)
+            .values(ref_count=table.c.ref_count + 1)
+        )
+        return cls.find_by_hash(content_hash)
+
+    @classmethod
+    def release(cls, content_hash):
+        """
+        Drop a reference (current transaction, not committed). If it was the last one
+        the row is deleted and the blob is returned so the caller can remove its files
+        after committing; otherwise returns None.
+        """
+        table = cls.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.content_hash == content_hash)
+            .where(table.c.ref_count > 0)
+            .values(ref_count=table.c.ref_count - 1)
+        )
+        blob = cls.query.filter(cls.content_hash == content_hash, cls.ref_count <= 0).first()
+        if blob is None:
+            return None
+        db.session.delete(blob)
+        return blob
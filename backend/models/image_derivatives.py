@@ -0,0 +1,175 @@
+"""
+Thumbnail and preview derivatives of uploaded scans
+
+Derivatives are downscaled JPEG/PNG copies stored in the blob store next to
+the originals (blobs/_thumbnail, blobs/_preview), named after the original's
+content hash, so regenerating is idempotent and identical scans share files.
+Rendering runs in a process pool; uploads only submit work and return, and
+a failed render never fails the upload: the backfill command picks it up.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageOps
+from models.db import db
+from models.blob_store import BLOB_FOLDER
+
+SIZES = {
+    "thumbnail": int(os.environ.get("IMAGE_THUMBNAIL_SIZE", 256)),
+    "preview": int(os.environ.get("IMAGE_PREVIEW_SIZE", 1280)),
+}
+JPEG_QUALITY = 85
+PROCESSES = int(os.environ.get("IMAGE_DERIVATIVE_PROCESSES", 2))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def derivative_filename(kind, content_hash, keep_alpha=False):
+    """Path of a derivative relative to the images folder"""
+    extension = "png" if keep_alpha else "jpg"
+    return f"{BLOB_FOLDER}/_{kind}/{content_hash[:2]}/{content_hash}.{extension}"
+
+
+def render_derivatives(original_path, folder, content_hash, force=False):
+    """
+    Write every size in SIZES for one original under `folder` (the images folder).
+    Existing files are kept unless `force`. Runs in a worker process.
+    Returns {kind: relative filename}.
+    """
+    with Image.open(original_path) as image:
+        keep_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        targets = {kind: derivative_filename(kind, content_hash, keep_alpha) for kind in SIZES}
+        missing = {
+            kind: name for kind, name in targets.items()
+            if force or not os.path.exists(os.path.join(folder, name))
+        }
+        if missing:
+            # Let the JPEG decoder downscale while decoding; far cheaper for large scans
+            image.draft("RGB", (max(SIZES.values()),) * 2)
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGBA" if keep_alpha else "RGB")
+            # Largest first so each smaller size is resized from an already reduced copy
+            for kind in sorted(missing, key=lambda k: SIZES[k], reverse=True):
+                image.thumbnail((SIZES[kind], SIZES[kind]), Image.LANCZOS)
+                path = os.path.join(folder, missing[kind])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                if keep_alpha:
+                    image.save(temp_path, "PNG", optimize=True)
+                else:
+                    image.save(temp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                os.replace(temp_path, path)
+    return targets
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: a fork of the threaded web process can inherit locks
+            # held by its other threads (token sync, metrics flush, scheduler)
+            _pool = ProcessPoolExecutor(max_workers=PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drop a pool whose worker died (OOM, crash in PIL); the next submit starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def record_derivatives(image_id, derivatives):
+    """Store the derivative filenames on the PatientImages row"""
+    from models.patient_image import PatientImageModel
+
+    image = PatientImageModel.find_by_id(image_id)
+    if image is None:
+        return False
+    image.thumbnail = derivatives.get("thumbnail")
+    image.preview = derivatives.get("preview")
+    db.session.commit()
+    return True
+
+
+def submit(app, image, images_folder):
+    """
+    Render `image`'s derivatives in the background process pool and record them
+    when done. Returns the future, or None if it could not be submitted; failures
+    are logged and leave the row without derivatives for the backfill command to retry.
+    """
+    image_id = image.id
+    original_path = os.path.join(images_folder, image.path)
+    pool = get_pool()
+    try:
+        future = pool.submit(render_derivatives, original_path, images_folder, image.content_hash)
+    except RuntimeError as e:
+        # BrokenProcessPool, or a pool another request just discarded as broken
+        print(f"✗ Derivative pool is broken, restarting it; image {image_id} is left for the backfill: {str(e)}")
+        _discard_pool(pool)
+        return None
+
+    def done(finished):
+        try:
+            derivatives = finished.result()
+        except BrokenProcessPool as e:
+            print(f"✗ Derivative pool is broken, restarting it; image {image_id} is left for the backfill: {str(e)}")
+            _discard_pool(pool)
+            return
+        except Exception as e:
+            print(f"✗ Could not render derivatives for image {image_id}: {str(e)}")
+            return
+        with app.app_context():
+            try:
+                record_derivatives(image_id, derivatives)
+            finally:
+                db.session.remove()
+
+    future.add_done_callback(done)
+    return future
+
+
+def _render_job(job):
+    image_id, original_path, folder, content_hash, force = job
+    try:
+        return image_id, render_derivatives(original_path, folder, content_hash, force), None
+    except Exception as e:
+        return image_id, None, str(e)
+
+
+def backfill(images_folder, force=False, processes=PROCESSES, batch_size=200):
+    """
+    Render derivatives for every image missing one (or every image with `force`),
+    batch by batch across a process pool. Safe to re-run. Returns (rendered, failed).
+    """
+    from models.patient_image import PatientImageModel
+
+    rendered = failed = 0
+    last_id = 0
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        while True:
+            images = PatientImageModel.find_batch_for_derivatives(last_id, batch_size, include_done=force)
+            if not images:
+                break
+            last_id = images[-1].id
+            jobs = [
+                (image.id, os.path.join(images_folder, image.path), images_folder, image.content_hash, force)
+                for image in images
+            ]
+
+            by_id = {image.id: image for image in images}
+            for image_id, derivatives, error in pool.map(_render_job, jobs):
+                if error:
+                    failed += 1
+                    print(f"✗ Image {image_id}: {error}")
+                    continue
+                by_id[image_id].thumbnail = derivatives.get("thumbnail")
+                by_id[image_id].preview = derivatives.get("preview")
+                rendered += 1
+            db.session.commit()
+    return rendered, failed
@@ -1,5 +1,4 @@
 import os
-import re
 from typing import Union
 from werkzeug.datastructures import FileStorage
 
@@ -8,14 +7,20 @@ from flask_uploads import UploadSet, IMAGES
 IMAGE_SET = UploadSet("images", IMAGES)  # set name and allowed extensions
 
 
-def save_image(image: FileStorage, folder: str = None, name: str = None) -> str:
-    return IMAGE_SET.save(image, folder, name)
-
-
 def get_path(filename: str = None, folder: str = None) -> str:
     return IMAGE_SET.path(filename, folder)
 
 
+def get_images_folder() -> str:
+    """Absolute folder uploaded images are stored under (static/images)"""
+    return os.path.abspath(IMAGE_SET.config.destination)
+
+
+def extension_allowed(extension: str) -> bool:
+    """Whether a file extension such as ".png" may be uploaded to IMAGE_SET"""
+    return IMAGE_SET.extension_allowed(extension.lstrip("."))
+
+
 def _retrieve_filename(file: Union[str, FileStorage]) -> str:
     """
     Make our filename related functions generic, able to deal with FileStorage object as well as filename str.
@@ -0,0 +1,62 @@
+"""
+Pixel dimensions read straight from the image header (no imaging library needed)
+"""
+import os
+import struct
+
+
+def get_dimensions(path: str):
+    """
+    (width, height) read from the image header for PNG, GIF, BMP, WEBP and JPEG,
+    or (None, None) for anything else (e.g. SVG) or an unreadable header.
+    """
+    with open(path, "rb") as image:
+        head = image.read(32)
+        try:
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head.startswith(b"BM"):
+                width, height = struct.unpack("<ii", head[18:26])
+                return width, abs(height)
+            if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+                return _webp_dimensions(head, image)
+            if head.startswith(b"\xff\xd8"):
+                return _jpeg_dimensions(image)
+        except struct.error:
+            pass
+    return None, None
+
+
+def _webp_dimensions(head, image):
+    chunk = head[12:16]
+    if chunk == b"VP8X":
+        data = head[24:30] if len(head) >= 30 else head[24:] + image.read(30 - len(head))
+        return (int.from_bytes(data[0:3], "little") + 1, int.from_bytes(data[3:6], "little") + 1)
+    image.seek(0)
+    data = image.read(30)
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    return None, None
+
+
+def _jpeg_dimensions(image):
+    """Walk the JPEG markers up to the first start-of-frame segment"""
+    image.seek(2)
+    while True:
+        marker = image.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None, None
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue
+        length = struct.unpack(">H", image.read(2))[0]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", image.read(5))
+            return width, height
+        image.seek(length - 2, os.SEEK_CUR)
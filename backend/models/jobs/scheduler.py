@@ -3,8 +3,12 @@ APScheduler configuration and job scheduling
 """
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import atexit
+import functools
 import logging
+import time
+from models import metrics, tracing
 
 # Configure logging for APScheduler
 logging.basicConfig()
@@ -13,10 +17,34 @@ scheduler_logger.setLevel(logging.DEBUG)
 
 # Create global scheduler instance
 scheduler = BackgroundScheduler(daemon=True)
+flask_app = None
+
+
+def with_app_context(callback):
+    """Run a job inside the Flask app context so it can use the database, recording its duration and outcome"""
+    @functools.wraps(callback)
+    def run():
+        started = time.perf_counter()
+        outcome = "failure"
+        try:
+            with tracing.trace(f"job {callback.__name__}"):
+                if flask_app is None:
+                    result = callback()
+                else:
+                    with flask_app.app_context():
+                        result = callback()
+            outcome = "success"
+            return result
+        finally:
+            metrics.inc("job_runs_total", job=callback.__name__, outcome=outcome)
+            metrics.observe("job_duration_seconds", time.perf_counter() - started, job=callback.__name__)
+    return run
 
 
 def init_scheduler(app):
     """Initialize the scheduler with Flask app"""
+    global flask_app
+    flask_app = app
     scheduler.start()
     
     # Register shutdown handler
@@ -36,7 +64,7 @@ def add_daily_reminder_job(callback, hour=8, minute=0):
         minute: Minute (0-59)
     """
     scheduler.add_job(
-        callback,
+        with_app_context(callback),
         trigger=CronTrigger(hour=hour, minute=minute),
         id='daily_appointment_reminders',
         name='Daily Appointment Reminders',
@@ -56,7 +84,7 @@ def add_monthly_report_job(callback, day=1, hour=9, minute=0):
         minute: Minute (0-59)
     """
     scheduler.add_job(
-        callback,
+        with_app_context(callback),
         trigger=CronTrigger(day=day, hour=hour, minute=minute),
         id='monthly_activity_reports',
         name='Monthly Activity Reports',
@@ -75,7 +103,7 @@ def add_cleanup_job(callback, hour=2, minute=0):
         minute: Minute (0-59)
     """
     scheduler.add_job(
-        callback,
+        with_app_context(callback),
         trigger=CronTrigger(hour=hour, minute=minute),
         id='cleanup_expired_exports',
         name='Cleanup Expired Exports',
@@ -84,6 +112,42 @@ def add_cleanup_job(callback, hour=2, minute=0):
     print(f"✓ Cleanup job scheduled for {hour:02d}:{minute:02d}")
 
 
+def add_revoked_token_cleanup_job(callback, hours=1):
+    """
+    Add a job that periodically prunes revoked tokens that have expired
+    
+    Args:
+        callback: Function to call for the job
+        hours: Interval between runs
+    """
+    scheduler.add_job(
+        with_app_context(callback),
+        trigger=IntervalTrigger(hours=hours),
+        id='prune_revoked_tokens',
+        name='Prune Revoked Tokens',
+        replace_existing=True
+    )
+    print(f"✓ Revoked token cleanup job scheduled every {hours} hour(s)")
+
+
+def add_upload_cleanup_job(callback, hours=6):
+    """
+    Add a job that periodically removes abandoned chunked uploads
+    
+    Args:
+        callback: Function to call for the job
+        hours: Interval between runs
+    """
+    scheduler.add_job(
+        with_app_context(callback),
+        trigger=IntervalTrigger(hours=hours),
+        id='cleanup_stale_uploads',
+        name='Cleanup Stale Uploads',
+        replace_existing=True
+    )
+    print(f"✓ Upload cleanup job scheduled every {hours} hour(s)")
+
+
 def remove_job(job_id):
     """Remove a job by ID"""
     try:
@@ -5,18 +5,38 @@ from datetime import datetime, timedelta
 from models.appointment import AppointmentModel
 from models.patient import PatientModel
 from models.doctor import DoctorModel
-from models.examination import ExaminationModel
 from models.treatment_export import TreatmentExportModel
+from models.email_outbox import EmailOutboxModel
+from models.upload_session import UploadSessionModel
+from models.db import db
+from models.blacklist import BLACKLIST
 from models.email_helper import (
-    send_appointment_reminder,
-    send_monthly_report,
-    send_export_notification
+    build_appointment_reminders,
+    build_monthly_report,
+    build_export_notification,
+    send_bulk,
+    queue_email
 )
-import csv
+from models.export_artifact import ExportArtifactModel
+from models.export_writer import write_export, history_fingerprint, count_history
+from models.export_gc import remove_files, find_orphan_files
+from sqlalchemy.exc import IntegrityError
+from models.monthly_report import build_report_contexts, render_reports
+from models import metrics, tracing
 import os
+import time
 from flask import current_app
 
 
+def log_render_throughput(kind, count, seconds, size=None):
+    """Print how fast a batch of emails/reports was rendered"""
+    rate = count / seconds if seconds > 0 else float("inf")
+    line = f"🖨️ Rendered {count} {kind}(s) in {seconds:.2f}s ({rate:.0f}/s"
+    if size is not None:
+        line += f", {size / 1024:.0f} KiB"
+    print(line + ")")
+
+
 def send_daily_reminders():
     """
     Daily Job: Check for appointments tomorrow and send reminders
@@ -30,38 +50,39 @@ def send_daily_reminders():
         # Get tomorrow's date
         tomorrow = (datetime.now() + timedelta(days=1)).date()
         
-        # Find all appointments for tomorrow
-        appointments = AppointmentModel.find_by_date(tomorrow)
+        # Find all appointments for tomorrow, with patient and doctor joined in
+        recipients = AppointmentModel.find_reminder_recipients(tomorrow)
         
-        if not appointments:
+        if not recipients:
             print(f"ℹ️ No appointments scheduled for {tomorrow}")
             print("="*60 + "\n")
             return
         
-        print(f"📋 Found {len(appointments)} appointment(s) for {tomorrow}")
-        
-        # Send reminders to each patient
-        reminder_count = 0
-        for appointment in appointments:
-            if appointment.patient and appointment.doctor:
-                patient = appointment.patient
-                doctor = appointment.doctor
-                
-                success = send_appointment_reminder(
-                    patient_email=patient.email,
-                    patient_name=f"{patient.first_name} {patient.last_name}",
-                    appointment_date=appointment.date.strftime("%A, %B %d, %Y"),
-                    doctor_name=f"Dr. {doctor.first_name} {doctor.last_name}",
-                    appointment_time="09:00 AM"  # Can be customized
-                )
-                
-                if success:
-                    reminder_count += 1
-        
-        print(f"✅ {reminder_count} reminder(s) sent successfully")
+        print(f"📋 Found {len(recipients)} appointment(s) for {tomorrow}")
+        
+        started = time.perf_counter()
+        messages = build_appointment_reminders([
+            {
+                "patient_email": row.patient_email,
+                "patient_name": f"{row.patient_first_name} {row.patient_last_name}",
+                "appointment_date": row.date.strftime("%A, %B %d, %Y"),
+                "doctor_name": f"Dr. {row.doctor_first_name} {row.doctor_last_name}",
+                "appointment_time": "09:00 AM",  # Can be customized
+            }
+            for row in recipients
+        ])
+        log_render_throughput("reminder", len(messages), time.perf_counter() - started)
+        
+        # Queue all reminders in one transaction; the outbox worker sends them
+        for message in messages:
+            queue_email(message)
+        db.session.commit()
+        
+        print(f"✅ {len(recipients)} reminder(s) queued for delivery")
         print("="*60 + "\n")
         
     except Exception as e:
+        db.session.rollback()
         print(f"❌ ERROR in daily reminder job: {str(e)}")
         print("="*60 + "\n")
 
@@ -91,57 +112,40 @@ def send_monthly_reports():
         month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(seconds=1)
         
-        report_count = 0
-        
-        # Generate report for each doctor
-        for doctor in doctors:
-            # Get doctor's appointments for the month
-            appointments = AppointmentModel.query.filter(
-                AppointmentModel.doctor_id == doctor.id,
-                AppointmentModel.date.between(month_start.date(), month_end.date())
-            ).all()
-            
-            if not appointments:
-                print(f"  ℹ️ Dr. {doctor.first_name} {doctor.last_name}: No appointments this month")
-                continue
-            
-            # Get examinations for those appointments
-            examination_data = []
-            for appointment in appointments:
-                examinations = ExaminationModel.query.filter_by(
-                    appointment_id=appointment.id
-                ).all()
-                examination_data.extend(examinations)
-            
-            # Generate HTML report
-            report_html = generate_doctor_report_html(
-                doctor=doctor,
-                appointments=appointments,
-                examinations=examination_data,
-                month=now.strftime("%B %Y")
-            )
-            
-            # Send report
-            success = send_monthly_report(
-                doctor_email=doctor.email,
-                doctor_name=f"Dr. {doctor.first_name} {doctor.last_name}",
+        # All doctors' appointments and examinations for the month in one query
+        rows = AppointmentModel.find_report_rows(month_start.date(), month_end.date())
+        contexts = build_report_contexts(doctors, rows, month=now.strftime("%B %Y"))
+        
+        idle = len(doctors) - len(contexts)
+        if idle:
+            print(f"  ℹ️ {idle} doctor(s) had no appointments this month")
+        
+        started = time.perf_counter()
+        reports = render_reports(contexts)
+        log_render_throughput("report", len(reports), time.perf_counter() - started, sum(len(r) for r in reports))
+        
+        # Queue reports for the outbox worker, which sends them in batches
+        for context, report_html in zip(contexts, reports):
+            doctor = context["doctor"]
+            queue_email(build_monthly_report(
+                doctor_email=doctor["email"],
+                doctor_name=f"Dr. {doctor['first_name']} {doctor['last_name']}",
                 report_html=report_html
-            )
-            
-            if success:
-                report_count += 1
+            ))
         
-        print(f"✅ {report_count} report(s) sent successfully")
+        db.session.commit()
+        print(f"✅ {len(reports)} report(s) queued for delivery")
         print("="*60 + "\n")
         
     except Exception as e:
+        db.session.rollback()
         print(f"❌ ERROR in monthly report job: {str(e)}")
         print("="*60 + "\n")
 
 
 def cleanup_expired_exports():
     """
-    Daily Job: Clean up expired CSV exports (older than 7 days)
+    Daily Job: Clean up expired CSV exports (older than 7 days) and their files
     Runs daily at 2 AM
     """
     try:
@@ -149,190 +153,234 @@ def cleanup_expired_exports():
         print("🧹 CLEANUP JOB STARTED")
         print("="*60)
         
-        count = TreatmentExportModel.cleanup_expired()
+        started = time.perf_counter()
+        count, files_deleted, bytes_reclaimed = TreatmentExportModel.cleanup_expired()
         
         if count > 0:
-            print(f"🗑️ Deleted {count} expired export(s)")
+            print(f"🗑️ Deleted {count} expired export(s) and {files_deleted} file(s)")
         else:
             print("ℹ️ No expired exports to clean up")
         
+        # Sweep files no export or artifact points to (crashed workers, old exports)
+        referenced = TreatmentExportModel.referenced_file_paths() + ExportArtifactModel.all_file_paths()
+        export_folder = current_app.config.get('UPLOAD_FOLDER', 'static/exports')
+        orphans_deleted, orphan_bytes = remove_files(find_orphan_files(export_folder, referenced))
+        if orphans_deleted:
+            print(f"🗑️ Deleted {orphans_deleted} orphaned file(s)")
+        
+        bytes_reclaimed += orphan_bytes
+        print(f"💾 Reclaimed {bytes_reclaimed / (1024 * 1024):.1f} MiB in {time.perf_counter() - started:.2f}s")
         print("="*60 + "\n")
+        return {
+            "exports_deleted": count,
+            "files_deleted": files_deleted,
+            "orphans_deleted": orphans_deleted,
+            "bytes_reclaimed": bytes_reclaimed,
+            "seconds": time.perf_counter() - started,
+        }
         
     except Exception as e:
         print(f"❌ ERROR in cleanup job: {str(e)}")
         print("="*60 + "\n")
 
 
-def generate_doctor_report_html(doctor, appointments, examinations, month):
-    """Generate HTML report for doctor's monthly activity"""
-    
-    appointment_rows = ""
-    for appointment in appointments:
-        exam_info = "N/A"
-        for exam in examinations:
-            if exam.appointment_id == appointment.id:
-                exam_info = f"Diagnosis: {exam.diagnosis[:50]}..."
-                break
-        
-        appointment_rows += f"""
-        <tr>
-            <td>{appointment.date.strftime("%Y-%m-%d")}</td>
-            <td>{appointment.patient.first_name} {appointment.patient.last_name}</td>
-            <td>{exam_info}</td>
-        </tr>
-        """
-    
-    total_appointments = len(appointments)
-    total_examinations = len(examinations)
-    
-    html_report = f"""
-    <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .header {{ background-color: #1976d2; color: white; padding: 20px; border-radius: 5px; }}
-                .section {{ margin: 20px 0; }}
-                table {{ width: 100%; border-collapse: collapse; margin: 10px 0; }}
-                th, td {{ border: 1px solid #ddd; padding: 12px; text-align: left; }}
-                th {{ background-color: #f5f5f5; font-weight: bold; }}
-                .footer {{ color: #666; font-size: 12px; margin-top: 30px; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>Monthly Activity Report</h1>
-                <p>Dr. {doctor.first_name} {doctor.last_name}</p>
-                <p>Specialization: {doctor.specialization}</p>
-                <p>Month: {month}</p>
-            </div>
-            
-            <div class="section">
-                <h2>Summary Statistics</h2>
-                <table>
-                    <tr>
-                        <td><strong>Total Appointments:</strong></td>
-                        <td>{total_appointments}</td>
-                    </tr>
-                    <tr>
-                        <td><strong>Examinations Conducted:</strong></td>
-                        <td>{total_examinations}</td>
-                    </tr>
-                </table>
-            </div>
-            
-            <div class="section">
-                <h2>Appointment Details</h2>
-                <table>
-                    <thead>
-                        <tr>
-                            <th>Date</th>
-                            <th>Patient</th>
-                            <th>Examination Info</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {appointment_rows}
-                    </tbody>
-                </table>
-            </div>
-            
-            <div class="footer">
-                <p>This is an automated report generated by the Hospital Information System.</p>
-                <p>Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
-            </div>
-        </body>
-    </html>
+def prune_revoked_tokens():
     """
-    
-    return html_report
+    Periodic Job: Remove revoked tokens that have expired anyway
+    Runs every hour
+    """
+    try:
+        count = BLACKLIST.prune()
+        print(f"🧹 Pruned {count} expired revoked token(s)")
+    except Exception as e:
+        print(f"❌ ERROR in revoked token cleanup job: {str(e)}")
+
+
+def cleanup_stale_uploads():
+    """
+    Periodic Job: Drop chunked uploads that were abandoned, with their part files
+    Runs every few hours
+    """
+    try:
+        images_folder = os.path.abspath(current_app.config.get('UPLOADED_IMAGES_DEST', 'static/images'))
+        count = UploadSessionModel.expire_stale(images_folder)
+        print(f"🧹 Removed {count} abandoned chunked upload(s)")
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ ERROR in upload cleanup job: {str(e)}")
 
 
-def generate_patient_csv_export(patient_id):
+def generate_patient_export(patient_id, export_type="csv", fingerprint=None):
     """
-    Generate CSV file with patient's treatment history
-    This is called by the async export job
+    Generate the export file with patient's treatment history
+    Rows are streamed from one joined query straight to disk (see models.export_writer)
+    With a fingerprint the file is named after it, otherwise after the current time
+    This is called by the export worker
     """
     try:
-        print(f"\n📄 Generating CSV for patient {patient_id}...")
+        print(f"\n📄 Generating {export_type} export for patient {patient_id}...")
         
         patient = PatientModel.find_by_id(patient_id)
         if not patient:
             raise Exception(f"Patient {patient_id} not found")
         
-        # Get all examinations for patient (which include appointments)
-        examinations = ExaminationModel.find_all_filtered(patient_id)
-        
-        # Create CSV file
-        csv_filename = f"patient_{patient_id}_treatment_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        csv_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'static/exports'), csv_filename)
+        suffix = fingerprint.replace("-", "_") if fingerprint else datetime.now().strftime('%Y%m%d_%H%M%S')
+        export_filename = f"patient_{patient_id}_treatment_history_{suffix}.{export_type}"
+        export_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'static/exports'), export_filename)
         
         # Ensure directory exists
-        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-        
-        # Write CSV
-        with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = [
-                'Patient ID',
-                'Patient Name',
-                'Doctor Name',
-                'Doctor Specialization',
-                'Appointment Date',
-                'Diagnosis',
-                'Treatment/Prescription',
-                'Next Visit'
-            ]
-            
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for exam in examinations:
-                writer.writerow({
-                    'Patient ID': patient.id,
-                    'Patient Name': f"{patient.first_name} {patient.last_name}",
-                    'Doctor Name': f"Dr. {exam.appointment.doctor.first_name} {exam.appointment.doctor.last_name}" if exam.appointment and exam.appointment.doctor else 'N/A',
-                    'Doctor Specialization': exam.appointment.doctor.specialization if exam.appointment and exam.appointment.doctor else 'N/A',
-                    'Appointment Date': exam.appointment.date.strftime("%Y-%m-%d") if exam.appointment else 'N/A',
-                    'Diagnosis': exam.diagnosis or 'N/A',
-                    'Treatment/Prescription': exam.prescription or 'N/A',
-                    'Next Visit': 'As per doctor recommendation'  # Can be enhanced with follow-up appointments
-                })
-        
-        print(f"✅ CSV generated successfully at: {csv_path}")
-        return csv_path
+        os.makedirs(os.path.dirname(export_path), exist_ok=True)
+        
+        with tracing.span("export.write", patient_id=patient_id, export_type=export_type) as write_span:
+            written = write_export(patient_id, export_type, export_path)
+            if write_span is not None:
+                write_span.set(bytes=written)
+        
+        print(f"✅ Export generated successfully at: {export_path} ({written} bytes)")
+        return export_path
         
     except Exception as e:
-        print(f"❌ ERROR generating CSV: {str(e)}")
+        print(f"❌ ERROR generating export: {str(e)}")
         raise
 
 
-def process_pending_exports():
+def acquire_export_artifact(export):
+    """
+    Find or generate the file for an export and take a reference on it, in the
+    current transaction (committed by export.complete). A live artifact with
+    the same history fingerprint is reused instead of regenerating it.
+    """
+    fingerprint = history_fingerprint(export.patient_id, export.export_type)
+    
+    for _ in range(2):
+        artifact = ExportArtifactModel.find_by_fingerprint(export.patient_id, export.export_type, fingerprint)
+        if artifact is not None and artifact.acquire(export.expires_at):
+            if artifact.file_exists:
+                print(f"♻️ Export {export.id} reuses unchanged artifact {artifact.id}")
+            else:
+                # File was lost from disk; the name is content-addressed, so write it back in place
+                generate_patient_export(export.patient_id, export.export_type, fingerprint)
+            return artifact
+        
+        file_path = generate_patient_export(export.patient_id, export.export_type, fingerprint)
+        artifact = ExportArtifactModel(
+            patient_id=export.patient_id,
+            export_type=export.export_type,
+            fingerprint=fingerprint,
+            file_path=file_path,
+            size=os.path.getsize(file_path),
+            expires_at=export.expires_at,
+        )
+        artifact.ref_count = 1
+        try:
+            db.session.add(artifact)
+            db.session.flush()
+            return artifact
+        except IntegrityError:
+            # Another worker registered the same artifact (same file name, same content)
+            db.session.rollback()
+    raise Exception(f"Could not register export artifact for patient {export.patient_id}")
+
+
+def process_export(export, worker_id):
     """
-    Process pending exports (can be called periodically)
+    Generate one claimed export and notify the patient.
+    The notification is queued in the same transaction that completes the export.
+    Failures are recorded on the export, which schedules a retry with backoff.
+    Returns True if the export completed.
     """
+    with tracing.trace("process_export", export_id=export.id, worker_id=worker_id):
+        return _process_export(export, worker_id)
+
+
+def _process_export(export, worker_id):
     try:
-        pending_exports = TreatmentExportModel.find_pending()
-        
-        for export in pending_exports:
-            export.mark_processing()
-            
-            try:
-                # Generate the export
-                file_path = generate_patient_csv_export(export.patient_id)
-                export.mark_completed(file_path)
-                
-                # Send notification to patient
-                patient = PatientModel.find_by_id(export.patient_id)
-                download_link = f"http://localhost:5000/download/export/{export.id}"
-                
-                send_export_notification(
-                    patient_email=patient.email,
-                    patient_name=f"{patient.first_name} {patient.last_name}",
-                    download_link=download_link,
-                    export_type="CSV"
-                )
-                
-            except Exception as e:
-                export.mark_failed(str(e))
-                
+        # Size the lease to the history before the slow part starts
+        if not export.extend_lease(worker_id, count_history(export.patient_id)):
+            print(f"⚠️ Lease on export {export.id} was lost before it started")
+            metrics.inc("exports_processed_total", outcome="lease_lost")
+            return False
+        
+        # Generate the export, or reuse the file of an identical earlier one
+        artifact = acquire_export_artifact(export)
+        
+        # Queue notification to patient
+        patient = PatientModel.find_by_id(export.patient_id)
+        download_link = f"http://localhost:5000/download/export/{export.id}"
+        
+        queue_email(build_export_notification(
+            patient_email=patient.email,
+            patient_name=f"{patient.first_name} {patient.last_name}",
+            download_link=download_link,
+            export_type=export.export_type.split(".")[0].upper()
+        ))
+        
+        if not export.complete(worker_id, artifact.file_path, artifact.id):
+            print(f"⚠️ Lease on export {export.id} was lost, result discarded")
+            metrics.inc("exports_processed_total", outcome="lease_lost")
+            return False
+        metrics.inc("exports_processed_total", outcome="completed")
+        return True
+        
+    except Exception as e:
+        db.session.rollback()
+        export.fail_attempt(worker_id, str(e))
+        metrics.inc("exports_processed_total", outcome="failed")
+        return False
+
+
+def process_pending_exports(worker_id="inline", limit=None):
+    """
+    Drain the export queue once: claim, process and release exports until
+    none are claimable (or `limit` were handled). Returns the number processed.
+    """
+    processed = 0
+    try:
+        while limit is None or processed < limit:
+            export = TreatmentExportModel.claim_next(worker_id)
+            if export is None:
+                break
+            process_export(export, worker_id)
+            processed += 1
     except Exception as e:
         print(f"❌ ERROR processing exports: {str(e)}")
+    return processed
+
+
+def send_outbox_batch(rows, worker_id):
+    """
+    Send claimed EmailOutbox rows with send_bulk (pooled, rate-limited SMTP
+    connections) and record the outcome: delivered rows are marked sent
+    together, failures are scheduled for retry. Returns (sent, failed).
+    """
+    errors = send_bulk([row.to_message() for row in rows])
+    sent_ids = [row.id for row, error in zip(rows, errors) if error is None]
+    for row, error in zip(rows, errors):
+        if error is not None:
+            print(f"✗ Error sending email {row.id} to {row.recipients}: {error}")
+            row.fail_attempt(worker_id, error)
+    EmailOutboxModel.mark_sent(sent_ids, worker_id)
+    return len(sent_ids), len(rows) - len(sent_ids)
+
+
+def process_email_outbox(worker_id="inline", batch_size=50, limit=None):
+    """
+    Drain the email outbox once: claim batches and send them until nothing
+    is sendable (or about `limit` messages were handled). Returns (sent, failed).
+    """
+    sent = failed = 0
+    try:
+        while limit is None or sent + failed < limit:
+            rows = EmailOutboxModel.claim_batch(worker_id, batch_size)
+            if not rows:
+                break
+            started = time.perf_counter()
+            batch_sent, batch_failed = send_outbox_batch(rows, worker_id)
+            elapsed = time.perf_counter() - started
+            sent += batch_sent
+            failed += batch_failed
+            print(f"📧 [{worker_id}] Sent {batch_sent}, failed {batch_failed} in {elapsed:.2f}s")
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ ERROR draining email outbox: {str(e)}")
+    return sent, failed
@@ -0,0 +1,148 @@
+"""
+Background worker - drains the TreatmentExports and EmailOutbox queues outside the web process
+
+Usage (from backend/):
+    python -m models.jobs.worker --concurrency 4 --email-concurrency 1
+    python -m models.jobs.worker --once      # process what is queued, then exit
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+from models.db import db
+from models.treatment_export import TreatmentExportModel
+from models.email_outbox import EmailOutboxModel
+from models.jobs.tasks import process_export, process_pending_exports, process_email_outbox
+
+
+def worker_loop(app, worker_id, stop, poll_interval):
+    """Claim and process exports until `stop` is set"""
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                export = TreatmentExportModel.claim_next(worker_id)
+            except Exception as e:
+                print(f"❌ [{worker_id}] ERROR claiming export: {str(e)}")
+                db.session.rollback()
+                export = None
+
+            if export is None:
+                stop.wait(poll_interval)
+                continue
+
+            print(f"⚙️ [{worker_id}] Export {export.id} for patient {export.patient_id} (attempt {export.attempts})")
+            process_export(export, worker_id)
+        db.session.remove()
+
+
+def outbox_loop(app, worker_id, stop, poll_interval, batch_size):
+    """Send queued email in batches until `stop` is set"""
+    with app.app_context():
+        while not stop.is_set():
+            sent, failed = process_email_outbox(worker_id, batch_size=batch_size, limit=batch_size)
+            if not sent and not failed:
+                stop.wait(poll_interval)
+        db.session.remove()
+
+
+# Delivered email is kept this long, then purged from the outbox
+OUTBOX_RETENTION_DAYS = int(os.environ.get("EMAIL_OUTBOX_RETENTION_DAYS", 7))
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def recovery_loop(app, stop, interval):
+    """
+    Periodically return exports and email whose lease expired to the queue, report
+    the outbox and, hourly, purge delivered email older than OUTBOX_RETENTION_DAYS
+    """
+    next_purge = 0.0
+    with app.app_context():
+        while True:
+            try:
+                if time.monotonic() >= next_purge:
+                    purged = EmailOutboxModel.purge_sent(OUTBOX_RETENTION_DAYS)
+                    next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+                    if purged:
+                        print(f"🧹 Purged {purged} delivered email(s) older than {OUTBOX_RETENTION_DAYS} day(s)")
+                requeued, failed = TreatmentExportModel.recover_stale()
+                if requeued or failed:
+                    print(f"♻️ Recovered stuck exports: {requeued} requeued, {failed} failed")
+                requeued, failed = EmailOutboxModel.recover_stale()
+                if requeued or failed:
+                    print(f"♻️ Recovered stuck email: {requeued} requeued, {failed} failed")
+                stats = EmailOutboxModel.stats()
+                print(
+                    f"📬 Outbox: {stats['pending']} pending (oldest {stats['oldest_pending_seconds']:.0f}s), "
+                    f"{stats['failed']} failed, {stats['sent_in_window']} sent in the last hour, "
+                    f"latency avg {stats['avg_latency_seconds']:.1f}s / p95 {stats['p95_latency_seconds']:.1f}s"
+                )
+            except Exception as e:
+                print(f"❌ ERROR recovering stuck exports: {str(e)}")
+                db.session.rollback()
+            if stop.wait(interval):
+                break
+        db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued treatment history exports and email")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("EXPORT_WORKER_CONCURRENCY", 2)))
+    parser.add_argument("--email-concurrency", type=int, default=int(os.environ.get("EMAIL_WORKER_CONCURRENCY", 1)))
+    parser.add_argument("--email-batch-size", type=int, default=int(os.environ.get("EMAIL_BATCH_SIZE", 50)))
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="seconds to wait when the queue is empty")
+    parser.add_argument("--recover-interval", type=float, default=60.0, help="seconds between stuck-row recovery passes")
+    parser.add_argument("--once", action="store_true", help="drain the queue once and exit")
+    args = parser.parse_args()
+
+    from app import app
+    from models.email_helper import init_mail
+
+    db.init_app(app)
+    init_mail(app)
+    with app.app_context():
+        db.create_all()
+
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    if args.once:
+        with app.app_context():
+            TreatmentExportModel.recover_stale()
+            EmailOutboxModel.recover_stale()
+            EmailOutboxModel.purge_sent(OUTBOX_RETENTION_DAYS)
+            processed = process_pending_exports(worker_id=f"{worker_prefix}:once")
+            sent, failed = process_email_outbox(worker_id=f"{worker_prefix}:once", batch_size=args.email_batch_size)
+        print(f"✅ Processed {processed} export(s), sent {sent} email(s), {failed} failed")
+        return
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    threads = [threading.Thread(target=recovery_loop, args=(app, stop, args.recover_interval), daemon=True)]
+    for i in range(max(1, args.concurrency)):
+        threads.append(threading.Thread(
+            target=worker_loop,
+            args=(app, f"{worker_prefix}:{i}", stop, args.poll_interval),
+            daemon=True,
+        ))
+    for i in range(max(0, args.email_concurrency)):
+        threads.append(threading.Thread(
+            target=outbox_loop,
+            args=(app, f"{worker_prefix}:email{i}", stop, args.poll_interval, args.email_batch_size),
+            daemon=True,
+        ))
+
+    print(f"✓ Worker started with {args.concurrency} export and {args.email_concurrency} email thread(s)")
+    for thread in threads:
+        thread.start()
+    while not stop.is_set():
+        stop.wait(1)
+    for thread in threads:
+        thread.join()
+    print("✓ Worker stopped")
+
+
+if __name__ == "__main__":
+    main()
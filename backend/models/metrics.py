@@ -0,0 +1,325 @@
+"""
+Runtime metrics in the Prometheus text exposition format
+
+Every process (web workers, the export/email worker, the scheduler) counts into
+its own in-memory registry, and a background thread writes it to
+METRICS_DIR/<pid>-<start time>.json once a second, atomically by rename.
+/metrics merges the files of all processes and adds gauges read from the
+database at scrape time (queue depths), so totals stay right however many
+workers run.
+
+Only counters and histograms are kept per process, which makes summing the
+files always correct: connections in use are pool checkouts minus checkins.
+collect() deletes the files of processes that are no longer running, so the
+totals drop when a worker exits - a counter reset, which rate() and
+increase() already handle. The processes must share a host (PID namespace).
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_DIRECTORY = "metrics"
+FLUSH_INTERVAL = 1.0
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by resource class, method and status.", None),
+    "http_request_errors_total": ("counter", "Requests answered with an error status or an unhandled exception.", None),
+    "http_request_duration_seconds": ("histogram", "Request latency by resource class and method.", LATENCY_BUCKETS),
+    "db_query_duration_seconds": ("histogram", "SQL statement execution time by operation.", QUERY_BUCKETS),
+    "db_pool_checkouts_total": ("counter", "Connections taken from the pool.", None),
+    "db_pool_checkins_total": ("counter", "Connections returned to the pool.", None),
+    "db_pool_connects_total": ("counter", "New database connections opened.", None),
+    "job_runs_total": ("counter", "Scheduled job runs by job and outcome.", None),
+    "job_duration_seconds": ("histogram", "Scheduled job run time by job.", JOB_BUCKETS),
+    "exports_processed_total": ("counter", "Treatment exports processed by outcome.", None),
+    "email_sends_total": ("counter", "Emails handed to SMTP by outcome.", None),
+}
+# Read from the database when /metrics is scraped
+GAUGES = {
+    "db_pool_connections_in_use": "Connections checked out of the pool in all processes.",
+    "export_queue_depth": "Treatment exports by status.",
+    "email_outbox_messages": "EmailOutbox messages by status.",
+    "email_outbox_oldest_pending_seconds": "Age of the oldest email waiting to be sent.",
+}
+
+
+class Registry:
+    """This process's counters and histograms; histogram samples are [bucket counts..., sum, count]"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.dirty = False
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + value
+            self.dirty = True
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    sample[i] += 1
+                    break
+            sample[-2] += value
+            sample[-1] += 1
+            self.dirty = True
+
+    def dump(self):
+        with self.lock:
+            self.dirty = False
+            return [
+                [name, dict(labels), list(value) if isinstance(value, list) else value]
+                for (name, labels), value in self.samples.items()
+            ]
+
+
+registry = Registry()
+_enabled = False
+_process_file = None
+_flush_lock = threading.Lock()
+
+
+def inc(name, value=1, **labels):
+    if _enabled:
+        registry.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    if _enabled:
+        registry.observe(name, value, **labels)
+
+
+def flush():
+    """Write this process's samples to its file if anything changed"""
+    if _process_file is None or not registry.dirty:
+        return
+    with _flush_lock:
+        temp_path = f"{_process_file}.tmp"
+        with open(temp_path, "w") as metrics_file:
+            json.dump(registry.dump(), metrics_file)
+        os.replace(temp_path, _process_file)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError as e:
+            print(f"⚠️ Could not write metrics: {str(e)}")
+
+
+def configure(directory):
+    """Start recording, with this process's samples written under `directory` (None: memory only)"""
+    global _enabled, _process_file
+    _enabled = True
+    if directory is None or _process_file is not None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _process_file = os.path.join(directory, f"{os.getpid()}-{int(time.time() * 1000)}.json")
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+    atexit.register(flush)
+
+
+def _process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+def _prune(path):
+    """Delete `path` if the process that wrote it has stopped. Returns True if deleted"""
+    try:
+        pid = int(os.path.basename(path).split("-")[0])
+    except ValueError:
+        return False
+    if pid == os.getpid() or _process_running(pid):
+        return False
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return True
+
+
+def collect():
+    """Samples of every running process, summed: {(name, labels): value or histogram list}"""
+    merged = {}
+    if _process_file is None:
+        dumps = [registry.dump()]
+    else:
+        flush()
+        dumps = []
+        for path in glob.glob(os.path.join(os.path.dirname(_process_file), "*.json")):
+            if _prune(path):
+                continue
+            try:
+                with open(path) as metrics_file:
+                    dumps.append(json.load(metrics_file))
+            except (OSError, ValueError):
+                continue  # removed or replaced while we listed the directory
+    for samples in dumps:
+        for name, labels, value in samples:
+            if name not in METRICS:
+                continue
+            key = (name, tuple(sorted(labels.items())))
+            if isinstance(value, list):
+                current = merged.get(key)
+                merged[key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def database_gauges():
+    """[(name, labels, value)] read from the queue tables"""
+    from datetime import datetime
+    from models.db import db
+    from models.treatment_export import TreatmentExportModel
+    from models.email_outbox import EmailOutboxModel
+
+    gauges = []
+    for model, name in ((TreatmentExportModel, "export_queue_depth"), (EmailOutboxModel, "email_outbox_messages")):
+        for status, count in db.session.query(model.status, db.func.count()).group_by(model.status):
+            gauges.append((name, {"status": status}, count))
+    oldest = (
+        db.session.query(db.func.min(EmailOutboxModel.created_at))
+        .filter(EmailOutboxModel.status == "pending")
+        .scalar()
+    )
+    age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    gauges.append(("email_outbox_oldest_pending_seconds", {}, age))
+    return gauges
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _series(name, labels, value):
+    label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+    return f"{name}{{{label_text}}} {_number(value)}" if label_text else f"{name} {_number(value)}"
+
+
+def render(gauges=()):
+    """Every metric in the text exposition format, followed by `gauges`"""
+    samples = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (sample_name, labels), value in sorted(samples.items()):
+            if sample_name != name:
+                continue
+            if kind != "histogram":
+                lines.append(_series(name, labels, value))
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value):
+                cumulative += count
+                lines.append(_series(f"{name}_bucket", labels + (("le", f"{bound:g}"),), cumulative))
+            lines.append(_series(f"{name}_bucket", labels + (("le", "+Inf"),), value[-1]))
+            lines.append(_series(f"{name}_sum", labels, value[-2]))
+            lines.append(_series(f"{name}_count", labels, value[-1]))
+
+    in_use = sum(value for (name, _), value in samples.items() if name == "db_pool_checkouts_total")
+    in_use -= sum(value for (name, _), value in samples.items() if name == "db_pool_checkins_total")
+    gauges = [("db_pool_connections_in_use", {}, max(0, in_use)), *gauges]
+    for name, help_text in GAUGES.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [_series(name, tuple(sorted(labels.items())), value) for gauge, labels, value in gauges if gauge == name]
+    return "\n".join(lines) + "\n"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if _enabled:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _observe_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        operation = statement.lstrip()[:6].lower()
+        if operation not in ("select", "insert", "update", "delete"):
+            operation = "other"
+        observe("db_query_duration_seconds", time.perf_counter() - started, operation=operation)
+
+
+@event.listens_for(Pool, "checkout")
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    inc("db_pool_checkouts_total")
+
+
+@event.listens_for(Pool, "checkin")
+def _pool_checkin(dbapi_connection, connection_record):
+    inc("db_pool_checkins_total")
+
+
+@event.listens_for(Pool, "connect")
+def _pool_connect(dbapi_connection, connection_record):
+    inc("db_pool_connects_total")
+
+
+def _resource_name(app):
+    view = app.view_functions.get(request.endpoint)
+    resource = getattr(view, "view_class", None)
+    return resource.__name__ if resource is not None else (request.endpoint or "unmatched")
+
+
+def _record_request(app, status):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    resource, method = _resource_name(app), request.method
+    inc("http_requests_total", resource=resource, method=method, status=str(status))
+    if status >= 400:
+        inc("http_request_errors_total", resource=resource, method=method, status=str(status))
+    observe("http_request_duration_seconds", time.perf_counter() - started, resource=resource, method=method)
+
+
+def init_metrics(app):
+    """Record request, database, job, export and email metrics of this process"""
+    configure(app.config.setdefault("METRICS_DIR", DEFAULT_DIRECTORY))
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_response(response):
+        _record_request(app, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _record_exception(exception=None):
+        # after_request did not run: the view raised
+        _record_request(app, 500)
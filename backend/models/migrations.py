@@ -0,0 +1,62 @@
+"""
+Schema migrations for databases created before a model change
+"""
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+from models.db import db
+
+
+def missing_columns(engine=None):
+    """[(table, column)] for every model column an existing table lacks"""
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        missing += [(table, column) for column in table.columns if column.name not in existing_columns]
+    return missing
+
+
+def add_missing_columns(engine=None):
+    """
+    ALTER TABLE ... ADD COLUMN for every model column an existing table lacks.
+    New NOT NULL columns need a server_default so existing rows get a value.
+    Returns "Table.column" names that were added.
+    """
+    engine = engine or db.engine
+    added = []
+    for table, column in missing_columns(engine):
+        spec = CreateColumn(column).compile(dialect=engine.dialect)
+        engine.execute(f'ALTER TABLE "{table.name}" ADD COLUMN {spec}')
+        added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def add_missing_indexes(engine=None):
+    """
+    Create every index declared on the models that the database does not have yet.
+    Existing tables are altered in place, so data.db does not need to be rebuilt.
+    Returns the names of the indexes that were created.
+    """
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+                created.append(index.name)
+
+    if created:
+        # Refresh the planner statistics so SQLite actually picks the new indexes
+        engine.execute("ANALYZE")
+    return created
@@ -0,0 +1,82 @@
+"""
+Monthly doctor activity reports - grouping and rendering
+
+All doctors' appointments and examinations for the month come from one query
+(AppointmentModel.find_report_rows) and are grouped per doctor in a single pass.
+Reports are rendered from templates/email/monthly_report.html through the
+template registry; large departments are spread over a process pool.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from models.template_registry import templates
+
+# Below this many reports the pool's startup cost outweighs the parallel rendering
+PARALLEL_THRESHOLD = int(os.environ.get("MONTHLY_REPORT_PARALLEL_THRESHOLD", 50))
+PROCESSES = int(os.environ.get("MONTHLY_REPORT_PROCESSES", 0)) or None  # None = one per CPU
+
+REPORT_TEMPLATE = "email/monthly_report.html"
+
+
+def build_report_contexts(doctors, rows, month):
+    """
+    Group find_report_rows() output by doctor (hash join on doctor_id).
+    Returns one plain, picklable dict per doctor that had appointments, in `doctors` order.
+    """
+    by_doctor = {}
+    seen = {}
+    for row in rows:
+        appointments = by_doctor.setdefault(row.doctor_id, [])
+        entry = seen.get(row.id)
+        if entry is None:
+            entry = {
+                "date": row.date.strftime("%Y-%m-%d"),
+                "patient": f"{row.patient_first_name} {row.patient_last_name}",
+                "exam_info": "N/A",
+                "examinations": 0,
+            }
+            seen[row.id] = entry
+            appointments.append(entry)
+        if row.examination_id is not None:
+            if entry["examinations"] == 0:
+                entry["exam_info"] = f"Diagnosis: {(row.diagnosis or '')[:50]}..."
+            entry["examinations"] += 1
+
+    generated_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    contexts = []
+    for doctor in doctors:
+        appointments = by_doctor.get(doctor.id)
+        if not appointments:
+            continue
+        contexts.append({
+            "doctor": {
+                "id": doctor.id,
+                "email": doctor.email,
+                "first_name": doctor.first_name,
+                "last_name": doctor.last_name,
+                "specialization": doctor.specialization,
+            },
+            "month": month,
+            "appointments": appointments,
+            "total_examinations": sum(a["examinations"] for a in appointments),
+            "generated_on": generated_on,
+        })
+    return contexts
+
+
+def _render_chunk(contexts):
+    return templates.render_many(REPORT_TEMPLATE, contexts)
+
+
+def render_reports(contexts, processes=PROCESSES, threshold=PARALLEL_THRESHOLD):
+    """Render many report contexts, in a process pool once there are at least `threshold`"""
+    if len(contexts) < threshold or processes == 1:
+        return templates.render_many(REPORT_TEMPLATE, contexts)
+    workers = processes or os.cpu_count() or 1
+    size = max(1, len(contexts) // (workers * 4))
+    chunks = [contexts[i:i + size] for i in range(0, len(contexts), size)]
+    # Spawned, not forked: this runs on the scheduler thread of the threaded web process,
+    # whose other threads may hold locks a fork would copy; each worker compiles the template once
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return [html for rendered in pool.map(_render_chunk, chunks) for html in rendered]
@@ -0,0 +1,93 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from flask import request
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+INVALID_CURSOR = "Invalid pagination cursor"
+
+
+def encode_cursor(values):
+    """Opaque, URL-safe cursor for the sort key values of the last row on a page"""
+    values = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, keys):
+    """Turn a cursor back into sort key values typed like `keys`; raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError("Invalid cursor")
+
+    typed = []
+    for key, value in zip(keys, values):
+        python_type = key.type.python_type
+        try:
+            if value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None and python_type is date:
+                value = date.fromisoformat(value)
+            elif value is not None and not isinstance(value, python_type):
+                raise TypeError
+        except TypeError:
+            raise ValueError("Invalid cursor")
+        typed.append(value)
+    return typed
+
+
+def page_args(default_limit=DEFAULT_PAGE_SIZE):
+    """
+    Read ?limit=&after= from the current request.
+    Returns (limit, after) with limit clamped to MAX_PAGE_SIZE; `after` is the raw cursor.
+    """
+    limit = request.args.get("limit", default_limit, type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return limit, request.args.get("after") or None
+
+
+def page_headers(next_cursor):
+    """Response headers advertising the next page, if there is one"""
+    return {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+
+def _after_clause(keys, values, descending):
+    """(k1, k2, ...) > (v1, v2, ...) spelled out so it works on every backend"""
+    clauses = []
+    for i, key in enumerate(keys):
+        equal_prefix = [keys[j] == values[j] for j in range(i)]
+        beyond = key < values[i] if descending else key > values[i]
+        clauses.append(and_(*equal_prefix, beyond))
+    return or_(*clauses)
+
+
+def paginate(query, keys, after=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    Apply keyset pagination to `query` ordered by `keys` (indexed, unique together).
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    A limit of None returns every remaining row.
+    """
+    if after:
+        query = query.filter(_after_clause(keys, decode_cursor(after, keys), descending))
+    query = query.order_by(*[key.desc() if descending else key for key in keys])
+
+    if limit is None:
+        return query.all(), None
+
+    # Fetch one extra row to know whether another page exists
+    items = query.limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor([getattr(items[-1], key.key) for key in keys])
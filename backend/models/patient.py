@@ -3,7 +3,10 @@ from werkzeug.security import generate_password_hash
 from models.doctor import DoctorModel
 from models.examination import ExaminationModel
 from models.appointment import AppointmentModel
-from sqlalchemy import Enum
+from models.pagination import paginate, DEFAULT_PAGE_SIZE
+from models.daily_stats import DailyStatsModel
+from models import patient_search
+from sqlalchemy import Enum, column, event, exists, inspect, table
 from datetime import datetime
 
 
@@ -25,7 +28,7 @@ class PatientModel(db.Model):
     birthdate = db.Column(db.Date)
     username = db.Column(db.String(80), unique=True)
     password = db.Column(db.String(128))
-    created_at = db.Column(db.Date)
+    created_at = db.Column(db.Date, index=True)
 
     appointments = db.relationship("AppointmentModel")
 
@@ -86,10 +89,13 @@ class PatientModel(db.Model):
         }
 
     def save_to_db(self):
+        if self.id is None:
+            DailyStatsModel.increment(self.created_at, "patients")
         db.session.add(self)
         db.session.commit()
 
     def delete_from_db(self):
+        DailyStatsModel.increment(self.created_at, "patients", -1)
         db.session.delete(self)
         db.session.commit()
 
@@ -114,6 +120,10 @@ class PatientModel(db.Model):
     def find_all(cls):
         return cls.query.all()
 
+    @classmethod
+    def find_page(cls, after=None, limit=DEFAULT_PAGE_SIZE):
+        return paginate(cls.query, [cls.id], after, limit)
+
     @classmethod
     def find_by_doctor(PatientModel, doctor_id):
         patientList = PatientModel.query.join(
@@ -132,3 +142,104 @@ class PatientModel(db.Model):
             .all()
         )
         return examinations
+
+    @classmethod
+    def _search_candidates(cls, text, doctor_id, scope, **tier):
+        """(id, name, email, mobile, username) of the newest MAX_CANDIDATES patients matching `text` in a tier"""
+        search_table = table(patient_search.SEARCH_TABLE, column("rowid", db.Integer))
+        window = (
+            db.session.query(search_table.c.rowid.label("patient_id"))
+            .select_from(search_table)
+            .filter(patient_search.match_clause(patient_search.to_match_query(text, doctor_id, **tier)))
+            .order_by(search_table.c.rowid.desc())
+            .limit(patient_search.MAX_CANDIDATES)
+            .subquery()
+        )
+        # The doctors facet already scopes the match; the EXISTS keeps it exact if stale
+        return (
+            db.session.query(cls.id, cls.first_name, cls.last_name, cls.email, cls.mobile, cls.username)
+            .join(window, window.c.patient_id == cls.id)
+            .filter(*scope)
+            .all()
+        )
+
+    @classmethod
+    def search(cls, text, doctor_id=None, limit=10):
+        """
+        Top `limit` patients whose name, email, mobile or username contain the words
+        of `text` (the last one as a prefix, as the user is still typing), best match
+        first over every match; typos are tolerated when that finds too few. With doctor_id only
+        that doctor's patients (anyone with an appointment with them) are searched.
+        """
+        scope = []
+        if doctor_id is not None:
+            # "+ 0" keeps SQLite on the per-patient index instead of scanning the doctor's visits
+            scope.append(exists().where(
+                (AppointmentModel.patient_id == cls.id) & (AppointmentModel.doctor_id + 0 == doctor_id)
+            ))
+
+        if not patient_search.supported(db.session.get_bind()):
+            query = cls.query.filter(*scope)
+            for token in patient_search.query_tokens(text):
+                query = query.filter(
+                    cls.first_name.ilike(f"{token}%") | cls.last_name.ilike(f"{token}%")
+                    | cls.email.ilike(f"{token}%") | cls.mobile.like(f"{token}%")
+                    | cls.username.ilike(f"{token}%")
+                )
+            return query.order_by(cls.id.desc()).limit(limit).all()
+
+        # Tiers go from best to worst rank. A tier that comes up short has read all of
+        # its matches, and whatever a full tier leaves out is older than what it read
+        # and ranks no better, so the top `limit` is exact
+        candidates = {}
+        for tier in patient_search.TIERS:
+            for row in cls._search_candidates(text, doctor_id, scope, **tier):
+                candidates.setdefault(row.id, row)
+            if len(candidates) >= limit:
+                break
+        candidates = list(candidates.values())
+        tokens = patient_search.query_tokens(text)
+        candidates.sort(key=lambda row: (patient_search.rank(tokens, *row[1:]), -row.id))
+        ids = [row.id for row in candidates[:limit]]
+        patients = {patient.id: patient for patient in cls.query.filter(cls.id.in_(ids))} if ids else {}
+        return [patients[patient_id] for patient_id in ids if patient_id in patients]
+
+
+# Keep the lookup index in step with patients and the doctors they have seen
+@event.listens_for(PatientModel, "after_insert")
+def _index_new_patient(mapper, connection, target):
+    patient_search.index_patient(connection, target.id)
+
+
+@event.listens_for(PatientModel, "after_update")
+def _reindex_patient(mapper, connection, target):
+    state = inspect(target)
+    fields = ("first_name", "last_name", "email", "mobile", "username")
+    if any(state.attrs[name].history.has_changes() for name in fields):
+        patient_search.index_patient(connection, target.id)
+
+
+@event.listens_for(PatientModel, "after_delete")
+def _unindex_patient(mapper, connection, target):
+    patient_search.remove_patient(connection, target.id)
+
+
+@event.listens_for(AppointmentModel, "after_insert")
+@event.listens_for(AppointmentModel, "after_delete")
+def _reindex_appointment_patient(mapper, connection, target):
+    if target.patient_id is not None:
+        patient_search.index_patient(connection, target.patient_id)
+
+
+@event.listens_for(AppointmentModel, "after_update")
+def _reindex_moved_appointment(mapper, connection, target):
+    history = inspect(target).attrs
+    if history.doctor_id.history.has_changes() or history.patient_id.history.has_changes():
+        patient_ids = set(history.patient_id.history.deleted or ()) | {target.patient_id}
+        for patient_id in patient_ids - {None}:
+            patient_search.index_patient(connection, patient_id)
+
+
+@event.listens_for(PatientModel.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    patient_search.create_index(connection)
@@ -0,0 +1,214 @@
+import os
+import shutil
+from models.db import db
+from models import blob_store
+from models.image_blob import ImageBlobModel
+from models.image_metadata import get_dimensions
+from models.pagination import paginate, DEFAULT_PAGE_SIZE
+from datetime import datetime
+from sqlalchemy import or_
+from sqlalchemy.orm import foreign
+
+IMAGES_URL = "http://localhost:5000/static/images"
+
+
+class PatientImageModel(db.Model):
+    """
+    One uploaded scan of a patient: a named reference to a content-addressed blob
+    (models.blob_store). The table, not the static/images folder, is the source of
+    truth for listing and deleting a patient's images.
+    """
+
+    __tablename__ = "PatientImages"
+    __table_args__ = (
+        db.UniqueConstraint("patient_id", "filename", name="uq_PatientImages_patient_id_filename"),
+        db.Index("ix_PatientImages_patient_id_uploaded_at", "patient_id", "uploaded_at", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey("Patients.id", ondelete="CASCADE"), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer)
+    content_hash = db.Column(db.String(64), index=True)  # sha256 hex, key of the blob
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Downscaled copies, relative to the images folder (see models.image_derivatives)
+    thumbnail = db.Column(db.String(255), nullable=True)
+    preview = db.Column(db.String(255), nullable=True)
+
+    blob = db.relationship(
+        ImageBlobModel,
+        primaryjoin=foreign(content_hash) == ImageBlobModel.content_hash,
+        lazy="joined",
+        viewonly=True,
+    )
+
+    def __init__(self, patient_id, filename, size=None, content_hash=None,
+                 width=None, height=None, uploaded_at=None):
+        self.patient_id = patient_id
+        self.filename = filename
+        self.size = size
+        self.content_hash = content_hash
+        self.width = width
+        self.height = height
+        self.uploaded_at = uploaded_at or datetime.utcnow()
+
+    @property
+    def folder(self):
+        """Per-patient folder the image lived in before the blob store"""
+        return f"patient_{self.patient_id}"
+
+    @property
+    def path(self):
+        """File of this image relative to the images folder"""
+        if self.blob is not None:
+            return self.blob.path
+        return f"{self.folder}/{self.filename}"
+
+    @staticmethod
+    def _url(path):
+        return f"{IMAGES_URL}/{path}" if path else None
+
+    def derivative_path(self, derivative):
+        """
+        A thumbnail or preview path relative to the images folder. Those rendered
+        before the blob store were stored relative to the patient's folder.
+        """
+        if derivative and not derivative.startswith(f"{blob_store.BLOB_FOLDER}/"):
+            return f"{self.folder}/{derivative}"
+        return derivative
+
+    @property
+    def etag(self):
+        """Strong validator: the content hash identifies the bytes exactly"""
+        return f'"{self.content_hash}"' if self.content_hash else None
+
+    def json(self):
+        return {
+            "_id": self.id,
+            "image": self._url(self.path),
+            "thumbnail": self._url(self.derivative_path(self.thumbnail)),
+            "preview": self._url(self.derivative_path(self.preview)),
+            "filename": self.filename,
+            "size": self.size,
+            "content_hash": self.content_hash,
+            "etag": self.etag,
+            "width": self.width,
+            "height": self.height,
+            "uploaded_at": self.uploaded_at.strftime("%Y-%m-%d %H:%M:%S") if self.uploaded_at else None,
+        }
+
+    def save_to_db(self):
+        db.session.add(self)
+        db.session.commit()
+
+    def delete_from_db(self):
+        db.session.delete(self)
+        db.session.commit()
+
+    @classmethod
+    def create(cls, patient_id, filename, content_hash, extension, size, uploaded_at=None, images_folder=None):
+        """
+        Add an image that references blob `content_hash`, taking a reference on the
+        blob in the same transaction (not committed). Returns the new image.
+        """
+        width = height = None
+        if images_folder is not None:
+            width, height = get_dimensions(os.path.join(images_folder, blob_store.blob_path(content_hash, extension)))
+        ImageBlobModel.acquire(content_hash, extension, size, width, height)
+        image = cls(
+            patient_id, cls.available_filename(patient_id, filename), size, content_hash,
+            width, height, uploaded_at,
+        )
+        db.session.add(image)
+        return image
+
+    def remove(self, images_folder):
+        """Delete this image and drop its blob reference; blob files go once unreferenced"""
+        blob = ImageBlobModel.release(self.content_hash) if self.content_hash else None
+        db.session.delete(self)
+        db.session.commit()
+        derivatives = (self.derivative_path(self.thumbnail), self.derivative_path(self.preview))
+        if blob is not None:
+            blob_store.remove(images_folder, blob.path, *derivatives)
+        elif self.content_hash is None or ImageBlobModel.find_by_hash(self.content_hash) is None:
+            # Stored before the blob store existed
+            blob_store.remove(images_folder, self.path, *derivatives)
+
+    @classmethod
+    def available_filename(cls, patient_id, filename):
+        """`filename`, or name_1.ext, name_2.ext... if the patient already has one by that name"""
+        taken = {
+            row.filename
+            for row in db.session.query(cls.filename).filter(
+                cls.patient_id == patient_id,
+                or_(cls.filename == filename, cls.filename.like(f"{os.path.splitext(filename)[0]}_%")),
+            )
+        }
+        name, extension = os.path.splitext(filename)
+        candidate, count = filename, 0
+        while candidate in taken:
+            count += 1
+            candidate = f"{name}_{count}{extension}"
+        return candidate
+
+    @classmethod
+    def find_by_id(cls, image_id):
+        return cls.query.filter_by(id=image_id).first()
+
+    @classmethod
+    def find_by_filename(cls, patient_id, filename):
+        return cls.query.filter_by(patient_id=patient_id, filename=filename).first()
+
+    @classmethod
+    def find_by_content_hash(cls, patient_id, content_hash):
+        return cls.query.filter_by(patient_id=patient_id, content_hash=content_hash).first()
+
+    @classmethod
+    def find_page_by_patient_id(cls, patient_id, after=None, limit=DEFAULT_PAGE_SIZE):
+        """A patient's images in upload order. Returns (images, next_cursor)"""
+        query = cls.query.filter_by(patient_id=patient_id)
+        return paginate(query, [cls.uploaded_at, cls.id], after, limit)
+
+    @classmethod
+    def find_batch_for_derivatives(cls, after_id=0, limit=200, include_done=False):
+        """Next `limit` images (by id) after `after_id`, only those missing a derivative unless include_done"""
+        query = cls.query.filter(cls.id > after_id)
+        if not include_done:
+            query = query.filter(or_(cls.thumbnail.is_(None), cls.preview.is_(None)))
+        return query.order_by(cls.id).limit(limit).all()
+
+    @classmethod
+    def index_folder(cls, patient_id, images_folder):
+        """
+        Move a patient's images from static/images/patient_<id> into the blob store.
+        Files without a row get one (uploaded at the file's mtime); rows indexed before
+        the blob store take a blob reference. Old per-patient derivatives are dropped
+        so they get re-rendered next to the blobs. Returns the number of files moved.
+        """
+        folder = os.path.join(images_folder, f"patient_{patient_id}")
+        moved = []
+        with os.scandir(folder) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if not entry.is_file():
+                    continue
+                content_hash, size, _ = blob_store.store_file(entry.path, images_folder)
+                extension = os.path.splitext(entry.name)[1].lower()
+                image = cls.find_by_filename(patient_id, entry.name)
+                if image is None:
+                    uploaded_at = datetime.utcfromtimestamp(entry.stat().st_mtime)
+                    cls.create(patient_id, entry.name, content_hash, extension, size, uploaded_at, images_folder)
+                else:
+                    blob = ImageBlobModel.acquire(content_hash, extension, size)
+                    image.content_hash, image.size = content_hash, size
+                    image.width, image.height = get_dimensions(os.path.join(images_folder, blob.path))
+                    image.thumbnail = image.preview = None
+                moved.append(entry.path)
+        db.session.commit()
+
+        for path in moved:
+            os.remove(path)
+        for kind in ("_thumbnail", "_preview"):
+            shutil.rmtree(os.path.join(folder, kind), ignore_errors=True)
+        return len(moved)
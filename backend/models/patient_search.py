@@ -0,0 +1,197 @@
+"""
+Patient lookup index (SQLite FTS5) - prefix and typo tolerant matching on name,
+email, mobile and username
+
+PatientSearch holds one row per patient (rowid = patient id):
+  name, email, username   tokens; earlier words of a lookup match whole words and
+                          the last one (still being typed) is a prefix
+  mobile                  the number's digits only, so "0100 12" finds 010012...
+  fuzzy                   every one-letter deletion of the name/username tokens;
+                          a query token matches when the two deletion sets meet
+                          (edit distance up to 2, SymSpell style)
+  doctors                 doctor<id> for every doctor the patient has seen, so a
+                          doctor's search is limited by the index
+
+The mapper events in models.patient keep it in sync with patients and their
+appointments; run rebuild_patient_search.py after bulk Core writes.
+"""
+import re
+from sqlalchemy import literal_column
+from models.db import db
+
+SEARCH_TABLE = "PatientSearch"
+COLUMNS = ("name", "email", "mobile", "username", "fuzzy", "doctors")
+# Matches read per tier (newest patients first), which keeps short prefixes cheap
+MAX_CANDIDATES = 200
+# Lookups widen tier by tier, best rank first, until they have enough candidates:
+# whole name words, name prefixes, any column, then typos (see to_match_query)
+TIERS = (
+    {"names_only": True, "whole_words": True},
+    {"names_only": True},
+    {},
+    {"fuzzy": True},
+)
+# Tokens shorter than this are matched as prefixes only, never fuzzily
+FUZZY_MIN_LENGTH = 4
+REBUILD_BATCH_SIZE = 10000
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_PHONE = re.compile(r"\s*\+?[\d\s()-]+")
+_SELECT_PATIENTS = (
+    'SELECT p.id, p.first_name, p.last_name, p.email, p.mobile, p.username, '
+    '(SELECT group_concat(DISTINCT a.doctor_id) FROM "Appointments" a WHERE a.patient_id = p.id) '
+    'FROM "Patients" p'
+)
+
+
+def supported(bind):
+    return bind.dialect.name == "sqlite"
+
+
+def create_index(bind):
+    """CREATE the FTS5 table if it is missing. Returns True if it was created"""
+    if not supported(bind):
+        return False
+    exists = bind.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (SEARCH_TABLE,)
+    ).first()
+    if exists:
+        return False
+    bind.execute(
+        f'CREATE VIRTUAL TABLE "{SEARCH_TABLE}" USING fts5({", ".join(COLUMNS)}, '
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+    )
+    return True
+
+
+def ensure_index(engine=None):
+    """Create the index on an existing database and fill it. Returns True if it was created"""
+    engine = engine or db.engine
+    if not create_index(engine):
+        return False
+    rebuild(engine)
+    return True
+
+
+def deletions(token):
+    """`token` and every string made by deleting one of its characters (numbers are matched exactly)"""
+    variants = {token}
+    if len(token) >= FUZZY_MIN_LENGTH and not token.isdigit():
+        variants.update(token[:i] + token[i + 1:] for i in range(len(token)))
+    return variants
+
+
+def _index_row(patient_id, first_name, last_name, email, mobile, username, doctor_ids):
+    words = [w.lower() for w in _WORD.findall(f"{first_name or ''} {last_name or ''} {username or ''}")]
+    fuzzy = set()
+    for word in words:
+        fuzzy.update(deletions(word))
+    doctors = " ".join(f"doctor{d}" for d in str(doctor_ids).split(",")) if doctor_ids else ""
+    return (
+        patient_id,
+        f"{first_name or ''} {last_name or ''}",
+        email or "",
+        re.sub(r"\D", "", mobile or ""),
+        username or "",
+        " ".join(sorted(fuzzy)),
+        doctors,
+    )
+
+
+_INSERT = f'INSERT INTO "{SEARCH_TABLE}" (rowid, {", ".join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)'
+
+
+def index_patient(connection, patient_id):
+    """(Re-)index one patient on `connection` (the flushing transaction)"""
+    if not supported(connection):
+        return
+    connection.execute(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = ?', (patient_id,))
+    row = connection.execute(f"{_SELECT_PATIENTS} WHERE p.id = ?", (patient_id,)).first()
+    if row is not None:
+        connection.execute(_INSERT, _index_row(*row))
+
+
+def remove_patient(connection, patient_id):
+    if supported(connection):
+        connection.execute(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = ?', (patient_id,))
+
+
+def rebuild(engine=None):
+    """Re-index every patient from scratch. Returns the number indexed"""
+    engine = engine or db.engine
+    if not supported(engine):
+        return 0
+    count = 0
+    with engine.begin() as connection:
+        create_index(connection)
+        connection.execute(f'DELETE FROM "{SEARCH_TABLE}"')
+        result = connection.execute(_SELECT_PATIENTS)
+        while True:
+            rows = result.fetchmany(REBUILD_BATCH_SIZE)
+            if not rows:
+                break
+            connection.execute(_INSERT, [_index_row(*row) for row in rows])
+            count += len(rows)
+        connection.execute(f'INSERT INTO "{SEARCH_TABLE}" ("{SEARCH_TABLE}") VALUES (\'optimize\')')
+    return count
+
+
+def query_tokens(text):
+    """Lower-cased words of `text`; a phone number like "+20 100 555" is one token of its digits"""
+    tokens = [word.lower() for word in _WORD.findall(text or "")]
+    if len(tokens) > 1 and _PHONE.fullmatch(text):
+        return ["".join(tokens)]
+    return tokens
+
+
+def to_match_query(text, doctor_id=None, fuzzy=False, names_only=False, whole_words=False):
+    """
+    FTS5 query for a lookup, read as the user types: every token must match a word
+    of the name, email, mobile or username, the last one as a prefix. With `fuzzy`
+    a token of FUZZY_MIN_LENGTH or more may instead be a typo away from a name or
+    username word. `names_only` matches the name alone and `whole_words` drops the
+    prefix, for the tiers that find the best ranked patients first.
+    Returns None if there is nothing to search for.
+    """
+    tokens = query_tokens(text)
+    if not tokens:
+        return None
+    columns = "name" if names_only else "name email mobile username"
+    clauses = []
+    for position, token in enumerate(tokens, 1):
+        prefix = position == len(tokens) and not whole_words
+        clause = f'{{{columns}}} : "{token}"' + ("*" if prefix else "")
+        if fuzzy and len(token) >= FUZZY_MIN_LENGTH and not token.isdigit():
+            variants = " OR ".join(f'"{variant}"' for variant in sorted(deletions(token)))
+            clause = f"({clause} OR fuzzy : ({variants}))"
+        clauses.append(clause)
+    if doctor_id is not None:
+        clauses.append(f"doctors : doctor{int(doctor_id)}")
+    return " AND ".join(clauses)
+
+
+def match_clause(match_query):
+    return literal_column(SEARCH_TABLE).op("MATCH")(match_query)
+
+
+def rank(tokens, first_name, last_name, email, mobile, username):
+    """
+    Sort key for a matched patient, lower is better. Each token scores 0 for a whole
+    name word, 1 for a name prefix, 2 for an email/mobile/username prefix and 3 when
+    it only matched as a typo. bm25 would have to read every match of every term to
+    weigh them, which is what makes short prefixes slow on a large index.
+    """
+    names = [w.lower() for w in _WORD.findall(f"{first_name or ''} {last_name or ''}")]
+    others = [w.lower() for w in _WORD.findall(f"{email or ''} {username or ''}")]
+    others.append(re.sub(r"\D", "", mobile or ""))
+    score = 0
+    for token in tokens:
+        if token in names:
+            continue
+        elif any(name.startswith(token) for name in names):
+            score += 1
+        elif any(other.startswith(token) for other in others):
+            score += 2
+        else:
+            score += 3
+    return score
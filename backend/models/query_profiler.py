@@ -0,0 +1,167 @@
+"""
+Per-request SQL instrumentation
+
+Cursor events on every engine feed the active QueryStats: statement count,
+time spent in the database and a fingerprint per statement (literals and IN
+lists collapsed), so the same query run once per row of a page - an N+1 -
+shows up as one fingerprint with a high count.
+
+init_profiler(app) collects stats for each request when SQL_PROFILING is on
+(default: app.debug), answers with X-Query-Count and Server-Timing headers and
+logs suspected N+1 patterns. count_queries() and assert_query_budget() do the
+same around any block of code, for tests and benchmarks.
+
+Time is measured until the cursor returns; SQLite finishes some of its work
+while rows are fetched, which is not included.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, request
+from flask_restful import Resource
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Identical statements run this many times in one request are reported as N+1
+N_PLUS_ONE_THRESHOLD = 5
+# Queries a resource may run per request unless it sets QUERY_BUDGET
+DEFAULT_QUERY_BUDGET = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+_active = threading.local()
+
+
+def fingerprint(statement):
+    """`statement` with literals replaced by ? and whitespace collapsed"""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("(?...)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """Queries seen while this collector was active"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def suspected_n_plus_one(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(fingerprint, times run)] of statements repeated at least `threshold` times"""
+        return [(statement, n) for statement, n in self.fingerprints.most_common() if n >= threshold]
+
+    def server_timing(self):
+        return f'db;dur={self.total_ms:.1f};desc="{self.count} queries"'
+
+    def report(self, limit=10):
+        lines = [f"{self.count} queries in {self.total_ms:.1f} ms"]
+        lines += [f"  {n:>4} x {statement[:200]}" for statement, n in self.fingerprints.most_common(limit)]
+        return "\n".join(lines)
+
+
+def _collectors():
+    if not hasattr(_active, "collectors"):
+        _active.collectors = []
+    return _active.collectors
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collectors():
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for stats in _collectors():
+        stats.record(statement, elapsed_ms)
+
+
+@contextmanager
+def count_queries():
+    """Collect QueryStats for the statements run inside the block (on this thread)"""
+    stats = QueryStats()
+    _collectors().append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors().remove(stats)
+
+
+def assert_query_budget(client, method, url, budget, **kwargs):
+    """
+    Request `url` with a Flask test client and fail if it ran more than `budget`
+    queries or looks like an N+1. Returns (response, stats).
+
+        response, stats = assert_query_budget(client, "GET", "/patients", 3, headers=auth)
+    """
+    with count_queries() as stats:
+        response = client.open(url, method=method, **kwargs)
+        response.get_data()  # streamed bodies query while they are read
+    problems = []
+    if stats.count > budget:
+        problems.append(f"ran {stats.count} queries, budget is {budget}")
+    if stats.suspected_n_plus_one():
+        problems.append("suspected N+1")
+    assert not problems, f"{method} {url}: {', '.join(problems)}\n{stats.report()}"
+    return response, stats
+
+
+def resource_budgets(app):
+    """{endpoint: (resource class, url rules, query budget)} for every flask_restful resource of `app`"""
+    budgets = {}
+    for rule in app.url_map.iter_rules():
+        resource = getattr(app.view_functions[rule.endpoint], "view_class", None)
+        if resource is None or not issubclass(resource, Resource):
+            continue
+        _, urls, budget = budgets.get(rule.endpoint, (resource, [], None))
+        urls.append(rule.rule)
+        budgets[rule.endpoint] = (resource, urls, getattr(resource, "QUERY_BUDGET", DEFAULT_QUERY_BUDGET))
+    return budgets
+
+
+def _profiling_enabled(app):
+    enabled = app.config.get("SQL_PROFILING")
+    return app.debug if enabled is None else enabled
+
+
+def init_profiler(app):
+    """Profile the SQL of every request when SQL_PROFILING (or debug mode) is on"""
+
+    @app.before_request
+    def _start_query_stats():
+        if _profiling_enabled(app):
+            g.query_stats = QueryStats()
+            _collectors().append(g.query_stats)
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = g.get("query_stats")
+        if stats is None:
+            return response
+        response.headers["X-Query-Count"] = str(stats.count)
+        response.headers.add("Server-Timing", stats.server_timing())
+        for statement, n in stats.suspected_n_plus_one():
+            app.logger.warning("Suspected N+1 in %s %s: %d x %s", request.method, request.path, n, statement)
+        return response
+
+    @app.teardown_request
+    def _stop_query_stats(exception=None):
+        stats = g.pop("query_stats", None)
+        if stats is not None and stats in _collectors():
+            _collectors().remove(stats)
@@ -1,7 +1,7 @@
 from flask import request
 from flask_restful import Resource
 from datetime import datetime
-from models.analytics import find_count
+from models.analytics import find_count, BUCKETS
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
@@ -20,7 +20,11 @@ class Analytics(Resource):
         if get_jwt_claims()["type"] != "admin":
             return {"message": "Access denied"}
 
+        bucket = request.args.get("bucket", "day")
+        if bucket not in BUCKETS:
+            return {"message": f"bucket must be one of: {', '.join(BUCKETS)}"}, 400
+
         date = request.args.get("date")
         y, m, d = [int(x) for x in date.split("-")]
         date = datetime(y, m, d).date()
-        return find_count(date)
+        return find_count(date, bucket)
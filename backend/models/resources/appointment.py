@@ -1,15 +1,23 @@
+from flask import request
 from flask_restful import Resource, reqparse
 from models.appointment import AppointmentModel
-from models.examination import ExaminationModel
 from datetime import datetime
 from models.doctor import DoctorModel
 from models.patient import PatientModel
+from models.pagination import page_args, page_headers, INVALID_CURSOR
 from flask_jwt_extended import (
     jwt_required,
     get_jwt_identity,
     get_jwt_claims,
 )
 
+def _parse_date(value):
+    """Parse an optional YYYY-MM-DD query argument"""
+    if not value:
+        return None
+    y, m, d = [int(x) for x in value.split("-")]
+    return datetime(y, m, d).date()
+
 
 class appointment(Resource):
     appointment_parser = reqparse.RequestParser()
@@ -102,18 +110,28 @@ class appointment(Resource):
         claims = get_jwt_claims()
 
         if claims["type"] == "doctor":
-            doctor_appointments = DoctorModel.find_by_id(identity).appointments
-            
-            # Filter out appointments that have examinations
-            pending_appointments = []
-            for appointment in doctor_appointments:
-                # Check if this appointment has an examination
-                examination = ExaminationModel.query.filter_by(appointment_id=appointment.id).first()
-                if not examination:  # Only include if no examination exists
-                    pending_appointments.append(appointment)
-            
+            # Pending queue: appointments without an examination yet
+            try:
+                start = _parse_date(request.args.get("from"))
+                end = _parse_date(request.args.get("to"))
+            except (ValueError, IndexError):
+                return {"message": "Invalid date format. Use YYYY-MM-DD"}, 400
+            # The queue is only paged when the client asks for it
+            limit, after = page_args(default_limit=None)
+            try:
+                pending_appointments, next_cursor = AppointmentModel.find_pending_by_doctor(
+                    identity, start=start, end=end, after=after, limit=limit
+                )
+            except ValueError:
+                return {"message": INVALID_CURSOR}, 400
+
+            headers = page_headers(next_cursor)
+            headers["X-Pending-Count"] = str(
+                AppointmentModel.count_pending_by_doctor(identity, start, end)
+            )
+
             doctorapp = [appointment.json() for appointment in pending_appointments]
-            return doctorapp, 200
+            return doctorapp, 200, headers
 
         elif claims["type"] == "patient":
             patient_appointments = PatientModel.find_by_id(identity).appointments
@@ -122,9 +140,13 @@ class appointment(Resource):
             return patientapp
 
         else:
-            appointments = AppointmentModel.find_all()
+            limit, after = page_args()
+            try:
+                appointments, next_cursor = AppointmentModel.find_page(after, limit)
+            except ValueError:
+                return {"message": INVALID_CURSOR}, 400
             appointments_list = [appointment.json() for appointment in appointments]
-            return appointments_list, 200
+            return appointments_list, 200, page_headers(next_cursor)
 
 
 class deleteAppointments(Resource):
@@ -1,4 +1,5 @@
 from models.contact_us import ContactUsModel
+from models.pagination import page_args, page_headers, INVALID_CURSOR
 from flask_restful import Resource, reqparse
 from datetime import datetime
 from flask_jwt_extended import (
@@ -65,6 +66,10 @@ class ContactUsList(Resource):
     def get(cls):
         if get_jwt_claims()["type"] != "admin":
             return {"message": AUTHORIZATION_ERROR}
-        forms = ContactUsModel.find_all()
+        limit, after = page_args()
+        try:
+            forms, next_cursor = ContactUsModel.find_page(after, limit)
+        except ValueError:
+            return {"message": INVALID_CURSOR}, 400
         forms_list = [form.json() for form in forms]
-        return forms_list, 200
+        return forms_list, 200, page_headers(next_cursor)
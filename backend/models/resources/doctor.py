@@ -2,6 +2,7 @@ from flask_restful import Resource, reqparse
 from models.doctor import DoctorModel
 from models.patient import PatientModel
 from models.examination import ExaminationModel
+from models.pagination import page_args, page_headers, INVALID_CURSOR
 from werkzeug.security import check_password_hash
 from flask_jwt_extended import (
     create_access_token,
@@ -140,11 +141,13 @@ class DoctorLogin(Resource):
 class DoctorList(Resource):
     @classmethod
     def get(cls):
-
-        doctors = DoctorModel.find_all()
+        limit, after = page_args()
+        try:
+            doctors, next_cursor = DoctorModel.find_page(after, limit)
+        except ValueError:
+            return {"message": INVALID_CURSOR}, 400
         doctors_list = [doctor.json() for doctor in doctors]
-        date = datetime(2021, 1, 12).date()
-        return doctors_list, 200
+        return doctors_list, 200, page_headers(next_cursor)
 
 
 class DoctorPatient(Resource):
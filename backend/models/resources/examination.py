@@ -1,9 +1,12 @@
 from models.examination import ExaminationModel
 from models.appointment import AppointmentModel
+from flask import request
 from flask_restful import Resource, reqparse
 from datetime import datetime
+from models import examination_search
 from models.doctor import DoctorModel
 from models.patient import PatientModel
+from models.pagination import page_args, page_headers, INVALID_CURSOR
 from flask_jwt_extended import (
     jwt_required,
     get_jwt_identity,
@@ -40,10 +43,7 @@ class PatientExaminations(Resource):
     @jwt_required
     def get(cls, patient_id):
         if get_jwt_claims()["type"] == "doctor":
-            examinations = ExaminationModel.find_all_filtered(patient_id)
-            examination_list = [
-                examination.json_with_info() for examination in examinations
-            ]
+            examination_list = ExaminationModel.find_all_with_info(patient_id)
             return examination_list, 200
         return {"message": "Unauthorized: You must be a doctor"}
 
@@ -75,20 +75,69 @@ class ExaminationList(Resource):
     @classmethod
     @jwt_required
     def get(cls):
+        limit, after = page_args()
         if get_jwt_claims()["type"] == "admin":
-            examinations = ExaminationModel.find_all()
-
-            examinations_list = [
-                examination.json_with_info() for examination in examinations
-            ]
-            return examinations_list, 200
+            try:
+                examinations_list, next_cursor = ExaminationModel.find_page_with_info(
+                    after=after, limit=limit
+                )
+            except ValueError:
+                return {"message": INVALID_CURSOR}, 400
+            return examinations_list, 200, page_headers(next_cursor)
 
         elif get_jwt_claims()["type"] == "patient":
             patient_id = get_jwt_identity()
-            examinations = ExaminationModel.find_all_filtered(patient_id)
-            examination_list = [
-                examination.json_with_info() for examination in examinations
-            ]
-            return examination_list, 200
+            try:
+                examination_list, next_cursor = ExaminationModel.find_page_with_info(
+                    patient_id, after, limit
+                )
+            except ValueError:
+                return {"message": INVALID_CURSOR}, 400
+            return examination_list, 200, page_headers(next_cursor)
         else:
             return {"message": "Authorization required"}
+
+
+class ExaminationSearch(Resource):
+    """GET /examinations/search?q=&doctor_id=&patient_id=&from=YYYY-MM-DD&to=YYYY-MM-DD&sort=relevance|recent"""
+
+    @classmethod
+    @jwt_required
+    def get(cls):
+        user_type = get_jwt_claims()["type"]
+        if user_type not in ("doctor", "admin", "patient"):
+            return {"message": "Authorization required"}, 401
+
+        text = request.args.get("q", "")
+        if not examination_search.to_match_query(text):
+            return {"message": "q must contain at least one word to search for"}, 400
+        try:
+            start, end = [
+                datetime.strptime(request.args[name], "%Y-%m-%d").date() if request.args.get(name) else None
+                for name in ("from", "to")
+            ]
+        except ValueError:
+            return {"message": "from and to must be dates (YYYY-MM-DD)"}, 400
+        sort = request.args.get("sort", "relevance")
+        if sort not in examination_search.SORTS:
+            return {"message": f"sort must be one of {', '.join(examination_search.SORTS)}"}, 400
+
+        patient_id = request.args.get("patient_id", type=int)
+        if user_type == "patient":
+            # Patients only ever search their own history
+            patient_id = get_jwt_identity()
+        limit, after = page_args()
+        try:
+            results, next_cursor = ExaminationModel.search(
+                text,
+                doctor_id=request.args.get("doctor_id", type=int),
+                patient_id=patient_id,
+                start=start,
+                end=end,
+                after=after,
+                limit=limit,
+                sort=sort,
+            )
+        except ValueError:
+            return {"message": INVALID_CURSOR}, 400
+        return results, 200, page_headers(next_cursor)
@@ -1,15 +1,64 @@
 """
 Export Resource - Handle CSV export requests from frontend
 """
-from flask_restful import Resource, reqparse
+from flask_restful import Resource, reqparse, inputs
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.treatment_export import TreatmentExportModel
 from models.patient import PatientModel
-from models.jobs.tasks import process_pending_exports
+from models.pagination import page_args, page_headers, INVALID_CURSOR
+from models.export_writer import iter_export, mimetype_for, CHUNK_SIZE
 import os
-from flask import send_file, current_app
+from flask import Response, request, stream_with_context
 from datetime import datetime
 
+EXPORT_FORMATS = ("csv", "ndjson")
+
+
+def _export_type_args():
+    """Read format=csv|ndjson and gzip=true|false; returns an export type like "ndjson.gz" """
+    parser = reqparse.RequestParser()
+    parser.add_argument("format", type=str, default="csv", choices=EXPORT_FORMATS,
+                        help="format must be csv or ndjson")
+    parser.add_argument("gzip", type=inputs.boolean, default=False)
+    data = parser.parse_args()
+    return f"{data['format']}.gz" if data["gzip"] else data["format"]
+
+
+def _file_response(path, download_name, mimetype):
+    """
+    Stream a file in CHUNK_SIZE blocks, honouring a single HTTP byte Range
+    so interrupted downloads can resume.
+    """
+    size = os.path.getsize(path)
+    start, stop, status = 0, size, 200
+
+    if request.range and request.range.units == "bytes" and len(request.range.ranges) == 1:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            return Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+        start, stop = byte_range
+        status = 206
+
+    def generate():
+        with open(path, "rb") as export_file:
+            export_file.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = export_file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    headers = {
+        "Content-Length": str(stop - start),
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{download_name}"',
+    }
+    if status == 206:
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    return Response(generate(), status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+
 
 class ExportTreatmentHistory(Resource):
     """
@@ -30,19 +79,19 @@ class ExportTreatmentHistory(Resource):
         if not patient:
             return {"message": "Patient not found"}, 404
         
+        export_type = _export_type_args()
+        
         try:
-            # Create new export record
-            export = TreatmentExportModel(patient_id=patient_id, export_type="csv")
+            # Enqueue the export; a worker (python -m models.jobs.worker) generates it
+            export = TreatmentExportModel(patient_id=patient_id, export_type=export_type)
             export.save_to_db()
             
-            print(f"✓ Export job created for patient {patient_id}")
-            
-            # Process the export immediately (can be queued to a background worker in production)
-            process_pending_exports()
+            print(f"✓ Export job queued for patient {patient_id}")
             
             return {
                 "message": "Export request received",
                 "export_id": export.id,
+                "export_type": export.export_type,
                 "status": export.status,
                 "created_at": export.created_at.strftime("%Y-%m-%d %H:%M:%S")
             }, 202
@@ -86,12 +135,18 @@ class PatientExports(Resource):
         if current_patient_id != patient_id:
             return {"message": "Unauthorized"}, 403
         
-        exports = TreatmentExportModel.find_by_patient_id(patient_id)
+        limit, after = page_args()
+        try:
+            exports, next_cursor = TreatmentExportModel.find_page_by_patient_id(
+                patient_id, after, limit
+            )
+        except ValueError:
+            return {"message": INVALID_CURSOR}, 400
         
         return {
             "exports": [export.json() for export in exports],
-            "total": len(exports)
-        }, 200
+            "total": TreatmentExportModel.count_by_patient_id(patient_id)
+        }, 200, page_headers(next_cursor)
 
 
 class DownloadExport(Resource):
@@ -119,10 +174,35 @@ class DownloadExport(Resource):
             return {"message": "Export file not found"}, 404
         
         try:
-            return send_file(
+            return _file_response(
                 export.file_path,
-                as_attachment=True,
-                download_name=os.path.basename(export.file_path)
+                os.path.basename(export.file_path),
+                mimetype_for(export.export_type)
             )
         except Exception as e:
             return {"message": f"Error downloading file: {str(e)}"}, 500
+
+
+class StreamTreatmentHistory(Resource):
+    """
+    Stream a patient's treatment history directly, without creating an export file
+    GET /patient/<patient_id>/export/stream?format=csv|ndjson&gzip=true
+    """
+    
+    @jwt_required
+    def get(self, patient_id):
+        # Verify patient is requesting their own history
+        current_patient_id = get_jwt_identity()
+        
+        if current_patient_id != patient_id:
+            return {"message": "Unauthorized"}, 403
+        
+        export_type = _export_type_args()
+        filename = f"patient_{patient_id}_treatment_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_type}"
+        
+        return Response(
+            stream_with_context(iter_export(patient_id, export_type)),
+            mimetype=mimetype_for(export_type),
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            direct_passthrough=True
+        )
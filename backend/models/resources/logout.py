@@ -6,6 +6,7 @@ from models.blacklist import BLACKLIST
 class Logout(Resource):
     @jwt_required
     def post(self):
-        jti = get_raw_jwt()["jti"]  # jti is a "JWT ID", a unique identifier for a JWT
-        BLACKLIST.add(jti)
+        raw_jwt = get_raw_jwt()
+        jti = raw_jwt["jti"]  # jti is a "JWT ID", a unique identifier for a JWT
+        BLACKLIST.add(jti, raw_jwt["exp"])
         return {"message": "Sucessfully logged out"}, 200
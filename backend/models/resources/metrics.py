@@ -0,0 +1,11 @@
+from flask import Response
+from flask_restful import Resource
+from models import metrics
+
+
+class Metrics(Resource):
+    """GET /metrics - every process's counters and the queue gauges, for Prometheus to scrape"""
+
+    @classmethod
+    def get(cls):
+        return Response(metrics.render(metrics.database_gauges()), content_type=metrics.CONTENT_TYPE)
@@ -1,3 +1,4 @@
+from flask import request
 from flask_restful import Resource, reqparse
 from werkzeug.security import check_password_hash
 from flask_jwt_extended import (
@@ -8,6 +9,8 @@ from flask_jwt_extended import (
     jwt_required,
 )
 from models.patient import PatientModel
+from models import patient_search
+from models.pagination import page_args, page_headers, INVALID_CURSOR
 from datetime import datetime, timedelta
 
 
@@ -147,7 +150,32 @@ class PatientList(Resource):
     @jwt_required
     def get(cls):
         if get_jwt_claims()["type"] == "admin":
-            patients = PatientModel.find_all()
+            limit, after = page_args()
+            try:
+                patients, next_cursor = PatientModel.find_page(after, limit)
+            except ValueError:
+                return {"message": INVALID_CURSOR}, 400
             patients_list = [patient.json() for patient in patients]
-            return patients_list, 200
+            return patients_list, 200, page_headers(next_cursor)
         return {"message": "Authorization required."}
+
+
+class PatientSearch(Resource):
+    """GET /patients/search?q=&limit= - admins search every patient, doctors their own"""
+
+    MAX_LIMIT = 50
+
+    @classmethod
+    @jwt_required
+    def get(cls):
+        user_type = get_jwt_claims()["type"]
+        if user_type not in ("admin", "doctor"):
+            return {"message": "Authorization required: you must be a doctor or an admin."}, 401
+
+        text = request.args.get("q", "")
+        if not patient_search.query_tokens(text):
+            return {"message": "q must contain at least one letter or digit"}, 400
+        limit = max(1, min(request.args.get("limit", 10, type=int), cls.MAX_LIMIT))
+        doctor_id = get_jwt_identity() if user_type == "doctor" else None
+        patients = PatientModel.search(text, doctor_id=doctor_id, limit=limit)
+        return [patient.json() for patient in patients], 200
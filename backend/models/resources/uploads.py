@@ -1,12 +1,22 @@
-from flask import Flask, request, send_file
+from flask import Flask, Response, request, send_file, current_app
 from flask_restful import Resource, Api, reqparse
 from flask_uploads import UploadNotAllowed
 from models import image_helper
+from models import image_derivatives, blob_store
+from models.db import db
 from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+import hashlib
 import traceback
 import os
+import re
 from flask_jwt_extended import jwt_required, get_jwt_claims
 from models.patient import PatientModel
+from models.patient_image import PatientImageModel
+from models.upload_session import UploadSessionModel, ChunkError
+from models.pagination import page_args, page_headers, INVALID_CURSOR
+
+SHA256_HEX = re.compile(r"[0-9a-fA-F]{64}")
 
 
 class UploadImage(Resource):
@@ -14,20 +24,143 @@ class UploadImage(Resource):
     def post(self, patient_id):
 
         if get_jwt_claims()["type"] == "patient":
-            {"message": "Invalid authorization"}, 401
+            return {"message": "Invalid authorization"}, 401
         if not PatientModel.find_by_id(patient_id):
             return {"message": "A patient with this id does not exist"}, 404
 
         data = request.files
-        print(request.files)
-        if type(data["image"]) != FileStorage:
+        if type(data.get("image")) != FileStorage:
+            return {"message": "Invalid data."}, 400
+        upload = data["image"]
+        basename, extension = upload_filename(upload.filename)
+        if not basename:
+            return {"message": "File type not allowed."}, 400
+
+        # Hash while streaming into the blob store; identical content is stored once
+        images_folder = image_helper.get_images_folder()
+        content_hash, size, _ = blob_store.store_stream(upload.stream, extension, images_folder)
+
+        return register_image(patient_id, basename, content_hash, extension, size, images_folder)
+
+
+def register_image(patient_id, filename, content_hash, extension, size, images_folder):
+    """Add a stored blob to the patient's images (unless it is already there) and queue its derivatives"""
+    existing = PatientImageModel.find_by_content_hash(patient_id, content_hash)
+    if existing:
+        return {"message": "image already uploaded", "image": existing.json()}, 200
+
+    image = PatientImageModel.create(patient_id, filename, content_hash, extension, size,
+                                     images_folder=images_folder)
+    db.session.commit()
+    # Thumbnail and preview are rendered in the background process pool
+    image_derivatives.submit(current_app._get_current_object(), image, images_folder)
+    return {"message": "image uploaded", "image": image.json()}, 201
+
+
+def upload_filename(filename):
+    """(basename, extension) of a client supplied file name, or (None, None) if it may not be uploaded"""
+    basename = image_helper.get_basename(secure_filename(filename or ""))
+    extension = os.path.splitext(basename)[1].lower()
+    if not basename or not image_helper.extension_allowed(extension):
+        return None, None
+    return basename, extension
+
+
+class ChunkedUpload(Resource):
+    """Start a resumable upload: POST {"filename", "size", "chunk_size"?, "sha256"?}"""
+
+    parser = reqparse.RequestParser()
+    parser.add_argument("filename", type=str, required=True, help="This field cannot be blank.")
+    parser.add_argument("size", type=int, required=True, help="This field cannot be blank.")
+    parser.add_argument("chunk_size", type=int, required=False)
+    parser.add_argument("sha256", type=str, required=False)
+
+    @jwt_required
+    def post(self, patient_id):
+        if get_jwt_claims()["type"] == "patient":
+            return {"message": "Invalid authorization"}, 401
+        if not PatientModel.find_by_id(patient_id):
+            return {"message": "A patient with this id does not exist"}, 404
+
+        data = ChunkedUpload.parser.parse_args()
+        basename, extension = upload_filename(data["filename"])
+        if not basename:
+            return {"message": "File type not allowed."}, 400
+        if data["sha256"] and not SHA256_HEX.fullmatch(data["sha256"]):
+            return {"message": "sha256 must be a hex digest."}, 400
+        try:
+            session = UploadSessionModel.start(
+                patient_id, basename, extension, data["size"], image_helper.get_images_folder(),
+                chunk_size=data["chunk_size"], sha256=data["sha256"],
+            )
+        except ChunkError as e:
+            return {"message": str(e)}, e.status
+        return session.json(), 201
 
-            return {"message": "Invalid data."}
-        image_path = image_helper.save_image(
-            data["image"], folder=f"patient_{patient_id}"
-        )
-        basename = image_helper.get_basename(image_path)
-        return {"message": "image uploaded"}, 201
+
+class ChunkedUploadSession(Resource):
+    """
+    GET the session to find where to resume, PUT the next chunk as the raw request
+    body (?offset=<received>, X-Chunk-SHA256 header), DELETE to abandon it.
+    """
+
+    @jwt_required
+    def get(self, patient_id, upload_id):
+        if get_jwt_claims()["type"] == "patient":
+            return {"message": "Invalid authorization"}, 401
+        session = UploadSessionModel.find_by_id(upload_id, patient_id)
+        if not session:
+            return {"message": "upload not found"}, 404
+        return session.json(), 200
+
+    @jwt_required
+    def put(self, patient_id, upload_id):
+        if get_jwt_claims()["type"] == "patient":
+            return {"message": "Invalid authorization"}, 401
+        session = UploadSessionModel.find_by_id(upload_id, patient_id)
+        if not session:
+            return {"message": "upload not found"}, 404
+
+        offset = request.args.get("offset", type=int)
+        length = request.content_length
+        checksum = request.headers.get("X-Chunk-SHA256", "")
+        if offset is None or offset < 0 or length is None:
+            return {"message": "An offset and a Content-Length are required."}, 400
+        if not SHA256_HEX.fullmatch(checksum):
+            return {"message": "The X-Chunk-SHA256 header must hold the chunk's sha256."}, 400
+        try:
+            session.write_chunk(request.stream, offset, length, checksum, image_helper.get_images_folder())
+        except ChunkError as e:
+            return {"message": str(e), "received": session.received}, e.status
+        return session.json(), 200
+
+    @jwt_required
+    def delete(self, patient_id, upload_id):
+        if get_jwt_claims()["type"] == "patient":
+            return {"message": "Invalid authorization"}, 401
+        session = UploadSessionModel.find_by_id(upload_id, patient_id)
+        if not session:
+            return {"message": "upload not found"}, 404
+        session.discard(image_helper.get_images_folder())
+        return {"message": "upload cancelled"}, 200
+
+
+class CompleteChunkedUpload(Resource):
+    @jwt_required
+    def post(self, patient_id, upload_id):
+        if get_jwt_claims()["type"] == "patient":
+            return {"message": "Invalid authorization"}, 401
+        session = UploadSessionModel.find_by_id(upload_id, patient_id)
+        if not session:
+            return {"message": "upload not found"}, 404
+
+        images_folder = image_helper.get_images_folder()
+        filename, extension = session.filename, session.extension
+        try:
+            content_hash, size = session.finish(images_folder)
+        except ChunkError as e:
+            return {"message": str(e)}, e.status
+        return register_image(patient_id, filename, content_hash, extension, size, images_folder)
 
 
 class PatientImages(Resource):
@@ -39,16 +172,25 @@ class PatientImages(Resource):
             }, 401
         if not PatientModel.find_by_id(patient_id):
             return {"message": "A patient with this id does not exist"}
-        folder = os.getcwd()
-        dirs = os.listdir(f"{folder}/static/images/patient_{patient_id}")
-        file_list = []
-        for file in dirs:
-            file_list.append(
-                {
-                    "image": f"http://localhost:5000/static/images/patient_{patient_id}/{file}"
-                }
+        limit, after = page_args()
+        try:
+            images, next_cursor = PatientImageModel.find_page_by_patient_id(
+                patient_id, after=after, limit=limit
+            )
+        except ValueError:
+            return {"message": INVALID_CURSOR}, 400
+
+        # The page is fully described by its ids, content hashes and derivatives
+        fingerprint = hashlib.sha256()
+        for image in images:
+            fingerprint.update(
+                f"{image.id}:{image.filename}:{image.content_hash}:{image.thumbnail}:{image.preview};".encode("utf-8")
             )
-        return file_list
+        fingerprint.update((next_cursor or "").encode("utf-8"))
+        headers = {"ETag": f'"{fingerprint.hexdigest()}"', **page_headers(next_cursor)}
+        if fingerprint.hexdigest() in request.if_none_match:
+            return Response(status=304, headers=headers)
+        return [image.json() for image in images], 200, headers
 
 
 class DeleteImage(Resource):
@@ -59,14 +201,8 @@ class DeleteImage(Resource):
         if not PatientModel.find_by_id(patient_id):
             return {"message": "A patient with this id does not exist"}, 404
         filename = request.args.get("filename")
-        folder = os.getcwd()
-        dirs = os.listdir(f"{folder}/static/images/patient_{patient_id}")
-        for file in dirs:
-            if filename == file:
-                os.remove(
-                    image_helper.get_path(
-                        file, folder=f"{folder}/static/images/patient_{patient_id}"
-                    )
-                )
-                return {"message": "file deleted"}
-        return {"message": "file not found"}, 404
+        image = PatientImageModel.find_by_filename(patient_id, filename)
+        if not image:
+            return {"message": "file not found"}, 404
+        image.remove(image_helper.get_images_folder())
+        return {"message": "file deleted"}
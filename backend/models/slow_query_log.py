@@ -0,0 +1,193 @@
+"""
+Slow-query log - every statement slower than SLOW_QUERY_MS is written as one
+JSON line to a rotating file (SLOW_QUERY_LOG), with:
+
+  statement, fingerprint     the SQL as sent and with its literals collapsed
+  parameters                 the shape of the bound parameters (types, never values)
+  duration_ms                time until the cursor returned
+  endpoint, method, path     the Flask request it ran in, if any
+  caller                     the innermost file:line of this code base that ran it
+  plan                       SQLite's EXPLAIN QUERY PLAN for the statement
+
+Duration covers executing the statement up to its first row; rows fetched
+afterwards are not counted. Aggregate the log with slow_query_report.py.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models.query_profiler import fingerprint
+
+DEFAULT_THRESHOLD_MS = 100
+DEFAULT_LOG_PATH = os.path.join("logs", "slow_queries.jsonl")
+MAX_LOG_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+# Statements whose plan is worth asking for; DDL, PRAGMA and transaction control are not
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+_BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+logger = logging.getLogger("slow_queries")
+logger.propagate = False
+_threshold_ms = None
+
+
+def parameter_shape(parameters, executemany=False):
+    """Type names of the bound parameters ("3 x [int, str]" for executemany)"""
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} x {parameter_shape(rows[0]) if rows else '[]'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "[" + ", ".join(type(value).__name__ for value in parameters or ()) + "]"
+
+
+def _caller():
+    """file:line (function) of the innermost frame in this code base outside this module"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_BACKEND_ROOT) and filename != _THIS_FILE and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, _BACKEND_ROOT)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return None
+
+
+def query_plan(dbapi_connection, statement, parameters, executemany=False):
+    """SQLite's EXPLAIN QUERY PLAN lines for `statement`, indented by depth, or None"""
+    if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    if executemany:
+        parameters = next(iter(parameters or []), ())
+    cursor = dbapi_connection.cursor()
+    try:
+        rows = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+    except Exception as e:  # the plan is a nice-to-have; never fail the query for it
+        return [f"unavailable: {e}"]
+    finally:
+        cursor.close()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines or None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if _threshold_ms is not None:
+        context._slow_query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _log_if_slow(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms < _threshold_ms:
+        return
+
+    entry = {
+        "time": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S"),
+        "duration_ms": round(duration_ms, 2),
+        "fingerprint": fingerprint(statement),
+        "statement": statement,
+        "parameters": parameter_shape(parameters, executemany),
+        "endpoint": None,
+        "method": None,
+        "path": None,
+        "caller": _caller(),
+        "plan": None,
+    }
+    if has_request_context():
+        entry.update(endpoint=request.endpoint, method=request.method, path=request.path)
+    if conn.dialect.name == "sqlite":
+        entry["plan"] = query_plan(conn.connection, statement, parameters, executemany)
+    logger.warning(json.dumps(entry, default=str))
+
+
+def parse_threshold(value):
+    """SLOW_QUERY_MS as milliseconds, or None for "none", "off" or an empty string"""
+    if value is None or str(value).strip().lower() in ("", "none", "off"):
+        return None
+    return float(value)
+
+
+def init_slow_query_log(app):
+    """
+    Start logging statements slower than SLOW_QUERY_MS (default 100) to
+    SLOW_QUERY_LOG. Set SLOW_QUERY_MS to None (or "none"/"off") to turn the log off.
+    """
+    global _threshold_ms
+    threshold = parse_threshold(app.config.setdefault("SLOW_QUERY_MS", DEFAULT_THRESHOLD_MS))
+    path = app.config.setdefault("SLOW_QUERY_LOG", DEFAULT_LOG_PATH)
+    if threshold is None:
+        _threshold_ms = None
+        return
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=MAX_LOG_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8", delay=True
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    _threshold_ms = threshold
+
+
+def log_files(path):
+    """The log and its rotated backups, oldest first"""
+    backups = [f"{path}.{i}" for i in range(BACKUP_COUNT, 0, -1)]
+    return [name for name in backups + [path] if os.path.exists(name)]
+
+
+def read_entries(path, since=None):
+    """Entries of the log and its backups; `since` is an ISO timestamp prefix like "2024-05-01" """
+    for name in log_files(path):
+        with open(name, encoding="utf-8") as log_file:
+            for line in log_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash or rotation
+                if since is None or entry.get("time", "") >= since:
+                    yield entry
+
+
+def aggregate(entries):
+    """
+    One summary per fingerprint, slowest total first: count, total/p50/p95/max
+    duration, the endpoints and callers that ran it, and the plan of its slowest run.
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry["fingerprint"], {
+            "fingerprint": entry["fingerprint"], "durations": [], "endpoints": Counter(),
+            "callers": Counter(), "slowest": entry,
+        })
+        group["durations"].append(entry["duration_ms"])
+        group["endpoints"][entry.get("endpoint") or "-"] += 1
+        group["callers"][entry.get("caller") or "-"] += 1
+        if entry["duration_ms"] > group["slowest"]["duration_ms"]:
+            group["slowest"] = entry
+
+    summaries = []
+    for group in groups.values():
+        durations = sorted(group.pop("durations"))
+        summaries.append({
+            **group,
+            "count": len(durations),
+            "total_ms": round(sum(durations), 2),
+            "p50_ms": durations[len(durations) // 2],
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max_ms": durations[-1],
+        })
+    return sorted(summaries, key=lambda summary: summary["total_ms"], reverse=True)
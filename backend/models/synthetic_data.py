@@ -0,0 +1,375 @@
+"""
+Seeded synthetic clinic data for load tests and benchmarks
+
+generate() fills an empty database with doctors, patients, appointments and
+examinations at production-like volumes. Rows are built as plain tuples in
+worker processes, one chunk at a time, and written by this process with
+executemany in large transactions: SQLite has a single writer, so generating
+is the part worth spreading over cores. Every chunk draws from its own Random
+seeded with (seed, table, chunk number), so a seed gives the same database
+whatever the number of processes.
+
+The data follows the shapes that matter to the queries:
+
+  patients      INITIAL_PATIENTS of them are there on the first day, the rest sign up
+                ever faster (cumulative ~ t**2); ages centred on 55
+  doctors       a few busy doctors take a large share of the visits (Zipf-like)
+  appointments  daily volume grows with the patient base, dips on Friday and
+                Saturday and in summer, peaks in winter; booked 0-60 days ahead;
+                a quarter go to chronic patients (every 20th), a quarter to
+                patients who signed up in the last month; the last FUTURE_DAYS
+                days are upcoming bookings
+  examinations  recorded for EXAMINATION_RATIO of past appointments
+
+Names, emails, mobiles and usernames are functions of the row id, so workers
+fill the denormalised usernames of appointments without looking anything up.
+Writing bypasses the ORM, so the search indexes and the daily rollup are
+rebuilt afterwards (see generate_dataset.py).
+"""
+import os
+import random
+from bisect import bisect
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from itertools import accumulate
+
+PROCESSES = os.cpu_count() or 1
+FUTURE_DAYS = 60
+INITIAL_PATIENTS = 0.1
+EXAMINATION_RATIO = 0.85
+CHRONIC_EVERY = 20
+
+MALE_NAMES = [
+    "Ahmed", "Mohamed", "Mahmoud", "Omar", "Youssef", "Mostafa", "Karim", "Hassan", "Ali", "Tarek",
+    "Khaled", "Amr", "Hany", "Sherif", "Walid", "Ibrahim", "Adel", "Sameh", "Hossam", "Yasser",
+    "John", "Michael", "David", "James", "Peter", "George", "Mark", "Andrew", "Samir", "Nabil",
+]
+FEMALE_NAMES = [
+    "Fatma", "Mariam", "Nour", "Salma", "Aya", "Hana", "Yasmin", "Laila", "Sara", "Dina",
+    "Mona", "Rania", "Heba", "Noha", "Reem", "Amira", "Eman", "Ghada", "Nesma", "Shaimaa",
+    "Mary", "Jennifer", "Elizabeth", "Linda", "Susan", "Nadia", "Hoda", "Samia", "Layla", "Noor",
+]
+LAST_NAMES = [
+    "Hassan", "Ibrahim", "Mahmoud", "Abdelrahman", "Saleh", "Farouk", "Mansour", "Nasser", "Khalil", "Fahmy",
+    "Ali", "Ahmed", "Mohamed", "Mostafa", "Youssef", "Kamel", "Soliman", "Ismail", "Shawky", "Hamdy",
+    "Said", "Fathy", "Ramadan", "Gaber", "Attia", "Zaki", "Naguib", "Helmy", "Hegazy", "Omar",
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Wilson", "Anderson",
+]
+# (value, weight)
+CITIES = [
+    ("Cairo, Egypt", 40), ("Giza, Egypt", 15), ("Alexandria, Egypt", 15), ("Mansoura, Egypt", 6),
+    ("Tanta, Egypt", 5), ("Zagazig, Egypt", 5), ("Asyut, Egypt", 4), ("Ismailia, Egypt", 4),
+    ("Port Said, Egypt", 3), ("Luxor, Egypt", 3),
+]
+SPECIALIZATIONS = [
+    ("Cardiology", 50), ("Interventional Cardiology", 15), ("Pediatric Cardiology", 10),
+    ("Electrophysiology", 10), ("Heart Failure", 10), ("Cardiac Imaging", 5),
+]
+DESCRIPTIONS = [
+    ("Follow-up", 35), ("Chest pain", 12), ("Shortness of breath", 8), ("Palpitations", 8),
+    ("Blood pressure check", 12), ("ECG review", 8), ("Echocardiogram results", 6),
+    ("Medication review", 6), ("Pre-operative assessment", 3), ("First visit", 2),
+]
+FINDINGS = [
+    (("Essential hypertension", "Amlodipine 5mg once daily"), 20),
+    (("Essential hypertension, poorly controlled", "Amlodipine 10mg, Losartan 50mg once daily"), 8),
+    (("Stable angina", "Aspirin 81mg, Atorvastatin 40mg, Bisoprolol 5mg"), 12),
+    (("Atrial fibrillation", "Apixaban 5mg twice daily, Bisoprolol 2.5mg"), 8),
+    (("Heart failure with reduced ejection fraction", "Sacubitril/valsartan, Bisoprolol, Spironolactone 25mg"), 6),
+    (("Hyperlipidemia", "Rosuvastatin 20mg at night, low-fat diet"), 12),
+    (("Mitral valve prolapse, mild regurgitation", "No medication; echocardiogram in 12 months"), 4),
+    (("Supraventricular tachycardia", "Verapamil 40mg three times daily"), 3),
+    (("Post myocardial infarction follow-up", "Aspirin 81mg, Clopidogrel 75mg, Atorvastatin 80mg"), 5),
+    (("Palpitations, benign ectopic beats", "Reassurance; reduce caffeine"), 7),
+    (("Normal examination", "No treatment needed"), 15),
+]
+# Monday .. Sunday; Friday and Saturday are the weekend
+WEEKDAY_WEIGHTS = (1.0, 1.0, 1.0, 1.05, 0.35, 0.5, 1.05)
+# January .. December; more heart trouble in winter
+MONTH_WEIGHTS = (1.2, 1.15, 1.05, 1.0, 0.95, 0.85, 0.75, 0.75, 0.9, 1.0, 1.1, 1.2)
+
+DOCTOR_COLUMNS = (
+    "id", "username", "password", "first_name", "last_name", "email", "gender",
+    "address", "mobile", "birthdate", "created_at", "specialization",
+)
+PATIENT_COLUMNS = (
+    "id", "first_name", "last_name", "email", "mobile", "address", "gender",
+    "birthdate", "username", "password", "created_at",
+)
+APPOINTMENT_COLUMNS = (
+    "id", "date", "created_at", "description", "doctor_id", "patient_id",
+    "patient_username", "doctor_username",
+)
+EXAMINATION_COLUMNS = ("appointment_id", "diagnosis", "prescription")
+
+
+class DatasetPlan:
+    """What to generate; passed to every worker, so it holds only plain values"""
+
+    def __init__(self, seed, doctors, patients, appointments, years, end, doctor_password, patient_password):
+        self.seed = seed
+        self.doctors = doctors
+        self.patients = patients
+        self.appointments = appointments
+        self.end = end  # the last day in the past; later days are upcoming bookings
+        self.start = end - timedelta(days=int(years * 365.25))
+        self.span_days = (end - self.start).days + 1
+        self.doctor_password = doctor_password
+        self.patient_password = patient_password
+
+    def random(self, table, chunk):
+        return random.Random(f"{self.seed}:{table}:{chunk}")
+
+
+def _weighted(pairs):
+    """(values, cumulative weights) for _pick"""
+    values, weights = zip(*pairs)
+    return values, list(accumulate(weights))
+
+
+def _pick(rng, values, cumulative):
+    return values[bisect(cumulative, rng.random() * cumulative[-1])]
+
+
+_CITIES = _weighted(CITIES)
+_SPECIALIZATIONS = _weighted(SPECIALIZATIONS)
+_DESCRIPTIONS = _weighted(DESCRIPTIONS)
+_FINDINGS = _weighted(FINDINGS)
+
+
+def person(person_id, salt=0):
+    """(first name, last name, gender) of a person, spread evenly over the name lists"""
+    mixed = (person_id * 2654435761 + salt) & 0xFFFFFFFF
+    gender = mixed & 1
+    first_names = FEMALE_NAMES if gender else MALE_NAMES
+    return first_names[(mixed >> 1) % len(first_names)], LAST_NAMES[(mixed >> 7) % len(LAST_NAMES)], gender
+
+
+def doctor_username(doctor_id):
+    first_name, last_name, _ = person(doctor_id, salt=1)
+    return f"dr_{first_name}_{last_name}_{doctor_id}".lower()
+
+
+def patient_username(patient_id):
+    first_name, last_name, _ = person(patient_id)
+    return f"{first_name}.{last_name}{patient_id}".lower()
+
+
+def _mobile(person_id, salt=0):
+    mixed = (person_id * 40503 + salt * 7919) % 10 ** 8
+    return f"01{'0125'[person_id % 4]}{mixed:08d}"
+
+
+def _iso_days(plan, extra_days=0):
+    """ISO date strings (how SQLAlchemy stores Date in SQLite) by day offset from plan.start"""
+    return [(plan.start + timedelta(days=day)).isoformat() for day in range(plan.span_days + extra_days)]
+
+
+def registered_share(t):
+    """Share of all patients signed up by `t`, the fraction of the history elapsed"""
+    return INITIAL_PATIENTS + (1 - INITIAL_PATIENTS) * min(1.0, max(0.0, t)) ** 2
+
+
+def patient_signup_day(plan, patient_id):
+    """Day offset of a patient's sign-up, the inverse of registered_share"""
+    share = (patient_id - 0.5) / plan.patients
+    if share <= INITIAL_PATIENTS:
+        return 0
+    return min(plan.span_days - 1, int(plan.span_days * ((share - INITIAL_PATIENTS) / (1 - INITIAL_PATIENTS)) ** 0.5))
+
+
+def patients_by_day(plan, day):
+    """How many patients had signed up by the end of `day`"""
+    return max(1, min(plan.patients, int(plan.patients * registered_share((day + 1) / plan.span_days))))
+
+
+def doctor_rows(plan, chunk, first_id, last_id):
+    rng = plan.random("doctors", chunk)
+    rows = []
+    for doctor_id in range(first_id, last_id + 1):
+        first_name, last_name, gender = person(doctor_id, salt=1)
+        birthdate = date(1950, 1, 1) + timedelta(days=rng.randrange(45 * 365))
+        # Most of the staff were there before the data starts; some joined later
+        joined = plan.start - timedelta(days=rng.randrange(10 * 365))
+        if rng.random() < 0.2:
+            joined = plan.start + timedelta(days=rng.randrange(plan.span_days))
+        rows.append((
+            doctor_id, doctor_username(doctor_id), plan.doctor_password, first_name, last_name,
+            f"{doctor_username(doctor_id)}@hospital.test", gender, _pick(rng, *_CITIES),
+            _mobile(doctor_id, salt=1), birthdate.isoformat(), joined.isoformat(), _pick(rng, *_SPECIALIZATIONS),
+        ))
+    return rows
+
+
+def patient_rows(plan, chunk, first_id, last_id):
+    rng = plan.random("patients", chunk)
+    days = _iso_days(plan)
+    rows = []
+    for patient_id in range(first_id, last_id + 1):
+        first_name, last_name, gender = person(patient_id)
+        signed_up = patient_signup_day(plan, patient_id)
+        age = min(95, max(1, rng.gauss(55, 16)))
+        birthdate = plan.start + timedelta(days=signed_up) - timedelta(days=int(age * 365.25))
+        rows.append((
+            patient_id, first_name, last_name, f"{first_name}.{last_name}{patient_id}@example.test".lower(),
+            _mobile(patient_id), _pick(rng, *_CITIES), gender, birthdate.isoformat(),
+            patient_username(patient_id), plan.patient_password, days[signed_up],
+        ))
+    return rows
+
+
+def doctor_weights(plan):
+    """Cumulative visit weights of doctors 1..n: doctor 1 is the busiest"""
+    return list(accumulate(1 / rank ** 0.6 for rank in range(1, plan.doctors + 1)))
+
+
+def appointment_days(plan):
+    """Appointments to book on each day offset, past days first, then FUTURE_DAYS upcoming ones"""
+    weights = []
+    for day in range(plan.span_days + FUTURE_DAYS):
+        when = plan.start + timedelta(days=day)
+        # Volume follows the patient base, and upcoming days are not fully booked yet
+        growth = registered_share(day / plan.span_days)
+        booked = 1.0 if day < plan.span_days else 1 - (day - plan.span_days) / FUTURE_DAYS
+        weights.append(growth * booked * WEEKDAY_WEIGHTS[when.weekday()] * MONTH_WEIGHTS[when.month - 1])
+    total = sum(weights)
+    counts, previous, running = [], 0, 0.0
+    for weight in weights:
+        running += weight
+        cumulative = round(plan.appointments * running / total)
+        counts.append(cumulative - previous)
+        previous = cumulative
+    return counts
+
+
+def appointment_chunks(plan, chunk_size):
+    """(chunk, first id, first day, [count per day]) covering appointment_days in order"""
+    chunks, days, first_id, first_day, size = [], [], 1, 0, 0
+    for day, count in enumerate(appointment_days(plan)):
+        days.append(count)
+        size += count
+        if size >= chunk_size:
+            chunks.append((len(chunks), first_id, first_day, days))
+            first_id, first_day, days, size = first_id + size, day + 1, [], 0
+    if size:
+        chunks.append((len(chunks), first_id, first_day, days))
+    return chunks
+
+
+def appointment_rows(plan, chunk, first_id, first_day, day_counts, doctor_cumulative):
+    """(appointment rows, examination rows) of consecutive days, ids in booking-date order"""
+    rng = plan.random("appointments", chunk)
+    days = _iso_days(plan, FUTURE_DAYS)
+    doctor_ids = range(1, plan.doctors + 1)
+    doctor_names = {}
+    appointments, examinations = [], []
+    appointment_id = first_id
+    for day, count in enumerate(day_counts, first_day):
+        registered = patients_by_day(plan, day)
+        recent = registered - patients_by_day(plan, day - 30)
+        past = day < plan.span_days
+        for _ in range(count):
+            roll = rng.random()
+            if roll < 0.25 and registered >= CHRONIC_EVERY:
+                patient_id = CHRONIC_EVERY * rng.randrange(1, registered // CHRONIC_EVERY + 1)
+            elif roll < 0.5 and recent > 0:
+                patient_id = registered - rng.randrange(recent)
+            else:
+                patient_id = rng.randrange(1, registered + 1)
+            doctor_id = _pick(rng, doctor_ids, doctor_cumulative)
+            if doctor_id not in doctor_names:
+                doctor_names[doctor_id] = doctor_username(doctor_id)
+            lead = min(int(rng.expovariate(1 / 7)), FUTURE_DAYS)
+            booked = min(max(day - lead, patient_signup_day(plan, patient_id)), plan.span_days - 1)
+            appointments.append((
+                appointment_id, days[day], days[booked], _pick(rng, *_DESCRIPTIONS), doctor_id,
+                patient_id, patient_username(patient_id), doctor_names[doctor_id],
+            ))
+            if past and rng.random() < EXAMINATION_RATIO:
+                diagnosis, prescription = _pick(rng, *_FINDINGS)
+                examinations.append((appointment_id, diagnosis, prescription))
+            appointment_id += 1
+    return appointments, examinations
+
+
+def _id_chunks(total, chunk_size):
+    return [
+        (chunk, first_id, min(total, first_id + chunk_size - 1))
+        for chunk, first_id in enumerate(range(1, total + 1, chunk_size))
+    ]
+
+
+def _in_order(pool, function, tasks, ahead):
+    """Results of function(*task) in task order, with at most `ahead` chunks in flight"""
+    if pool is None:
+        for task in tasks:
+            yield function(*task)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(function, *task))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _insert_statement(table, columns):
+    return f'INSERT INTO "{table.name}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+
+
+def generate(engine, plan, tables, processes=PROCESSES, chunk_size=100000, progress=None):
+    """
+    Write the dataset into the empty `tables` ({"doctors": Table, "patients": ...,
+    "appointments": ..., "examinations": ...}) of a SQLite `engine`. Secondary
+    indexes are dropped while loading and built once at the end, which is much
+    faster than keeping them up to date row by row. progress(table, rows so far)
+    is called after every chunk. Returns {table: rows written}.
+    """
+    indexes = [index for table in tables.values() for index in table.indexes]
+    for index in indexes:
+        index.drop(engine)
+
+    connection = engine.raw_connection()
+    cursor = connection.cursor()
+    # A generated database can be regenerated: trade crash safety for speed
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("PRAGMA journal_mode = MEMORY")
+    cursor.execute("PRAGMA cache_size = -262144")
+
+    counts = {name: 0 for name in tables}
+
+    def write(name, columns, rows):
+        cursor.executemany(_insert_statement(tables[name], columns), rows)
+        counts[name] += len(rows)
+
+    pool = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+    ahead = 2 * processes
+    try:
+        for rows in _in_order(pool, doctor_rows, [(plan, 0, 1, plan.doctors)], ahead):
+            write("doctors", DOCTOR_COLUMNS, rows)
+        connection.commit()
+
+        for rows in _in_order(pool, patient_rows, [(plan, *chunk) for chunk in _id_chunks(plan.patients, chunk_size)], ahead):
+            write("patients", PATIENT_COLUMNS, rows)
+            connection.commit()
+            if progress:
+                progress("patients", counts["patients"])
+
+        doctor_cumulative = doctor_weights(plan)
+        tasks = [(plan, *chunk, doctor_cumulative) for chunk in appointment_chunks(plan, chunk_size)]
+        for appointments, examinations in _in_order(pool, appointment_rows, tasks, ahead):
+            write("appointments", APPOINTMENT_COLUMNS, appointments)
+            write("examinations", EXAMINATION_COLUMNS, examinations)
+            connection.commit()
+            if progress:
+                progress("appointments", counts["appointments"])
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        connection.close()
+
+    for index in indexes:
+        index.create(engine)
+    return counts
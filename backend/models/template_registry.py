@@ -0,0 +1,53 @@
+"""
+Template registry - Jinja templates loaded from backend/templates once per process
+
+Templates are compiled on first use and kept for the life of the process
+(no mtime checks), HTML is auto-escaped, and render_many renders a batch of
+contexts against one compiled template.
+"""
+import os
+import threading
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+
+class TemplateRegistry:
+    def __init__(self, folder=TEMPLATE_FOLDER):
+        self.environment = Environment(
+            loader=FileSystemLoader(folder),
+            autoescape=select_autoescape(["html", "xml"]),
+            undefined=StrictUndefined,
+            auto_reload=False,
+            cache_size=-1,
+        )
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Compiled template `name` (relative to the template folder), cached after the first load"""
+        template = self._compiled.get(name)
+        if template is None:
+            with self._lock:
+                template = self._compiled.get(name)
+                if template is None:
+                    template = self.environment.get_template(name)
+                    self._compiled[name] = template
+        return template
+
+    def render(self, name, **context):
+        return self.get(name).render(**context)
+
+    def render_many(self, name, contexts):
+        """Render every context dict in `contexts` with template `name`; returns a list of strings"""
+        template = self.get(name)
+        return [template.render(**context) for context in contexts]
+
+    def preload(self):
+        """Compile every template up front (e.g. before forking a process pool)"""
+        for name in self.environment.list_templates(extensions=["html", "txt"]):
+            self.get(name)
+        return sorted(self._compiled)
+
+
+templates = TemplateRegistry()
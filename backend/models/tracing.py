@@ -0,0 +1,268 @@
+"""
+In-process request tracing
+
+A trace is a tree of timed spans: a root span per request (or job), and child
+spans for SQL statements, email sends, export writing and image file I/O. When
+the root finishes, the trace is written as one JSON line to TRACE_LOG if it was
+sampled and took at least TRACE_SLOW_MS, so the log holds the slow requests
+worth looking at. trace_to_chrome.py turns traces into Chrome trace files for
+chrome://tracing, Perfetto or speedscope - no collector needed.
+
+    with tracing.span("export.write", patient_id=patient_id):
+        ...
+
+    @tracing.traced("blob_store.store_file")
+    def store_file(...): ...
+
+Spans follow the current context, so work handed to other threads is only
+covered by the span that waits for it.
+"""
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_LOG_PATH = os.path.join("logs", "traces.jsonl")
+DEFAULT_SAMPLE_RATE = 1.0
+DEFAULT_SLOW_MS = 250
+MAX_SPANS = 5000
+MAX_LOG_BYTES = 50 * 1024 * 1024
+BACKUP_COUNT = 5
+
+logger = logging.getLogger("traces")
+logger.propagate = False
+_current = contextvars.ContextVar("current_span", default=None)
+_sample_rate = 0.0
+_slow_ms = DEFAULT_SLOW_MS
+
+
+class Trace:
+    """The spans of one request or job; written out when its root span ends"""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = datetime.utcnow()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def start_span(self, name, parent, attributes):
+        span = Span(self, name, parent.id if parent else None, attributes)
+        with self.lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+        return span
+
+    def json(self):
+        root = self.spans[0]
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "time": self.started_at.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration_ms": round(root.duration_ms(), 3),
+            "attributes": root.attributes,
+            "dropped_spans": self.dropped,
+            "spans": [span.json() for span in self.spans],
+        }
+
+
+class Span:
+    __slots__ = ("trace", "id", "parent_id", "name", "attributes", "thread", "start", "end")
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def json(self):
+        return {
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_us": round((self.start - self.trace.origin) * 1e6),
+            "duration_us": round(self.duration_ms() * 1000),
+            "thread": self.thread,
+            "attributes": self.attributes,
+        }
+
+
+def current_span():
+    return _current.get()
+
+
+def start_trace(name, **attributes):
+    """Open the root span of a new trace (None if not sampled); end it with end_trace"""
+    if _current.get() is not None or random.random() >= _sample_rate:
+        return None, None
+    trace = Trace(name)
+    root = trace.start_span(name, None, attributes)
+    return root, _current.set(root)
+
+
+def end_trace(root, token):
+    """Close a root span from start_trace and write its trace if it was slow enough"""
+    if root is None:
+        return
+    _current.reset(token)
+    root.finish()
+    if root.duration_ms() >= _slow_ms and logger.handlers:
+        logger.info(json.dumps(root.trace.json(), default=str))
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Run the block as the root of a new trace, or as a child span inside one"""
+    if _current.get() is not None:
+        with span(name, **attributes) as child:
+            yield child
+        return
+    root, token = start_trace(name, **attributes)
+    try:
+        yield root
+    finally:
+        end_trace(root, token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as a child of the current span; does nothing outside a trace"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.trace.start_span(name, parent, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    finally:
+        _current.reset(token)
+        child.finish()
+
+
+def traced(name):
+    """Decorator form of span()"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_sql_span(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is not None:
+        context._trace_span = parent.trace.start_span("sql", parent, {"statement": statement[:300]})
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_sql_span(conn, cursor, statement, parameters, context, executemany):
+    sql_span = getattr(context, "_trace_span", None)
+    if sql_span is not None:
+        sql_span.finish()
+
+
+def init_tracing(app):
+    """
+    Trace TRACE_SAMPLE_RATE of requests (default 1.0, 0 turns tracing off) and
+    write those that took TRACE_SLOW_MS (default 250) or more to TRACE_LOG.
+    """
+    global _sample_rate, _slow_ms
+    _sample_rate = float(app.config.setdefault("TRACE_SAMPLE_RATE", DEFAULT_SAMPLE_RATE))
+    _slow_ms = float(app.config.setdefault("TRACE_SLOW_MS", DEFAULT_SLOW_MS))
+    path = app.config.setdefault("TRACE_LOG", DEFAULT_LOG_PATH)
+    if _sample_rate > 0 and not logger.handlers:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=MAX_LOG_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8", delay=True
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+    @app.before_request
+    def _start_request_trace():
+        g.trace_root, g.trace_token = start_trace(f"{request.method} {request.path}", method=request.method)
+
+    @app.after_request
+    def _tag_request_trace(response):
+        root = g.get("trace_root")
+        if root is not None:
+            root.set(endpoint=request.endpoint, status=response.status_code)
+        return response
+
+    @app.teardown_request
+    def _end_request_trace(exception=None):
+        root = g.pop("trace_root", None)
+        if root is not None:
+            if exception is not None:
+                root.set(error=str(exception) or exception.__class__.__name__)
+            end_trace(root, g.pop("trace_token"))
+
+
+def read_traces(path, since=None):
+    """Traces of the log and its rotated backups, oldest first"""
+    backups = [f"{path}.{i}" for i in range(BACKUP_COUNT, 0, -1)]
+    for name in [name for name in backups + [path] if os.path.exists(name)]:
+        with open(name, encoding="utf-8") as log_file:
+            for line in log_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash or rotation
+                if since is None or entry.get("time", "") >= since:
+                    yield entry
+
+
+def to_chrome(traces):
+    """
+    Chrome trace event JSON for `traces`: each trace is one "process" starting at
+    0, so several slow requests can be compared side by side in the viewer.
+    """
+    events = []
+    for pid, entry in enumerate(traces, 1):
+        label = f"{entry['name']} ({entry['duration_ms']:.0f} ms) {entry['trace_id']}"
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": label}})
+        for span_entry in entry["spans"]:
+            events.append({
+                "name": span_entry["name"],
+                "cat": span_entry["name"].split(".")[0] if span_entry["parent_id"] else "trace",
+                "ph": "X",
+                "ts": span_entry["start_us"],
+                "dur": span_entry["duration_us"],
+                "pid": pid,
+                "tid": span_entry["thread"],
+                "args": span_entry["attributes"],
+            })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
@@ -2,8 +2,12 @@
 TreatmentExport Model - Tracks patient export history and status
 """
 from models.db import db
+from models.pagination import paginate, DEFAULT_PAGE_SIZE
+from models.export_artifact import ExportArtifactModel
+from models.export_gc import remove_files
 from datetime import datetime, timedelta
 from enum import Enum
+from sqlalchemy import or_
 
 
 class ExportStatus(Enum):
@@ -15,6 +19,23 @@ class ExportStatus(Enum):
 
 class TreatmentExportModel(db.Model):
     __tablename__ = "TreatmentExports"
+    __table_args__ = (
+        db.Index("ix_TreatmentExports_status_created_at", "status", "created_at"),
+        db.Index("ix_TreatmentExports_patient_id_created_at", "patient_id", "created_at"),
+        db.Index("ix_TreatmentExports_expires_at", "expires_at"),
+        db.Index("ix_TreatmentExports_status_available_at", "status", "available_at"),
+    )
+
+    # Queue settings: a claimed export is leased to one worker for LEASE_SECONDS,
+    # failed attempts are retried with exponential backoff up to MAX_ATTEMPTS.
+    # Before writing, the lease is extended by LEASE_SECONDS_PER_1000_ROWS for every
+    # thousand examinations, so recover_stale does not hand a long export to a second worker
+    LEASE_SECONDS = 300
+    LEASE_SECONDS_PER_1000_ROWS = 10
+    MAX_ATTEMPTS = 5
+    RETRY_BASE_SECONDS = 30
+    RETRY_MAX_SECONDS = 3600
+    CLEANUP_BATCH_SIZE = 1000
 
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey("Patients.id", ondelete="CASCADE"))
@@ -25,6 +46,11 @@ class TreatmentExportModel(db.Model):
     completed_at = db.Column(db.DateTime, nullable=True)
     expires_at = db.Column(db.DateTime)  # Link expires after 7 days
     error_message = db.Column(db.String(500), nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    available_at = db.Column(db.DateTime, nullable=True)  # not claimable before this (retry backoff)
+    locked_by = db.Column(db.String(120), nullable=True)  # worker holding the lease
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    artifact_id = db.Column(db.Integer, db.ForeignKey("ExportArtifacts.id"), nullable=True, index=True)
 
     patient = db.relationship("PatientModel")
 
@@ -32,7 +58,9 @@ class TreatmentExportModel(db.Model):
         self.patient_id = patient_id
         self.export_type = export_type
         self.status = "pending"
+        self.attempts = 0
         self.created_at = datetime.utcnow()
+        self.available_at = self.created_at
         self.expires_at = datetime.utcnow() + timedelta(days=7)
 
     def json(self):
@@ -45,28 +73,14 @@ class TreatmentExportModel(db.Model):
             "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None,
             "completed_at": self.completed_at.strftime("%Y-%m-%d %H:%M:%S") if self.completed_at else None,
             "expires_at": self.expires_at.strftime("%Y-%m-%d %H:%M:%S") if self.expires_at else None,
-            "is_expired": datetime.utcnow() > self.expires_at,
+            "is_expired": self.is_expired,
             "error_message": self.error_message,
+            "attempts": self.attempts,
         }
 
-    def mark_processing(self):
-        """Mark export as currently processing"""
-        self.status = "processing"
-        db.session.commit()
-
-    def mark_completed(self, file_path):
-        """Mark export as completed and store file path"""
-        self.status = "completed"
-        self.file_path = file_path
-        self.completed_at = datetime.utcnow()
-        db.session.commit()
-
-    def mark_failed(self, error_message):
-        """Mark export as failed with error message"""
-        self.status = "failed"
-        self.error_message = error_message
-        self.completed_at = datetime.utcnow()
-        db.session.commit()
+    @property
+    def is_expired(self):
+        return datetime.utcnow() > self.expires_at
 
     def save_to_db(self):
         db.session.add(self)
@@ -86,14 +100,196 @@ class TreatmentExportModel(db.Model):
         return cls.query.filter_by(patient_id=patient_id).order_by(cls.created_at.desc()).all()
 
     @classmethod
-    def find_pending(cls):
-        """Get all pending exports"""
-        return cls.query.filter_by(status="pending").all()
+    def find_page_by_patient_id(cls, patient_id, after=None, limit=DEFAULT_PAGE_SIZE):
+        """Newest-first page of a patient's exports. Returns (exports, next_cursor)"""
+        query = cls.query.filter_by(patient_id=patient_id)
+        return paginate(query, [cls.created_at, cls.id], after, limit, descending=True)
+
+    @classmethod
+    def count_by_patient_id(cls, patient_id):
+        return cls.query.filter_by(patient_id=patient_id).count()
+
+    @classmethod
+    def claim_next(cls, worker_id, lease_seconds=LEASE_SECONDS):
+        """
+        Atomically take the oldest claimable pending export and lease it to `worker_id`.
+        The status check in the UPDATE makes this a compare-and-set, so two workers
+        can never both win the same row. Returns the claimed export or None.
+        """
+        for _ in range(5):
+            now = datetime.utcnow()
+            candidate = (
+                db.session.query(cls.id)
+                .filter(
+                    cls.status == "pending",
+                    or_(cls.available_at.is_(None), cls.available_at <= now),
+                )
+                .order_by(cls.available_at, cls.id)
+                .first()
+            )
+            if candidate is None:
+                db.session.commit()
+                return None
+
+            claimed = (
+                cls.query.filter(cls.id == candidate.id, cls.status == "pending")
+                .update(
+                    {
+                        "status": "processing",
+                        "locked_by": worker_id,
+                        "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                        "attempts": cls.attempts + 1,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db.session.commit()
+            if claimed:
+                return cls.find_by_id(candidate.id)
+            # Another worker won this row; try the next one
+        return None
+
+    def _update_if_leased(self, worker_id, values):
+        """
+        Apply `values` only while `worker_id` still holds the lease.
+        Commits together with anything else pending in the session (e.g. queued
+        email); if the lease was lost, all of it is rolled back instead.
+        """
+        updated = (
+            TreatmentExportModel.query.filter(
+                TreatmentExportModel.id == self.id,
+                TreatmentExportModel.status == "processing",
+                TreatmentExportModel.locked_by == worker_id,
+            )
+            .update(values, synchronize_session=False)
+        )
+        if updated != 1:
+            db.session.rollback()
+            return False
+        db.session.commit()
+        return True
+
+    def extend_lease(self, worker_id, rows):
+        """Lease the export for long enough to write `rows` examinations. Returns False if the lease was lost"""
+        seconds = self.LEASE_SECONDS + self.LEASE_SECONDS_PER_1000_ROWS * rows // 1000
+        return self._update_if_leased(worker_id, {
+            "lease_expires_at": datetime.utcnow() + timedelta(seconds=seconds),
+        })
+
+    def complete(self, worker_id, file_path, artifact_id=None):
+        """Mark a leased export as completed. Returns False if the lease was lost"""
+        return self._update_if_leased(worker_id, {
+            "status": "completed",
+            "file_path": file_path,
+            "artifact_id": artifact_id,
+            "completed_at": datetime.utcnow(),
+            "error_message": None,
+            "locked_by": None,
+            "lease_expires_at": None,
+        })
+
+    def fail_attempt(self, worker_id, error_message):
+        """
+        Record a failed attempt: schedule a retry with exponential backoff,
+        or mark the export failed once MAX_ATTEMPTS is reached.
+        """
+        if self.attempts >= self.MAX_ATTEMPTS:
+            values = {"status": "failed", "completed_at": datetime.utcnow()}
+        else:
+            delay = min(self.RETRY_BASE_SECONDS * 2 ** (self.attempts - 1), self.RETRY_MAX_SECONDS)
+            values = {"status": "pending", "available_at": datetime.utcnow() + timedelta(seconds=delay)}
+        values.update({
+            "error_message": error_message[:500],
+            "locked_by": None,
+            "lease_expires_at": None,
+        })
+        return self._update_if_leased(worker_id, values)
+
+    @classmethod
+    def recover_stale(cls):
+        """
+        Return exports stuck in `processing` (worker died, lease expired) to the queue,
+        or fail them if they already used all attempts. Returns (requeued, failed).
+        """
+        now = datetime.utcnow()
+        stale = cls.query.filter(
+            cls.status == "processing",
+            or_(cls.lease_expires_at.is_(None), cls.lease_expires_at < now),
+        )
+        failed = stale.filter(cls.attempts >= cls.MAX_ATTEMPTS).update(
+            {
+                "status": "failed",
+                "completed_at": now,
+                "error_message": "Lease expired after the last attempt",
+                "locked_by": None,
+                "lease_expires_at": None,
+            },
+            synchronize_session=False,
+        )
+        requeued = stale.filter(cls.attempts < cls.MAX_ATTEMPTS).update(
+            {"status": "pending", "available_at": now, "locked_by": None, "lease_expires_at": None},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        return requeued, failed
 
     @classmethod
-    def cleanup_expired(cls):
-        """Delete expired exports older than 7 days"""
-        expired_exports = cls.query.filter(cls.expires_at < datetime.utcnow()).all()
-        for export in expired_exports:
-            export.delete_from_db()
-        return len(expired_exports)
+    def queue_depth(cls):
+        """Number of exports waiting to be claimed"""
+        return cls.query.filter_by(status="pending").count()
+
+    @classmethod
+    def referenced_file_paths(cls):
+        return [
+            row.file_path
+            for row in db.session.query(cls.file_path).filter(cls.file_path.isnot(None)).distinct()
+        ]
+
+    @classmethod
+    def cleanup_expired(cls, batch_size=CLEANUP_BATCH_SIZE):
+        """
+        Delete expired exports in batches of `batch_size`, one transaction per batch.
+        Each export drops its reference on its artifact; files are removed from disk
+        only once no export points to them any more.
+        Returns (exports_deleted, files_deleted, bytes_reclaimed).
+        """
+        deleted = files_deleted = reclaimed = 0
+        while True:
+            now = datetime.utcnow()
+            batch = (
+                db.session.query(cls.id, cls.artifact_id, cls.file_path)
+                .filter(cls.expires_at < now)
+                .order_by(cls.expires_at)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+
+            ids = [row.id for row in batch]
+            references = {}
+            legacy_paths = set()
+            for row in batch:
+                if row.artifact_id is not None:
+                    references[row.artifact_id] = references.get(row.artifact_id, 0) + 1
+                elif row.file_path:
+                    legacy_paths.add(row.file_path)
+
+            cls.query.filter(cls.id.in_(ids)).delete(synchronize_session=False)
+            unreferenced = ExportArtifactModel.release_many(references) if references else []
+            if legacy_paths:
+                # Exports from before artifacts existed own their file unless another row still uses it
+                still_used = {
+                    row.file_path
+                    for row in db.session.query(cls.file_path).filter(cls.file_path.in_(legacy_paths))
+                }
+                unreferenced.extend(legacy_paths - still_used)
+            db.session.commit()
+
+            batch_files, batch_bytes = remove_files(unreferenced)
+            deleted += len(ids)
+            files_deleted += batch_files
+            reclaimed += batch_bytes
+            if len(batch) < batch_size:
+                break
+        return deleted, files_deleted, reclaimed
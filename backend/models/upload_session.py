@@ -0,0 +1,187 @@
+"""
+UploadSession Model - Resumable chunked image uploads
+
+A client starts a session with the file's name and size, then PUTs the bytes
+in order, one chunk per request, each with its sha256. Chunks are streamed
+straight into a part file under blobs/tmp, so memory stays flat and no request
+comes near the global request size limit. After a dropped connection the client
+asks for the session and resumes from `received`. Completing the session moves
+the part file into the blob store.
+"""
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+from models.db import db
+from models import blob_store
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class ChunkError(ValueError):
+    """A chunk was rejected; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadSessionModel(db.Model):
+    __tablename__ = "UploadSessions"
+    __table_args__ = (
+        db.Index("ix_UploadSessions_updated_at", "updated_at"),
+    )
+
+    # Chunks must fit under the 10 MB request cap set by patch_request_class
+    DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+    MAX_CHUNK_SIZE = 8 * 1024 * 1024
+    MAX_TOTAL_SIZE = 2 * 1024 * 1024 * 1024
+    EXPIRE_SECONDS = 24 * 3600
+
+    id = db.Column(db.String(32), primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey("Patients.id", ondelete="CASCADE"), index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    extension = db.Column(db.String(10), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    sha256 = db.Column(db.String(64), nullable=True)  # expected digest of the whole file, if given
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, patient_id, filename, extension, total_size, chunk_size, sha256=None):
+        self.id = uuid.uuid4().hex
+        self.patient_id = patient_id
+        self.filename = filename
+        self.extension = extension
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+        self.received = 0
+        self.sha256 = sha256
+        self.created_at = self.updated_at = datetime.utcnow()
+
+    def json(self):
+        return {
+            "upload_id": self.id,
+            "patient_id": self.patient_id,
+            "filename": self.filename,
+            "size": self.total_size,
+            "chunk_size": self.chunk_size,
+            "received": self.received,
+            "complete": self.received >= self.total_size,
+            "expires_at": (self.updated_at + timedelta(seconds=self.EXPIRE_SECONDS)).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def part_path(self, images_folder):
+        return os.path.join(blob_store.temp_folder(images_folder), f"upload_{self.id}.part")
+
+    def delete_from_db(self):
+        db.session.delete(self)
+        db.session.commit()
+
+    @classmethod
+    def find_by_id(cls, upload_id, patient_id=None):
+        query = cls.query.filter_by(id=upload_id)
+        if patient_id is not None:
+            query = query.filter_by(patient_id=patient_id)
+        return query.first()
+
+    @classmethod
+    def start(cls, patient_id, filename, extension, total_size, images_folder, chunk_size=None, sha256=None):
+        """Create a session and its empty part file. Raises ChunkError on bad sizes"""
+        chunk_size = chunk_size or cls.DEFAULT_CHUNK_SIZE
+        if not 0 < total_size <= cls.MAX_TOTAL_SIZE:
+            raise ChunkError(f"File size must be between 1 byte and {cls.MAX_TOTAL_SIZE} bytes.")
+        if not 0 < chunk_size <= cls.MAX_CHUNK_SIZE:
+            raise ChunkError(f"Chunk size must be between 1 byte and {cls.MAX_CHUNK_SIZE} bytes.")
+        session = cls(patient_id, filename, extension, total_size, chunk_size, sha256)
+        open(session.part_path(images_folder), "wb").close()
+        db.session.add(session)
+        db.session.commit()
+        return session
+
+    def write_chunk(self, stream, offset, length, checksum, images_folder):
+        """
+        Stream one chunk of `length` bytes from `stream` into the part file at `offset`
+        and advance `received`. The chunk only counts if all of it arrived and its
+        sha256 matches `checksum`. Re-sending a chunk that was already stored is a no-op.
+        Returns the new `received`; raises ChunkError when the chunk is rejected.
+        """
+        if offset + length <= self.received and length > 0:
+            return self.received
+        if offset != self.received:
+            raise ChunkError(f"Expected a chunk at offset {self.received}.", 409)
+        if not 0 < length <= self.chunk_size or offset + length > self.total_size:
+            raise ChunkError(f"Chunks must be 1 to {self.chunk_size} bytes and stay within the file size.")
+
+        digest = hashlib.sha256()
+        written = 0
+        with open(self.part_path(images_folder), "r+b") as part:
+            part.seek(offset)
+            while written < length:
+                block = stream.read(min(STREAM_BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                digest.update(block)
+                part.write(block)
+                written += len(block)
+        if written != length:
+            raise ChunkError(f"Received {written} of {length} bytes; resend the chunk.")
+        if digest.hexdigest() != checksum.lower():
+            raise ChunkError("Chunk checksum mismatch; resend the chunk.")
+
+        # Compare-and-set so two concurrent retries of one chunk advance it once
+        table = self.__table__
+        result = db.session.execute(
+            table.update()
+            .where(table.c.id == self.id)
+            .where(table.c.received == offset)
+            .values(received=offset + length, updated_at=datetime.utcnow())
+        )
+        db.session.commit()
+        db.session.refresh(self)
+        if result.rowcount == 0 and self.received < offset + length:
+            raise ChunkError(f"Expected a chunk at offset {self.received}.", 409)
+        return self.received
+
+    def finish(self, images_folder):
+        """
+        Move the assembled file into the blob store and end the session.
+        Returns (content_hash, size); raises ChunkError if bytes are missing or the
+        whole-file sha256 given at the start does not match (the session is dropped).
+        """
+        if self.received < self.total_size:
+            raise ChunkError(f"Upload incomplete: {self.received} of {self.total_size} bytes received.", 409)
+        path = self.part_path(images_folder)
+        content_hash, size = blob_store.file_hash(path)
+        if self.sha256 and content_hash != self.sha256.lower():
+            self.discard(images_folder)
+            raise ChunkError("File checksum mismatch; start the upload again.")
+        blob_store.adopt_file(path, self.extension, images_folder, content_hash)
+        self.delete_from_db()
+        return content_hash, size
+
+    def discard(self, images_folder):
+        """Delete the session and its part file"""
+        path = self.part_path(images_folder)
+        self.delete_from_db()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def expire_stale(cls, images_folder, max_age_seconds=None):
+        """Drop sessions not touched for EXPIRE_SECONDS, with their part files. Returns the number removed"""
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds or cls.EXPIRE_SECONDS)
+        stale = cls.query.filter(cls.updated_at < cutoff).all()
+        paths = [session.part_path(images_folder) for session in stale]
+        for session in stale:
+            db.session.delete(session)
+        db.session.commit()
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return len(stale)
@@ -0,0 +1,30 @@
+"""
+Rebuild the examination full-text search index from the Examinations table.
+Run after bulk imports or deletes that bypass the ORM.
+"""
+from flask import Flask
+from models.db import db
+from models.patient import PatientModel
+from models.examination import ExaminationModel
+from models.examination_search import rebuild
+
+# Create a simple Flask app for context
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///data.db"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Initialize db with the app
+db.init_app(app)
+
+# Create app context
+with app.app_context():
+    db.create_all()
+
+    print("=" * 60)
+    print("REBUILDING EXAMINATION SEARCH INDEX")
+    print("=" * 60)
+
+    count = rebuild()
+
+    print(f"✓ Indexed {count} examination(s)")
+    print("=" * 60)
@@ -0,0 +1,29 @@
+"""
+Rebuild the patient lookup index from the Patients and Appointments tables.
+Run after bulk imports or deletes that bypass the ORM.
+"""
+from flask import Flask
+from models.db import db
+from models.patient import PatientModel
+from models.patient_search import rebuild
+
+# Create a simple Flask app for context
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///data.db"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Initialize db with the app
+db.init_app(app)
+
+# Create app context
+with app.app_context():
+    db.create_all()
+
+    print("=" * 60)
+    print("REBUILDING PATIENT SEARCH INDEX")
+    print("=" * 60)
+
+    count = rebuild()
+
+    print(f"✓ Indexed {count} patient(s)")
+    print("=" * 60)
@@ -0,0 +1,43 @@
+"""
+Summarize the slow-query log by statement fingerprint: how often each one was
+slow, for how long in total, where it ran from and how SQLite executed it.
+"""
+import argparse
+from models.slow_query_log import DEFAULT_LOG_PATH, aggregate, read_entries
+
+SORT_KEYS = {"total": "total_ms", "count": "count", "max": "max_ms", "p95": "p95_ms"}
+
+parser = argparse.ArgumentParser(description="Aggregate the slow-query log by fingerprint")
+parser.add_argument("--log", default=DEFAULT_LOG_PATH, help=f"log file (default {DEFAULT_LOG_PATH}); rotated backups are read too")
+parser.add_argument("--since", help="only entries at or after this time, e.g. 2024-05-01 or 2024-05-01T09:00")
+parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="total")
+parser.add_argument("--limit", type=int, default=10, help="fingerprints to show")
+parser.add_argument("--no-plans", action="store_true", help="leave out the query plans")
+args = parser.parse_args()
+
+summaries = aggregate(read_entries(args.log, args.since))
+summaries.sort(key=lambda summary: summary[SORT_KEYS[args.sort]], reverse=True)
+
+print("=" * 60)
+print("SLOW QUERIES BY FINGERPRINT")
+print("=" * 60)
+if not summaries:
+    print(f"ℹ️ No slow queries logged in {args.log}")
+
+for rank, summary in enumerate(summaries[:args.limit], 1):
+    print(f"\n#{rank}  {summary['count']} slow run(s), {summary['total_ms']:.0f} ms total, "
+          f"p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms, max {summary['max_ms']:.0f} ms")
+    print(f"  {summary['fingerprint'][:500]}")
+    print(f"  parameters: {summary['slowest']['parameters']}")
+    for endpoint, count in summary["endpoints"].most_common(3):
+        print(f"  endpoint:   {endpoint} ({count})")
+    for caller, count in summary["callers"].most_common(3):
+        print(f"  caller:     {caller} ({count})")
+    if not args.no_plans and summary["slowest"].get("plan"):
+        print("  plan:")
+        for line in summary["slowest"]["plan"]:
+            print(f"    {line}")
+
+print("\n" + "=" * 60)
+print(f"✓ {sum(summary['count'] for summary in summaries)} slow run(s) of {len(summaries)} statement(s)")
+print("=" * 60)
@@ -0,0 +1,71 @@
+"""
+GET /examinations runs the same number of queries however many examinations it lists
+
+Usage (from backend/):
+    python -m pytest tests
+"""
+import os
+from datetime import date, timedelta
+import pytest
+from models.db import db
+from models.patient import PatientModel
+from models.doctor import DoctorModel
+from models.appointment import AppointmentModel
+from models.examination import ExaminationModel
+from models.query_profiler import count_queries
+from benchmarks.common import make_api_app, auth_header, bulk_insert
+
+SIZES = (10, 200)
+
+
+def seed(examinations):
+    """One doctor and one patient with `examinations` examined appointments"""
+    common = {
+        "password": "x", "gender": 0, "address": "Cairo", "mobile": "0100000000",
+        "birthdate": date(1970, 1, 1), "created_at": date(2020, 1, 1),
+    }
+    bulk_insert(DoctorModel, [{"id": 1, "username": "doctor_1", "first_name": "Doc", "last_name": "One",
+                               "email": "doctor_1@clinic.test", "specialization": "Cardiology", **common}])
+    bulk_insert(PatientModel, [{"id": 1, "username": "patient_1", "first_name": "Pat", "last_name": "One",
+                                "email": "patient_1@clinic.test", **common}])
+    first_day = date(2024, 1, 1)
+    bulk_insert(AppointmentModel, [
+        {"id": i, "date": first_day + timedelta(days=i), "created_at": first_day, "description": "Follow-up",
+         "doctor_id": 1, "patient_id": 1, "doctor_username": "doctor_1", "patient_username": "patient_1"}
+        for i in range(1, examinations + 1)
+    ])
+    bulk_insert(ExaminationModel, [
+        {"id": i, "appointment_id": i, "diagnosis": "Stable angina", "prescription": "Aspirin 81mg"}
+        for i in range(1, examinations + 1)
+    ])
+
+
+def list_queries(examinations, user_type):
+    """(queries run, rows returned) by GET /examinations over a fresh database of `examinations` rows"""
+    app = make_api_app()
+    try:
+        with app.app_context():
+            db.create_all()
+            seed(examinations)
+        client = app.test_client()
+        headers = auth_header(app, 1, user_type)
+        # The first request runs create_all and loads the token revocation cache; not counted
+        client.get("/examinations", headers=headers)
+        with count_queries() as stats:
+            response = client.get("/examinations", headers=headers)
+        assert response.status_code == 200
+        return stats.count, len(response.get_json())
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.remove(app.bench_db_path)
+
+
+@pytest.mark.parametrize("user_type", ["admin", "patient"])
+def test_examination_list_query_count_is_constant(user_type):
+    (small_queries, small_rows), (large_queries, large_rows) = [
+        list_queries(size, user_type) for size in SIZES
+    ]
+    assert small_rows < large_rows
+    assert small_queries == large_queries
@@ -0,0 +1,62 @@
+"""
+PatientModel.search finds the best ranked patients, not just the newest matches
+
+Usage (from backend/):
+    python -m pytest tests
+"""
+import os
+from datetime import date
+import pytest
+from models.db import db
+from models.patient import PatientModel
+from models import patient_search
+from benchmarks.common import make_api_app, bulk_insert
+
+NEWER_PREFIX_MATCHES = patient_search.MAX_CANDIDATES + 100
+
+
+@pytest.fixture(scope="module")
+def app():
+    app = make_api_app()
+    with app.app_context():
+        db.create_all()
+        common = {
+            "password": "x", "gender": 0, "address": "Cairo", "mobile": "0100000000",
+            "birthdate": date(1980, 1, 1), "created_at": date(2020, 1, 1),
+        }
+        # The oldest patient is the only exact "Ali"; every newer one only starts with it
+        rows = [{"id": 1, "username": "ali_h", "first_name": "Ali", "last_name": "Hassan",
+                 "email": "ali.h@clinic.test", **common}]
+        rows += [
+            {"id": i, "username": f"patient_{i}", "first_name": ("Alice", "Alison", "Alistair")[i % 3],
+             "last_name": f"Newer{i}", "email": f"patient_{i}@clinic.test", **common}
+            for i in range(2, NEWER_PREFIX_MATCHES + 2)
+        ]
+        bulk_insert(PatientModel, rows)
+        patient_search.rebuild()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    os.remove(app.bench_db_path)
+
+
+def test_old_exact_match_beats_newer_prefix_matches(app):
+    with app.app_context():
+        patients = PatientModel.search("ali", limit=10)
+        assert [patient.id for patient in patients][:1] == [1]
+        assert len(patients) == 10
+
+
+def test_old_exact_last_name_beats_newer_prefix_matches(app):
+    with app.app_context():
+        patients = PatientModel.search("ali hassan", limit=5)
+        assert [patient.id for patient in patients] == [1]
+
+
+def test_prefix_matches_come_newest_first_after_exact_ones(app):
+    with app.app_context():
+        patients = PatientModel.search("alis", limit=3)
+        assert [patient.id for patient in patients] == sorted(
+            (i for i in range(2, NEWER_PREFIX_MATCHES + 2) if i % 3 != 0), reverse=True
+        )[:3]
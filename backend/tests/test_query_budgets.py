@@ -0,0 +1,60 @@
+"""
+Every GET resource registered in app.py stays within its QUERY_BUDGET
+
+Seeds a throwaway database with a small synthetic clinic, then requests each
+GET endpoint (path parameters filled with id 1, same query strings as
+benchmarks/bench_query_budgets.py) as an admin, a doctor and a patient.
+
+Usage (from backend/):
+    python -m pytest tests
+"""
+import os
+import pytest
+import app as application
+from models.db import db
+from models.query_profiler import assert_query_budget, resource_budgets
+from benchmarks.common import make_api_app, auth_header, populate
+from benchmarks.bench_query_budgets import QUERY_STRINGS, concrete_url
+
+ROLES = ("admin", "doctor", "patient")
+# Endpoints whose seeded answer must not be empty, or the budget proves nothing
+SEARCH_ENDPOINTS = ("examinationsearch", "patientsearch")
+ENDPOINTS = sorted(
+    endpoint
+    for endpoint, (resource, _, _) in resource_budgets(application.app).items()
+    if hasattr(resource, "get")
+)
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = make_api_app()
+    with app.app_context():
+        db.create_all()
+        populate(500)
+    client = app.test_client()
+    client.get("/doctors")  # before_first_request runs create_all; keep it out of the counts
+    yield client
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    os.remove(app.bench_db_path)
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_get_within_query_budget(client, endpoint):
+    _, urls, budget = resource_budgets(application.app)[endpoint]
+    url = concrete_url(urls[0])
+    if endpoint in QUERY_STRINGS:
+        url += "?" + QUERY_STRINGS[endpoint]
+
+    results = []
+    for user_type in ROLES:
+        headers = auth_header(application.app, 1, user_type)
+        response, _ = assert_query_budget(client, "GET", url, budget, headers=headers)
+        assert response.status_code < 500, f"GET {url} as {user_type}: {response.status_code}"
+        if response.status_code == 200 and endpoint in SEARCH_ENDPOINTS:
+            results += response.get_json()
+
+    if endpoint in SEARCH_ENDPOINTS:
+        assert results, f"GET {url} found nothing in the seeded data"
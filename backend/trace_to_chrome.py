@@ -0,0 +1,36 @@
+"""
+Convert traces from the trace log into a Chrome trace file that opens in
+chrome://tracing, https://ui.perfetto.dev or https://www.speedscope.app
+"""
+import argparse
+import json
+from models.tracing import DEFAULT_LOG_PATH, read_traces, to_chrome
+
+parser = argparse.ArgumentParser(description="Write logged traces as a Chrome trace file")
+parser.add_argument("--log", default=DEFAULT_LOG_PATH, help=f"trace log (default {DEFAULT_LOG_PATH}); rotated backups are read too")
+parser.add_argument("--out", default="traces.chrome.json")
+parser.add_argument("--since", help="only traces at or after this time, e.g. 2024-05-01 or 2024-05-01T09:00")
+parser.add_argument("--name", help="only traces whose name contains this, e.g. /appointments")
+parser.add_argument("--trace-id", help="only this trace")
+parser.add_argument("--slowest", type=int, default=20, help="keep the N slowest matching traces")
+args = parser.parse_args()
+
+traces = [
+    entry for entry in read_traces(args.log, args.since)
+    if (not args.name or args.name in entry["name"]) and (not args.trace_id or entry["trace_id"] == args.trace_id)
+]
+traces.sort(key=lambda entry: entry["duration_ms"], reverse=True)
+traces = traces[:args.slowest]
+
+with open(args.out, "w") as out_file:
+    json.dump(to_chrome(traces), out_file)
+
+print("=" * 60)
+print("EXPORTING TRACES")
+print("=" * 60)
+if not traces:
+    print(f"ℹ️ No matching traces in {args.log}")
+for entry in traces:
+    print(f"  {entry['duration_ms']:>9.1f} ms  {entry['time']}  {entry['name']}  ({len(entry['spans'])} spans)")
+print(f"✓ Wrote {len(traces)} trace(s) to {args.out}")
+print("=" * 60)
@@ -0,0 +1,53 @@
+from flask import Flask
+from models.db import db
+from models.admin import AdminModel
+from models.patient import PatientModel
+from models.contact_us import ContactUsModel
+from models.treatment_export import TreatmentExportModel
+from models.export_artifact import ExportArtifactModel
+from models.patient_image import PatientImageModel
+from models.image_blob import ImageBlobModel
+from models.upload_session import UploadSessionModel
+from models.daily_stats import DailyStatsModel
+from models.blacklist import RevokedTokenModel
+from models.email_outbox import EmailOutboxModel
+from models.migrations import add_missing_columns, add_missing_indexes
+from models import examination_search, patient_search
+
+# Create a simple Flask app for context
+app = Flask(__name__)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///data.db"
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Initialize db with the app
+db.init_app(app)
+
+# Create app context
+with app.app_context():
+    print("=" * 60)
+    print("UPGRADING DATABASE SCHEMA")
+    print("=" * 60)
+
+    # New tables
+    db.create_all()
+
+    # New columns on existing tables
+    added = add_missing_columns()
+    for name in added:
+        print(f"✓ Added column: {name}")
+
+    # New indexes on existing tables
+    created = add_missing_indexes()
+    for name in created:
+        print(f"✓ Created index: {name}")
+
+    # Full-text search indexes (SQLite only)
+    indexed = False
+    for name, search in (("examination", examination_search), ("patient", patient_search)):
+        if search.ensure_index():
+            indexed = True
+            print(f"✓ Created and filled the {name} search index")
+
+    if not added and not created and not indexed:
+        print("ℹ️ Schema is already up to date")
+    print("=" * 60)
@@ -0,0 +1,55 @@
+import axios from 'axios';
+
+const API = 'http://localhost:5000';
+// Files above this go through the resumable chunked upload API
+export const CHUNKED_THRESHOLD = 8 * 1024 * 1024;
+const MAX_RETRIES = 5;
+
+async function sha256Hex(data) {
+    const digest = await crypto.subtle.digest('SHA-256', data);
+    return Array.from(new Uint8Array(digest))
+        .map((byte) => byte.toString(16).padStart(2, '0'))
+        .join('');
+}
+
+function sleep(ms) {
+    return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+// Upload `file` for a patient in chunks. A chunk that fails (dropped connection,
+// checksum mismatch) is retried from the offset the server reports, so only the
+// missing bytes are sent again. Resolves with the complete call's response.
+export async function uploadInChunks(patientId, file, headers, onProgress = () => {}) {
+    const base = `${API}/upload/image/${patientId}/chunked`;
+    const started = await axios.post(base, { filename: file.name, size: file.size }, { headers });
+    const { upload_id: uploadId, chunk_size: chunkSize } = started.data;
+    let received = started.data.received;
+    let failures = 0;
+
+    while (received < file.size) {
+        const chunk = await file.slice(received, received + chunkSize).arrayBuffer();
+        try {
+            const response = await axios.put(`${base}/${uploadId}`, chunk, {
+                params: { offset: received },
+                headers: {
+                    ...headers,
+                    'Content-Type': 'application/octet-stream',
+                    'X-Chunk-SHA256': await sha256Hex(chunk),
+                },
+            });
+            received = response.data.received;
+            failures = 0;
+            onProgress(received / file.size);
+        } catch (error) {
+            failures += 1;
+            if (failures > MAX_RETRIES) {
+                throw error;
+            }
+            await sleep(500 * 2 ** failures);
+            // Ask the server where to resume
+            const status = await axios.get(`${base}/${uploadId}`, { headers });
+            received = status.data.received;
+        }
+    }
+    return axios.post(`${base}/${uploadId}/complete`, null, { headers });
+}
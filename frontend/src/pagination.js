@@ -0,0 +1,14 @@
+import axios from 'axios';
+
+// List endpoints return one page at a time and advertise the next one in the
+// X-Next-Cursor header. Fetch one page and hand back the response with its
+// nextCursor (null on the last page); pass that back as `after` to load the
+// following page when the user asks for more.
+export async function getPage(url, config = {}, after = null) {
+    const params = { ...(config.params || {}) };
+    if (after) {
+        params.after = after;
+    }
+    const response = await axios.get(url, { ...config, params });
+    return { ...response, nextCursor: response.headers['x-next-cursor'] || null };
+}